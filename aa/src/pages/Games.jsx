@@ -1,5 +1,5 @@
 import { useNavigate } from "react-router-dom";
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import { tunisianCities } from "../constants";
 import "./games.css";
 import { useToast } from "../context/ToastContext";
@@ -21,14 +21,74 @@ export default function Games() {
   const [selectedMatchId, setSelectedMatchId] = useState(null);
   const [selectedTeamId, setSelectedTeamId] = useState("");
 
+  // ⭐ États des filtres
+  const [filters, setFilters] = useState({
+    typeMatch: "",
+    matchMode: "", // New Filter
+    city: "",
+    maxPrice: "",
+    date: ""
+  });
+  const [nextCursor, setNextCursor] = useState(null);
+  // Requête de recherche en cours et numéro de la recherche affichée
+  const search = useRef({ controller: null, generation: 0 });
+
+  // ⭐ Recherche côté serveur: filtres en SQL, pages par curseur
+  async function searchMatches(cursor = null) {
+    const params = new URLSearchParams({ exclude_full_team_matches: "true", limit: "20" });
+    if (filters.matchMode !== "") params.set("is_team_match", filters.matchMode === "team");
+    if (filters.typeMatch !== "") params.set("type_match", filters.typeMatch);
+    if (filters.city !== "") params.set("city", filters.city);
+    if (filters.maxPrice !== "") params.set("max_price", filters.maxPrice);
+    if (filters.date !== "") {
+      params.set("date_from", filters.date);
+      params.set("date_to", filters.date);
+    }
+    if (cursor) params.set("cursor", cursor);
+
+    // Une seule requête à la fois: la précédente est annulée
+    search.current.controller?.abort();
+    const controller = new AbortController();
+    search.current.controller = controller;
+    const generation = search.current.generation;
+    const isStale = () => generation !== search.current.generation;
+
+    try {
+      const res = await fetch(`http://127.0.0.1:8001/matches/search?${params}`, { signal: controller.signal });
+      const data = await res.json();
+      if (isStale()) return; // Les filtres ont changé entre-temps
+      if (!Array.isArray(data)) {
+        console.error("Expected array of matches, got:", data);
+        if (!cursor) setGames([]);
+        return;
+      }
+      setGames((previous) => (cursor ? [...previous, ...data] : data));
+      setNextCursor(res.headers.get("X-Next-Cursor"));
+    } catch (err) {
+      if (err.name === "AbortError") return;
+      console.error("Error loading matches:", err);
+    }
+  }
+
+  // Première page quand les filtres ne bougent plus depuis 300 ms (pas une requête par touche)
+  useEffect(function () {
+    // Les pages déjà reçues ne correspondent plus aux filtres: pas de "Load more" entre-temps
+    search.current.controller?.abort();
+    search.current.generation += 1;
+    setNextCursor(null);
+    const timer = setTimeout(() => searchMatches(), 300);
+    return () => clearTimeout(timer);
+  }, [filters]);
+
+  // Annule la recherche en cours en quittant la page
+  useEffect(function () {
+    return () => search.current.controller?.abort();
+  }, []);
+
   useEffect(function () {
     async function loadData() {
       try {
-        // 1. Fetch Matches with upcoming_only=true and exclude_full_team_matches=true
-        const resMatches = await fetch("http://127.0.0.1:8001/matches/?upcoming_only=true&exclude_full_team_matches=true");
-        const dataMatches = await resMatches.json();
-
-        // 2. Fetch Current User (if logged in)
+        // 1. Fetch Current User (if logged in)
         const token = localStorage.getItem("token");
         let currentUser = null;
         if (token) {
@@ -39,7 +99,7 @@ export default function Games() {
             currentUser = await resUser.json();
           }
 
-          // 3. Fetch My Teams
+          // 2. Fetch My Teams
           const resTeams = await fetch("http://127.0.0.1:8001/teams/me", {
             headers: { "Authorization": `Bearer ${token}` }
           });
@@ -47,13 +107,6 @@ export default function Games() {
             setMyTeams(await resTeams.json());
           }
         }
-
-        if (Array.isArray(dataMatches)) {
-          setGames(dataMatches);
-        } else {
-          console.error("Expected array of matches, got:", dataMatches);
-          setGames([]);
-        }
         setUser(currentUser);
 
       } catch (err) {
@@ -91,15 +144,6 @@ export default function Games() {
     }
   }
 
-  // ⭐ États des filtres
-  const [filters, setFilters] = useState({
-    typeMatch: "",
-    matchMode: "", // New Filter
-    city: "",
-    maxPrice: "",
-    date: ""
-  });
-
   // ⭐ Fonction pour mettre à jour un filtre
   function handleFilter(e) {
     setFilters({
@@ -108,24 +152,6 @@ export default function Games() {
     });
   }
 
-  // ⭐ Appliquer les filtres
-  const filteredGames = games.filter((g) => {
-    // Match Mode Logic
-    const modeMatch = filters.matchMode === ""
-      ? true
-      : filters.matchMode === "team"
-        ? g.is_team_match
-        : !g.is_team_match;
-
-    return (
-      modeMatch &&
-      (filters.typeMatch === "" || g.type_match === filters.typeMatch) &&
-      (filters.city === "" || g.city.toLowerCase().includes(filters.city.toLowerCase())) &&
-      (filters.maxPrice === "" || g.price_per_player <= Number(filters.maxPrice)) &&
-      (filters.date === "" || g.date === filters.date)
-    );
-  });
-
   // ⭐ Handle Join/Leave
   async function handleJoin(matchId) {
     const token = localStorage.getItem("token");
@@ -240,7 +266,7 @@ export default function Games() {
 
   const renderMatchCard = (match, isRecommendation = false, recData = null) => {
     const joined = isUserJoined(match);
-    const spotsLeft = match.nb_players - (match.participants ? match.participants.length : 0);
+    const spotsLeft = match.spots_left ?? (match.nb_players - (match.participants ? match.participants.length : 0));
     const isExpanded = expandedMatches[match.id];
 
     return (
@@ -535,10 +561,19 @@ export default function Games() {
             recommendations.map((rec) => renderMatchCard(rec.match, true, rec))
           )
         ) : (
-          filteredGames.map((match) => renderMatchCard(match))
+          games.map((match) => renderMatchCard(match))
         )}
       </div>
 
+      {/* ⭐ PAGE SUIVANTE */}
+      {!showRecommended && nextCursor && (
+        <div style={{ textAlign: "center", margin: "20px 0" }}>
+          <button className="add-btn" onClick={() => searchMatches(nextCursor)}>
+            Load more
+          </button>
+        </div>
+      )}
+
       {/* TEAM JOIN MODAL */}
       {showTeamJoinModal && (
         <div className="modal-overlay">
@@ -158,7 +158,7 @@ export default function MyOrganizedGames() {
                             <h2>{match.title}</h2>
                             <p><strong>Date:</strong> {match.date} at {match.start_time}</p>
                             <p><strong>City:</strong> {match.city}</p>
-                            <p><strong>Players:</strong> {match.participants ? match.participants.length : 0} / {match.nb_players}</p>
+                            <p><strong>Players:</strong> {match.participant_count ?? (match.participants ? match.participants.length : 0)} / {match.nb_players}</p>
 
                             <div style={{ marginTop: "15px", borderTop: "1px solid #eee", paddingTop: "10px" }}>
                                 {match.is_team_match ? (
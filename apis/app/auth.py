@@ -1,11 +1,19 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from . import schemas, models, database
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+from starlette.concurrency import run_in_threadpool
+from . import schemas, models, database, metrics
+from .cache import TTLCache
 
 import os
 from dotenv import load_dotenv
@@ -17,6 +25,19 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# bcrypt runs in its own bounded pool so a login burst cannot starve the
+# threadpool that serves every other sync endpoint
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")  # "thread" or "process"
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+# Hash requests allowed to wait for a worker before answering 503
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+
+# Authenticated-user cache: avoids one SELECT users per authenticated request
+AUTH_USER_CACHE_TTL = int(os.getenv("AUTH_USER_CACHE_TTL", "30"))
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "5000"))
+# Put the user id in new tokens ("uid" claim) so cache misses use the primary key
+AUTH_EMBED_USER_ID = os.getenv("AUTH_EMBED_USER_ID", "false").lower() == "true"
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
@@ -33,6 +54,40 @@ def get_password_hash(password):
         password = password.encode('utf-8')[:72].decode('utf-8', errors='ignore')
     return pwd_context.hash(password)
 
+if PASSWORD_HASH_EXECUTOR == "process":
+    _hash_executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+else:
+    _hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_PENDING)
+
+password_hash_seconds = metrics.Histogram(
+    "password_hash_seconds", "bcrypt hash/verify latency, queue wait included"
+)
+password_hash_rejected = metrics.Counter(
+    "password_hash_rejected_total", "bcrypt requests rejected with 503 because the queue was full"
+)
+
+async def _run_password_job(op: str, fn, *args):
+    if not _hash_slots.acquire(blocking=False):
+        password_hash_rejected.inc(op=op)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server busy, please retry",
+            headers={"Retry-After": "1"},
+        )
+    start = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+    finally:
+        _hash_slots.release()
+        password_hash_seconds.observe(time.perf_counter() - start, op=op)
+
+async def verify_password_async(plain_password, hashed_password):
+    return await _run_password_job("verify", verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await _run_password_job("hash", get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -43,22 +98,120 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
-    credentials_exception = HTTPException(
+def token_claims(user: models.User) -> dict:
+    claims = {"sub": user.email}
+    if AUTH_EMBED_USER_ID:
+        claims["uid"] = user.id
+    return claims
+
+# Cached columns never include the password hash
+_CACHED_USER_COLUMNS = [c.key for c in models.User.__table__.columns if c.key != "hashed_password"]
+user_cache = TTLCache(AUTH_USER_CACHE_SIZE, AUTH_USER_CACHE_TTL)
+
+user_cache_lookups = metrics.Counter("auth_user_cache_lookups_total", "Authenticated-user cache lookups by result")
+
+def _cached_columns(key):
+    """The cached columns of the key's user (None on a miss), counting the lookup"""
+    columns = user_cache.get(key)
+    user_cache_lookups.inc(result="miss" if columns is None else "hit")
+    return columns
+
+def _attach_cached_user(db: Session, columns: dict) -> models.User:
+    """Re-attach a cached user row to the request session without a SELECT"""
+    user = models.User(**columns)
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
+
+def _user_cache_key(token: str):
+    """Cache key of the token's user, None for invalid tokens"""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    email: str = payload.get("sub")
+    user_id = payload.get("uid")
+    if email is None:
+        return None
+    token_data = schemas.TokenData(email=email)
+    return ("id", user_id) if user_id is not None else ("email", token_data.email)
+
+def _user_query(key):
+    kind, value = key
+    return select(models.User).where((models.User.id if kind == "id" else models.User.email) == value)
+
+def _load_user(key, db: Session) -> Optional[models.User]:
+    """Cache miss: the user from the database (by primary key when the token carries a "uid" claim)"""
+    user = db.execute(_user_query(key)).scalars().first()
+    if user is not None:
+        user_cache.set(key, {c: getattr(user, c) for c in _CACHED_USER_COLUMNS})
+    return user
+
+def resolve_user(token: str, db: Session) -> Optional[models.User]:
+    """
+    Shared current-user resolver: decodes the JWT, then returns the user from
+    the short-TTL cache or, on a miss, from the database. Returns None for
+    invalid tokens.
+    """
+    key = _user_cache_key(token)
+    if key is None:
+        return None
+    columns = _cached_columns(key)
+    if columns is not None:
+        return _attach_cached_user(db, columns)
+    return _load_user(key, db)
+
+async def resolve_user_async(token: str, db: AsyncSession) -> Optional[models.User]:
+    """resolve_user for AsyncSession routes"""
+    key = _user_cache_key(token)
+    if key is None:
+        return None
+    columns = _cached_columns(key)
+    if columns is not None:
+        return await db.run_sync(_attach_cached_user, columns)
+    return await db.run_sync(lambda session: _load_user(key, session))
+
+async def _resolve_user_off_loop(token: str, db: Session) -> Optional[models.User]:
+    """Cache hits are answered inline, misses query from the threadpool"""
+    key = _user_cache_key(token)
+    if key is None:
+        return None
+    columns = _cached_columns(key)
+    if columns is not None:
+        return _attach_cached_user(db, columns)
+    return await run_in_threadpool(_load_user, key, db)
+
+def invalidate_user(user: models.User):
+    """Drop a user from the cache after their row changed (e.g. PUT /users/me)"""
+    user_cache.pop(("id", user.id))
+    user_cache.pop(("email", user.email))
+
+def _credentials_error():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        token_data = schemas.TokenData(email=email)
-    except JWTError:
-        raise credentials_exception
-    
-    user = db.query(models.User).filter(models.User.email == token_data.email).first()
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
+    user = await _resolve_user_off_loop(token, db)
+    if user is None:
+        raise _credentials_error()
+    return user
+
+async def get_current_user_optional(token: str = Depends(oauth2_scheme_optional), db: Session = Depends(database.get_db)):
+    """Same as get_current_user, but anonymous (None) when there is no valid token"""
+    if not token:
+        return None
+    return await _resolve_user_off_loop(token, db)
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(database.get_async_db)):
+    """get_current_user for routes on the AsyncSession (user attached to that session)"""
+    user = await resolve_user_async(token, db)
     if user is None:
-        raise credentials_exception
+        raise _credentials_error()
     return user
+
+async def get_current_user_optional_async(token: str = Depends(oauth2_scheme_optional), db: AsyncSession = Depends(database.get_async_db)):
+    if not token:
+        return None
+    return await resolve_user_async(token, db)
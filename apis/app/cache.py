@@ -0,0 +1,324 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+from . import metrics
+
+load_dotenv()
+
+RECOMMENDATION_CACHE_TTL = int(os.getenv("RECOMMENDATION_CACHE_TTL", "600"))
+RECOMMENDATION_CACHE_SIZE = int(os.getenv("RECOMMENDATION_CACHE_SIZE", "10000"))
+# Empty = in-memory cache, otherwise path of the SQLite file backing the cache
+RECOMMENDATION_CACHE_PATH = os.getenv("RECOMMENDATION_CACHE_PATH", "")
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after `ttl` seconds.
+    `on_remove(key, value)` is called, outside the lock, for every entry that
+    leaves the cache (expired, evicted, replaced, popped or cleared).
+    """
+
+    def __init__(self, maxsize: int, ttl: float, on_remove=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_remove = on_remove
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _removed(self, items):
+        if self.on_remove is not None:
+            for key, value in items:
+                self.on_remove(key, value)
+
+    def get(self, key, default=None):
+        removed = []
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                    removed.append((key, item[1]))
+                self.misses += 1
+                value = default
+            else:
+                self._data.move_to_end(key)
+                self.hits += 1
+                value = item[1]
+        self._removed(removed)
+        return value
+
+    def set(self, key, value):
+        removed = []
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                removed.append((key, previous[1]))
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            while len(self._data) > self.maxsize:
+                oldest, (_, oldest_value) = self._data.popitem(last=False)
+                removed.append((oldest, oldest_value))
+                self.evictions += 1
+        self._removed(removed)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        if item is None:
+            return default
+        self._removed([(key, item[1])])
+        return item[1]
+
+    def keys(self):
+        with self._lock:
+            return list(self._data.keys())
+
+    def clear(self):
+        with self._lock:
+            removed = [(key, item[1]) for key, item in self._data.items()]
+            self._data.clear()
+        self._removed(removed)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class MemoryRecommendationBackend:
+    """
+    In-process backend, with match_id -> keys and user_id -> keys indexes for
+    invalidation. The cache reports every removed entry, so the indexes never
+    outlive their entries.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._entries = TTLCache(maxsize, ttl, on_remove=self._unindex)
+        self._by_match = {}
+        self._by_user = {}
+        # Held around every cache call, so a removal is unindexed before another
+        # thread can store the same key again; reentrant for the on_remove callback
+        self._lock = threading.RLock()
+
+    def _unindex(self, key, recommendations):
+        with self._lock:
+            for rec in recommendations:
+                keys = self._by_match.get(rec["match_id"])
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._by_match[rec["match_id"]]
+            keys = self._by_user.get(key[0])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_user[key[0]]
+
+    def get(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key, recommendations):
+        with self._lock:
+            self._entries.set(key, recommendations)
+            for rec in recommendations:
+                self._by_match.setdefault(rec["match_id"], set()).add(key)
+            self._by_user.setdefault(key[0], set()).add(key)
+
+    def delete_user(self, user_id):
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                self._entries.pop(key)
+
+    def delete_match(self, match_id):
+        with self._lock:
+            keys = list(self._by_match.get(match_id, ()))
+            for key in keys:
+                self._entries.pop(key)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def evictions(self):
+        return self._entries.evictions
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteRecommendationBackend:
+    """On-disk backend, shared by every worker process using the same file"""
+
+    def __init__(self, path: str, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rec_cache ("
+            " user_id INTEGER NOT NULL, lim INTEGER NOT NULL, payload TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, last_access REAL NOT NULL,"
+            " PRIMARY KEY (user_id, lim))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rec_cache_matches ("
+            " match_id INTEGER NOT NULL, user_id INTEGER NOT NULL, lim INTEGER NOT NULL,"
+            " PRIMARY KEY (match_id, user_id, lim))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_rec_cache_last_access ON rec_cache(last_access)")
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, expires_at FROM rec_cache WHERE user_id = ? AND lim = ?", key
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._delete_keys([key])
+                return None
+            self._conn.execute(
+                "UPDATE rec_cache SET last_access = ? WHERE user_id = ? AND lim = ?", (now, *key)
+            )
+        return json.loads(row[0])
+
+    def set(self, key, recommendations):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._delete_keys([key])
+                self._conn.execute(
+                    "INSERT INTO rec_cache (user_id, lim, payload, expires_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (*key, json.dumps(recommendations), now + self.ttl, now)
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO rec_cache_matches (match_id, user_id, lim) VALUES (?, ?, ?)",
+                    [(rec["match_id"], *key) for rec in recommendations]
+                )
+                overflow = self._conn.execute("SELECT COUNT(*) FROM rec_cache").fetchone()[0] - self.maxsize
+                if overflow > 0:
+                    oldest = self._conn.execute(
+                        "SELECT user_id, lim FROM rec_cache ORDER BY last_access LIMIT ?", (overflow,)
+                    ).fetchall()
+                    self._delete_keys(oldest)
+                    self.evictions += len(oldest)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _delete_keys(self, keys):
+        self._conn.executemany("DELETE FROM rec_cache WHERE user_id = ? AND lim = ?", keys)
+        self._conn.executemany("DELETE FROM rec_cache_matches WHERE user_id = ? AND lim = ?", keys)
+
+    def delete_user(self, user_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM rec_cache WHERE user_id = ?", (user_id,))
+            self._conn.execute("DELETE FROM rec_cache_matches WHERE user_id = ?", (user_id,))
+
+    def delete_match(self, match_id):
+        with self._lock:
+            keys = self._conn.execute(
+                "SELECT user_id, lim FROM rec_cache_matches WHERE match_id = ?", (match_id,)
+            ).fetchall()
+            self._delete_keys(keys)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM rec_cache")
+            self._conn.execute("DELETE FROM rec_cache_matches")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM rec_cache").fetchone()[0]
+
+
+class RecommendationCache:
+    """
+    Per-user cache of ranked recommendations ({match_id, similarity_score, reason}).
+
+    Entries expire after a TTL, are evicted in LRU order, and are invalidated
+    by the events that can change a user's ranking: the user joins or leaves
+    a match, or a candidate match is created, deleted or becomes full.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id: int, limit: int):
+        value = self.backend.get((user_id, limit))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, user_id: int, limit: int, recommendations):
+        self.backend.set((user_id, limit), recommendations)
+
+    def invalidate_user(self, user_id: int):
+        self.invalidations += 1
+        self.backend.delete_user(user_id)
+
+    def invalidate_users(self, user_ids):
+        for user_id in set(user_ids):
+            self.invalidate_user(user_id)
+
+    def invalidate_match(self, match_id: int):
+        """A recommended match was deleted or became full"""
+        self.invalidations += 1
+        self.backend.delete_match(match_id)
+
+    def invalidate_all(self):
+        """A new candidate match may outrank any cached entry"""
+        self.invalidations += 1
+        self.backend.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "size": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.backend.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+def _make_recommendation_cache():
+    if RECOMMENDATION_CACHE_PATH:
+        backend = SQLiteRecommendationBackend(
+            RECOMMENDATION_CACHE_PATH, RECOMMENDATION_CACHE_SIZE, RECOMMENDATION_CACHE_TTL
+        )
+    else:
+        backend = MemoryRecommendationBackend(RECOMMENDATION_CACHE_SIZE, RECOMMENDATION_CACHE_TTL)
+    return RecommendationCache(backend)
+
+
+recommendation_cache = _make_recommendation_cache()
+
+metrics.Gauge(
+    "recommendation_cache", "Recommendation cache size and counters since start",
+    callback=lambda: {
+        (("stat", k),): v for k, v in recommendation_cache.stats().items() if k not in ("backend", "hit_rate")
+    },
+)
@@ -0,0 +1,212 @@
+"""
+Collaborative filtering over the match_participants graph.
+
+The graph is kept as a sparse user x match matrix R (1 = joined). Two
+users are alike when they played the same matches (cosine of their rows),
+and a match scores for a user by how many alike players joined it:
+
+    scores(U) = Rn[U] @ (Rn.T @ R[:, candidates]) - R[U, candidates]
+
+with Rn the row-normalized R (the last term drops each user's own row).
+Everything is a sparse product: the item projection in parentheses is
+computed once per candidate set and reused by every chunk of users, so the
+whole user base is scored in a few seconds.
+Joins and leaves are applied incrementally (see the matches router) and
+the whole graph is reloaded periodically so worker processes converge.
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from . import models
+
+load_dotenv()
+
+# Full reload interval of the participation graph
+CF_REFRESH_SECONDS = int(os.getenv("CF_REFRESH_SECONDS", "300"))
+
+# Below this many users per call, the user x user product is cheaper than
+# projecting every candidate (single-user requests, varying candidates)
+CF_PROJECTION_MIN_USERS = 32
+
+
+class ParticipationGraph:
+    def __init__(self, refresh_seconds: int = CF_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.RLock()
+        self._loaded_at = None
+
+        self._row_of = {}  # user_id -> row
+        self._col_of = {}  # match_id -> column
+        self._matrix = sparse.csr_matrix((0, 0), dtype=np.float64)
+        self._normalized = self._normalized_t = self._matrix
+        self._projection = (None, None)  # (candidate columns, Rn.T @ R[:, columns])
+        self._pending = {}  # (user_id, match_id) -> +1 joined / -1 left
+        self._dropped = set()  # Deleted match ids
+
+    # ----- loading -----
+
+    def load(self, db: Session):
+        """(Re)build the whole matrix from match_participants"""
+        self.build(*self.fetch(db))
+
+    def fetch(self, db: Session):
+        """(users, matches) of every participation (the database half of load)"""
+        pairs = db.query(
+            models.match_participants.c.user_id,
+            models.match_participants.c.match_id
+        ).all()
+        return [p.user_id for p in pairs], [p.match_id for p in pairs]
+
+    def build(self, users, matches):
+        """Replace the graph with the (users[i], matches[i]) participations"""
+        user_ids, rows = np.unique(np.asarray(users, dtype=np.int64), return_inverse=True)
+        match_ids, cols = np.unique(np.asarray(matches, dtype=np.int64), return_inverse=True)
+        matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float64), (rows, cols)),
+            shape=(len(user_ids), len(match_ids))
+        )
+        matrix.data[:] = 1  # Duplicate pairs were summed
+        with self._lock:
+            self._row_of = {int(u): i for i, u in enumerate(user_ids)}
+            self._col_of = {int(m): j for j, m in enumerate(match_ids)}
+            self._matrix = matrix
+            self._set_normalized(matrix)
+            self._pending = {}
+            self._dropped = set()
+            self._loaded_at = time.monotonic()
+
+    def is_stale(self):
+        with self._lock:
+            return (
+                self._loaded_at is None
+                or time.monotonic() - self._loaded_at > self.refresh_seconds
+            )
+
+    def ensure_loaded(self, db: Session):
+        if self.is_stale():
+            self.load(db)
+
+    # ----- incremental updates -----
+
+    def add(self, user_ids, match_id: int):
+        """Record that `user_ids` joined `match_id`"""
+        self._record(user_ids, match_id, 1)
+
+    def remove(self, user_ids, match_id: int):
+        """Record that `user_ids` left `match_id`"""
+        self._record(user_ids, match_id, -1)
+
+    def remove_match(self, match_id: int):
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            self._pending = {k: v for k, v in self._pending.items() if k[1] != match_id}
+            self._dropped.add(match_id)
+
+    def _record(self, user_ids, match_id, value):
+        with self._lock:
+            if self._loaded_at is None:
+                return  # Will be picked up by the first load
+            for user_id in user_ids:
+                self._pending[(user_id, match_id)] = value
+
+    def _apply_pending(self):
+        """Fold the recorded joins / leaves into the matrix (under the lock)"""
+        if not self._pending and not self._dropped:
+            return
+        for user_id, match_id in self._pending:
+            self._row_of.setdefault(user_id, len(self._row_of))
+            self._col_of.setdefault(match_id, len(self._col_of))
+        shape = (len(self._row_of), len(self._col_of))
+
+        matrix = self._matrix.copy()
+        matrix.resize(shape)
+        if self._pending:
+            keys = list(self._pending)
+            delta = sparse.csr_matrix((
+                np.fromiter(self._pending.values(), dtype=np.float64, count=len(keys)),
+                (
+                    np.fromiter((self._row_of[u] for u, _ in keys), dtype=np.int64, count=len(keys)),
+                    np.fromiter((self._col_of[m] for _, m in keys), dtype=np.int64, count=len(keys)),
+                )
+            ), shape=shape)
+            # Joining twice / leaving a match never joined: clip back to 0 / 1
+            matrix = matrix + delta
+            np.clip(matrix.data, 0, 1, out=matrix.data)
+        dropped = [self._col_of[m] for m in self._dropped if m in self._col_of]
+        if dropped:
+            matrix.data[np.isin(matrix.indices, dropped)] = 0
+        matrix.eliminate_zeros()
+
+        self._matrix = matrix
+        self._set_normalized(matrix)
+        self._pending = {}
+        self._dropped = set()
+
+    def _set_normalized(self, matrix):
+        """Row-normalized matrix, and its transpose kept as CSR for the user x user product"""
+        degrees = np.diff(matrix.indptr).astype(np.float64)
+        scale = np.divide(1, np.sqrt(degrees), out=np.zeros_like(degrees), where=degrees > 0)
+        self._normalized = (sparse.diags(scale) @ matrix).tocsr()
+        self._normalized_t = self._normalized.T.tocsr()
+        self._projection = (None, None)
+
+    def _project(self, cols):
+        """Rn.T @ R[:, cols], cached for the last candidate set (under the lock)"""
+        key = cols.tobytes()
+        if self._projection[0] != key:
+            self._projection = (key, (self._normalized_t @ self._matrix[:, cols]).tocsr())
+        return self._projection[1]
+
+    # ----- scoring -----
+
+    def scores(self, user_ids, match_ids):
+        """
+        (len(user_ids), len(match_ids)) "players like you also joined"
+        scores, scaled to 0-1 per user (0 for unknown users and matches)
+        """
+        result = np.zeros((len(user_ids), len(match_ids)))
+        with self._lock:
+            self._apply_pending()
+            user_pos = [(i, self._row_of[u]) for i, u in enumerate(user_ids) if u in self._row_of]
+            match_pos = [(j, self._col_of[m]) for j, m in enumerate(match_ids) if m in self._col_of]
+            if not user_pos or not match_pos:
+                return result
+            positions, rows = (np.array(x) for x in zip(*user_pos))
+            columns, cols = (np.array(x) for x in zip(*match_pos))
+            normalized, matrix = self._normalized, self._matrix
+            if len(rows) >= CF_PROJECTION_MIN_USERS:
+                projection = self._project(cols)
+            else:
+                projection = None
+                normalized_t = self._normalized_t
+
+        # Sum of the cosine similarities of the players who joined each candidate
+        if projection is not None:
+            raw = normalized[rows] @ projection
+        else:
+            raw = (normalized[rows] @ normalized_t) @ matrix[:, cols]
+        raw = (raw - matrix[rows][:, cols]).tocsr()  # A user is not alike themselves
+        raw.data[raw.data < 1e-9] = 0  # Rounding left by the self term
+        raw.eliminate_zeros()
+
+        # Scaled while still sparse, densified once
+        peak = raw.max(axis=1).toarray().ravel()
+        raw.data /= np.repeat(peak, np.diff(raw.indptr))
+        if len(rows) == len(user_ids) and len(cols) == len(match_ids):
+            return raw.toarray(out=result)
+        result[np.ix_(positions, columns)] = raw.toarray()
+        return result
+
+    def __len__(self):
+        return self._matrix.nnz
+
+
+participation_graph = ParticipationGraph()
@@ -1,18 +1,184 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 
 import os
+import threading
+import time
+import uuid
 from dotenv import load_dotenv
 
+from . import metrics
+
 load_dotenv()
 
 # Database credentials
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"connect_timeout": 10})
+# Connection pool, per engine and per worker process (ignored on SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Seconds a request waits for a free connection before failing
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Connections older than this are replaced (-1: never), below server / proxy idle timeouts
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Test connections on checkout, so a restarted server / proxy costs no failed request
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+# Server-side cap on a single statement, in milliseconds (0: none)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+# Behind pgbouncer in transaction pooling mode: no session state, no
+# server-side prepared statements, timeouts set per transaction
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+
+# ----- pool metrics -----
+
+pool_checkout_seconds = metrics.Histogram(
+    "db_pool_checkout_seconds", "Wait for a pooled connection (new connections included)",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+pool_checkout_timeouts = metrics.Counter(
+    "db_pool_checkout_timeouts_total", "Checkouts that gave up after DB_POOL_TIMEOUT (pool exhausted)"
+)
+_engines = {}  # name -> engine, for the gauges (engine.pool changes on dispose)
+_in_use = {}  # engine name -> checked-out connections
+_in_use_lock = threading.Lock()
+
+metrics.Gauge(
+    "db_pool_connections_in_use", "Connections checked out of the pool",
+    callback=lambda: {(("engine", name),): n for name, n in _in_use.items()},
+)
+metrics.Gauge(
+    "db_pool_connections_idle", "Open connections waiting in the pool",
+    callback=lambda: {
+        (("engine", name),): e.pool.checkedin() for name, e in _engines.items() if hasattr(e.pool, "checkedin")
+    },
+)
+metrics.Gauge(
+    "db_pool_overflow", "Connections open beyond DB_POOL_SIZE (negative: pool not full yet)",
+    callback=lambda: {
+        (("engine", name),): e.pool.overflow() for name, e in _engines.items() if hasattr(e.pool, "overflow")
+    },
+)
+
+
+class _TimedCheckout:
+    """Times the wait for a connection; the pool's logging name labels the engine"""
+
+    def _do_get(self):
+        name = self._orig_logging_name or "default"
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            pool_checkout_timeouts.inc(engine=name)
+            raise
+        finally:
+            pool_checkout_seconds.observe(time.perf_counter() - start, engine=name)
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def _track_pool(engine, name):
+    def checkout(*args):
+        with _in_use_lock:
+            _in_use[name] = _in_use.get(name, 0) + 1
+
+    def checkin(*args):
+        with _in_use_lock:
+            _in_use[name] = _in_use.get(name, 0) - 1
+
+    sync_engine = getattr(engine, "sync_engine", engine)
+    event.listen(sync_engine, "checkout", checkout)
+    event.listen(sync_engine, "checkin", checkin)
+    _engines[name] = sync_engine
+
+
+# ----- engine factory -----
+
+def make_engine(url, asynchronous: bool = False, name: str = "default", **options):
+    """
+    Engine for `url` with the DB_* pool, timeout and pgbouncer settings
+    (`options` override them, e.g. pool_size for a load test). Every app
+    engine and maintenance script goes through here.
+    """
+    url = make_url(url)
+    backend, driver = url.get_backend_name(), url.get_driver_name()
+    kwargs, connect_args = {}, {}
+
+    if backend == "sqlite":
+        if not asynchronous:
+            connect_args["check_same_thread"] = False  # Sessions move between threadpool workers
+    else:
+        kwargs.update(
+            poolclass=TimedAsyncQueuePool if asynchronous else TimedQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING,
+        )
+    kwargs["pool_logging_name"] = name  # Engine label of the pool and SQL metrics
+
+    if backend == "postgresql":
+        if driver == "asyncpg":
+            connect_args["timeout"] = DB_CONNECT_TIMEOUT
+        else:
+            connect_args["connect_timeout"] = DB_CONNECT_TIMEOUT
+        if DB_PGBOUNCER:
+            if driver == "asyncpg":
+                # Prepared statements live on one server connection, pgbouncer switches them
+                connect_args["statement_cache_size"] = 0
+                connect_args["prepared_statement_cache_size"] = 0
+                connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+        elif DB_STATEMENT_TIMEOUT_MS:
+            if driver == "asyncpg":
+                connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+            else:
+                connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+
+    kwargs["connect_args"] = {**connect_args, **options.pop("connect_args", {})}
+    kwargs.update(options)
+    engine = (create_async_engine if asynchronous else create_engine)(url, **kwargs)
+
+    if backend == "postgresql" and DB_PGBOUNCER and DB_STATEMENT_TIMEOUT_MS:
+        # Startup parameters are rejected by pgbouncer: scope the timeout to each transaction
+        @event.listens_for(getattr(engine, "sync_engine", engine), "begin")
+        def set_statement_timeout(conn):
+            conn.exec_driver_sql(f"SET LOCAL statement_timeout = {DB_STATEMENT_TIMEOUT_MS}")
+
+    if backend != "sqlite":
+        _track_pool(engine, name)
+    return engine
+
+
+engine = make_engine(SQLALCHEMY_DATABASE_URL, name="sync")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async drivers of the sync URLs, for the routes served on the event loop
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+def async_database_url(url: str):
+    """asyncpg / aiosqlite flavour of a sync database URL"""
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    return url.set(drivername=driver) if driver else url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(SQLALCHEMY_DATABASE_URL)
+
+async_engine = make_engine(ASYNC_DATABASE_URL, asynchronous=True, name="async")
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False)
+
 Base = declarative_base()
 
 # Dependency
@@ -22,3 +188,26 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    """
+    AsyncSession for `async def` routes: queries never block the event loop
+    nor hold a threadpool worker. Existing Session-based code runs unchanged
+    through `await db.run_sync(fn)` (fn receives a sync Session).
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def insert_or_ignore(db, table):
+    """
+    INSERT statement for `table` that skips rows violating a unique key
+    (INSERT ... ON CONFLICT DO NOTHING), for the dialect behind `db`.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"ON CONFLICT DO NOTHING is not supported on {dialect}")
+    return insert(table).on_conflict_do_nothing()
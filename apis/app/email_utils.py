@@ -1,27 +1,55 @@
+import logging
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import os
 
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Configuration
-SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 587
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USE_TLS = os.getenv("SMTP_USE_TLS", "true").lower() == "true"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
 SENDER_EMAIL = os.getenv("SENDER_EMAIL")
 SENDER_PASSWORD = os.getenv("SENDER_PASSWORD")
 
-def send_match_reminder(to_email: str, player_name: str, match_title: str, time: str, city: str, stadium: str):
+def open_smtp_connection(host: str = None, port: int = None, use_tls: bool = None,
+                         username: str = None, password: str = None):
     """
-    Sends a match reminder email to a player.
+    Opens an authenticated SMTP session (STARTTLS + login when configured).
+    Defaults come from the environment; a local test server can be used with
+    use_tls=False and no credentials.
     """
-    try:
-        subject = f"⚽ Match Reminder: {match_title} Today!"
+    server = smtplib.SMTP(host or SMTP_SERVER, port or SMTP_PORT, timeout=SMTP_TIMEOUT)
+    if SMTP_USE_TLS if use_tls is None else use_tls:
+        server.starttls()  # Secure the connection
+    username = SENDER_EMAIL if username is None else username
+    password = SENDER_PASSWORD if password is None else password
+    if username and password:
+        server.login(username, password)
+    return server
+
+def build_message(to_email: str, subject: str, body: str):
+    msg = MIMEMultipart()
+    msg["From"] = SENDER_EMAIL or ""
+    msg["To"] = to_email
+    msg["Subject"] = subject
+
+    msg.attach(MIMEText(body, "html"))
+    return msg
+
+def build_match_reminder(to_email: str, player_name: str, match_title: str, time: str, city: str, stadium: str):
+    """
+    Builds the match reminder email for a player.
+    """
+    subject = f"⚽ Match Reminder: {match_title} Today!"
         
-        body = f"""
+    body = f"""
         <html>
           <body>
             <h2>Hello {player_name},</h2>
@@ -40,37 +68,15 @@ def send_match_reminder(to_email: str, player_name: str, match_title: str, time:
           </body>
         </html>
         """
+    return build_message(to_email, subject, body)
 
-        msg = MIMEMultipart()
-        msg["From"] = SENDER_EMAIL
-        msg["To"] = to_email
-        msg["Subject"] = subject
-
-        msg.attach(MIMEText(body, "html"))
-
-        # Connect to server
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()  # Secure the connection
-        server.login(SENDER_EMAIL, SENDER_PASSWORD)
-        
-        # Send email
-        server.sendmail(SENDER_EMAIL, to_email, msg.as_string())
-        server.quit()
-        
-        print(f"✅ Email sent to {to_email}")
-        return True
-    except Exception as e:
-        print(f"❌ Failed to send email to {to_email}: {e}")
-        return False
-
-def send_match_cancellation(to_email: str, player_name: str, match_title: str, date: str, time: str):
+def build_match_cancellation(to_email: str, player_name: str, match_title: str, date: str, time: str):
     """
-    Sends a match cancellation email to a player.
+    Builds the match cancellation email for a player.
     """
-    try:
-        subject = f"❌ Match Cancelled: {match_title}"
+    subject = f"❌ Match Cancelled: {match_title}"
         
-        body = f"""
+    body = f"""
         <html>
           <body>
             <h2>Hello {player_name},</h2>
@@ -83,24 +89,39 @@ def send_match_cancellation(to_email: str, player_name: str, match_title: str, d
           </body>
         </html>
         """
+    return build_message(to_email, subject, body)
 
-        msg = MIMEMultipart()
-        msg["From"] = SENDER_EMAIL
-        msg["To"] = to_email
-        msg["Subject"] = subject
+def send_message(msg):
+    """
+    Sends one message on a dedicated SMTP session.
+    Request handlers should use the background dispatcher (mail_dispatcher) instead.
+    """
+    server = open_smtp_connection()
+    try:
+        server.sendmail(SENDER_EMAIL or "", msg["To"], msg.as_string())
+    finally:
+        server.quit()
 
-        msg.attach(MIMEText(body, "html"))
+def send_match_reminder(to_email: str, player_name: str, match_title: str, time: str, city: str, stadium: str):
+    """
+    Sends a match reminder email to a player.
+    """
+    try:
+        send_message(build_match_reminder(to_email, player_name, match_title, time, city, stadium))
+        logger.info("Email sent to %s", to_email)
+        return True
+    except Exception as e:
+        logger.error("Failed to send email to %s: %s", to_email, e)
+        return False
 
-        # Connect to server
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(SENDER_EMAIL, SENDER_PASSWORD)
-        
-        server.sendmail(SENDER_EMAIL, to_email, msg.as_string())
-        server.quit()
-        
-        print(f"✅ Cancellation email sent to {to_email}")
+def send_match_cancellation(to_email: str, player_name: str, match_title: str, date: str, time: str):
+    """
+    Sends a match cancellation email to a player.
+    """
+    try:
+        send_message(build_match_cancellation(to_email, player_name, match_title, date, time))
+        logger.info("Cancellation email sent to %s", to_email)
         return True
     except Exception as e:
-        print(f"❌ Failed to send cancellation email to {to_email}: {e}")
+        logger.error("Failed to send cancellation email to %s: %s", to_email, e)
         return False
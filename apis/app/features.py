@@ -0,0 +1,232 @@
+"""
+Feature pipeline shared by every match recommender.
+
+Matches are first encoded into a compact "raw" matrix (integer codes for
+categoricals, plain numbers otherwise), one column at a time. transform()
+then turns raw rows into model vectors: a sparse one-hot block per
+categorical followed by standardized numerics. Vocabularies are
+append-only, so a given match always gets the same codes across requests;
+set FEATURE_PIPELINE_PATH to persist them with the scaling statistics and
+keep the codes across restarts too.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+
+import numpy as np
+from scipy import sparse
+from dotenv import load_dotenv
+
+from .geo import gazetteer
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Writable file where vocabularies and scaling statistics are kept (empty: memory only)
+FEATURE_PIPELINE_PATH = os.getenv("FEATURE_PIPELINE_PATH", "")
+
+DEFAULT_NB_PLAYERS = 10
+DEFAULT_MIN_AGE = 0
+DEFAULT_MAX_AGE = 100
+
+# Match attributes the pipeline reads (ORM objects or query rows)
+FEATURE_ATTRIBUTES = (
+    "city", "stadium", "type_match", "price_per_player",
+    "nb_players", "min_age", "max_age", "starts_at",
+)
+
+CATEGORICAL = ("city", "stadium", "type_match")
+RAW_COLUMNS = CATEGORICAL + (
+    "price_per_player", "nb_players", "min_age", "max_age", "weekday", "hour", "lat", "lon",
+)
+RAW = {name: i for i, name in enumerate(RAW_COLUMNS)}
+NUMERIC = (
+    "price_per_player", "nb_players", "age_mid", "age_span",
+    "weekday_sin", "weekday_cos", "hour_sin", "hour_cos", "lat", "lon",
+)
+
+
+def _categorical_key(name, row):
+    if name == "stadium":
+        # Stadium names are only unique within a city
+        return f"{(row.city or '').strip().casefold()}|{(row.stadium or '').strip().casefold()}" if row.stadium else ""
+    value = getattr(row, name)
+    return value.strip().casefold() if value else ""
+
+
+class MatchFeaturePipeline:
+    def __init__(self, path: str = FEATURE_PIPELINE_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self.vocabs = {name: {} for name in CATEGORICAL}
+        self.mean = np.zeros(len(NUMERIC))
+        self.std = np.ones(len(NUMERIC))
+        self._dirty = False  # Vocabularies or scaling changed since the last save
+        if path and os.path.exists(path):
+            self._restore()
+
+    # ----- persistence -----
+
+    def _restore(self):
+        with open(self.path) as f:
+            state = json.load(f)
+        for name in CATEGORICAL:
+            self.vocabs[name].update(state["vocabs"].get(name, {}))
+        if state.get("numeric") == list(NUMERIC):
+            self.mean = np.array(state["mean"], dtype=np.float64)
+            self.std = np.array(state["std"], dtype=np.float64)
+
+    def save(self):
+        """Persist the state if it changed, atomically (temp file + rename)"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            state = {
+                "vocabs": self.vocabs,
+                "numeric": list(NUMERIC),
+                "mean": self.mean.tolist(),
+                "std": self.std.tolist(),
+            }
+            try:
+                # Unique temp file: several workers may save the same pipeline
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "w") as f:
+                        json.dump(state, f)
+                    os.replace(tmp, self.path)
+                except BaseException:
+                    os.unlink(tmp)
+                    raise
+            except OSError:
+                # Still dirty: the next save retries; requests keep the in-memory state
+                logger.warning("Could not save the feature pipeline to %s", self.path, exc_info=True)
+                return
+            self._dirty = False
+
+    # ----- raw encoding -----
+
+    def _codes(self, name, keys):
+        """Vocabulary codes of a column of keys ("" -> -1), growing the vocabulary"""
+        uniques, inverse = np.unique(np.asarray(keys, dtype=str), return_inverse=True)
+        vocab = self.vocabs[name]
+        with self._lock:
+            size = len(vocab)
+            codes = np.array([
+                -1 if not key else vocab.setdefault(key, len(vocab)) for key in uniques.tolist()
+            ], dtype=np.float64)
+            self._dirty |= len(vocab) != size
+        return codes[inverse] if len(inverse) else codes[:0]
+
+    def encode(self, matches):
+        """(n, len(RAW_COLUMNS)) raw matrix of matches, built column by column"""
+        n = len(matches)
+        raw = np.full((n, len(RAW_COLUMNS)), np.nan)
+        if n == 0:
+            return raw
+
+        for name in CATEGORICAL:
+            raw[:, RAW[name]] = self._codes(name, [_categorical_key(name, m) for m in matches])
+
+        def column(attr, default=np.nan):
+            return np.array(
+                [default if getattr(m, attr) is None else getattr(m, attr) for m in matches],
+                dtype=np.float64
+            )
+
+        raw[:, RAW["price_per_player"]] = column("price_per_player")
+        raw[:, RAW["nb_players"]] = column("nb_players", DEFAULT_NB_PLAYERS)
+        raw[:, RAW["nb_players"]][raw[:, RAW["nb_players"]] == 0] = DEFAULT_NB_PLAYERS
+        raw[:, RAW["min_age"]] = column("min_age", DEFAULT_MIN_AGE)
+        raw[:, RAW["max_age"]] = column("max_age", DEFAULT_MAX_AGE)
+
+        starts = np.array([m.starts_at for m in matches], dtype="datetime64[m]")
+        known = ~np.isnat(starts)
+        days = starts[known].astype("datetime64[D]")
+        raw[known, RAW["weekday"]] = (days.astype(np.int64) + 3) % 7  # Monday = 0
+        raw[known, RAW["hour"]] = (starts[known] - days).astype(np.int64) / 60
+
+        places = {}
+        for i, m in enumerate(matches):
+            places.setdefault((m.city, m.stadium), []).append(i)
+        for (city, stadium), rows in places.items():
+            location = gazetteer.locate(city, stadium)
+            if location:
+                raw[rows, RAW["lat"]] = location[0]
+                raw[rows, RAW["lon"]] = location[1]
+        return raw
+
+    # ----- model vectors -----
+
+    @staticmethod
+    def _numeric(raw):
+        weekday = raw[:, RAW["weekday"]] * (2 * np.pi / 7)
+        hour = raw[:, RAW["hour"]] * (2 * np.pi / 24)
+        return np.column_stack([
+            raw[:, RAW["price_per_player"]],
+            raw[:, RAW["nb_players"]],
+            (raw[:, RAW["min_age"]] + raw[:, RAW["max_age"]]) / 2,
+            raw[:, RAW["max_age"]] - raw[:, RAW["min_age"]],
+            np.sin(weekday), np.cos(weekday),
+            np.sin(hour), np.cos(hour),
+            raw[:, RAW["lat"]],
+            raw[:, RAW["lon"]],
+        ])
+
+    def fit(self, raw):
+        """Fit the numeric scaling on `raw` (typically every stored match) and persist changes"""
+        if len(raw):
+            numeric = self._numeric(raw)
+            with np.errstate(invalid="ignore"), self._lock:
+                counts = (~np.isnan(numeric)).sum(axis=0)
+                mean = np.where(counts > 0, np.nansum(numeric, axis=0) / np.maximum(counts, 1), 0)
+                var = np.where(counts > 0, np.nansum((numeric - mean) ** 2, axis=0) / np.maximum(counts, 1), 1)
+                std = np.sqrt(var)
+                std = np.where(std > 1e-9, std, 1)
+                if not (np.array_equal(mean, self.mean) and np.array_equal(std, self.std)):
+                    self.mean, self.std = mean, std
+                    self._dirty = True
+        self.save()
+        return self
+
+    def sizes(self):
+        """Snapshot of the vocabulary sizes; pass it to transform() for a consistent width"""
+        with self._lock:
+            return tuple(len(self.vocabs[name]) for name in CATEGORICAL)
+
+    @property
+    def dimension(self):
+        return sum(self.sizes()) + len(NUMERIC)
+
+    def transform(self, raw, sizes=None):
+        """
+        Model vectors of raw rows as a CSR matrix: one-hot city / stadium /
+        type blocks, then standardized numerics (missing values at the mean).
+        """
+        sizes = sizes or self.sizes()
+        n = len(raw)
+        rows = np.arange(n)
+        blocks = []
+        for name, size in zip(CATEGORICAL, sizes):
+            codes = raw[:, RAW[name]]
+            valid = (codes >= 0) & (codes < size)
+            blocks.append(sparse.csr_matrix(
+                (np.ones(valid.sum()), (rows[valid], codes[valid].astype(np.int64))), shape=(n, size)
+            ))
+        with self._lock:
+            mean, std = self.mean, self.std
+        numeric = (self._numeric(raw) - mean) / std
+        blocks.append(sparse.csr_matrix(np.nan_to_num(numeric, nan=0.0)))
+        return sparse.hstack(blocks, format="csr")
+
+    def vectors(self, matches, sizes=None):
+        """encode() + transform() for a list of matches"""
+        return self.transform(self.encode(matches), sizes)
+
+
+feature_pipeline = MatchFeaturePipeline()
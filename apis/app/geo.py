@@ -0,0 +1,124 @@
+"""
+Static gazetteer of the cities / stadiums offered by the frontend
+(aa/src/constants.js) and a uniform grid index over points, used to keep
+recommendation and search candidates close to where a user plays.
+"""
+
+import json
+import math
+import os
+from collections import defaultdict
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+GAZETTEER_PATH = os.getenv(
+    "GAZETTEER_PATH", os.path.join(os.path.dirname(__file__), "data", "gazetteer.json")
+)
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+
+def _key(name):
+    return name.strip().casefold() if name else None
+
+
+class Gazetteer:
+    """City and stadium coordinates; lookups are case-insensitive"""
+
+    def __init__(self, path: str = GAZETTEER_PATH):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        self.cities = {_key(c): (p["lat"], p["lon"]) for c, p in data["cities"].items()}
+        self.city_names = {_key(c): c for c in data["cities"]}  # As stored on matches
+        self.stadiums = {
+            (_key(c), _key(s)): (p["lat"], p["lon"])
+            for c, stadiums in data["stadiums"].items()
+            for s, p in stadiums.items()
+        }
+
+    def city(self, name):
+        return self.cities.get(_key(name))
+
+    def locate(self, city, stadium=None):
+        """(lat, lon) of the stadium when known, else of the city, else None"""
+        return self.stadiums.get((_key(city), _key(stadium))) or self.cities.get(_key(city))
+
+    def cities_near(self, city, radius_km):
+        """Names of the cities within radius_km of `city` (itself included), None if unknown"""
+        center = self.city(city)
+        if center is None:
+            return None
+        keys = list(self.cities)
+        coords = np.array([self.cities[k] for k in keys])
+        distances = min_distance_km(coords[:, 0], coords[:, 1], [center])
+        return [self.city_names[k] for k, d in zip(keys, distances) if d <= radius_km]
+
+
+def min_distance_km(lats, lons, points):
+    """
+    Haversine distance from every (lats[i], lons[i]) to the closest of
+    `points` [(lat, lon), ...]. Rows with NaN coordinates give NaN.
+    """
+    lats = np.radians(np.asarray(lats, dtype=np.float64))[:, None]
+    lons = np.radians(np.asarray(lons, dtype=np.float64))[:, None]
+    centers = np.radians(np.asarray(points, dtype=np.float64)).reshape(-1, 2)
+    a = (
+        np.sin((lats - centers[:, 0]) / 2) ** 2
+        + np.cos(lats) * np.cos(centers[:, 0]) * np.sin((lons - centers[:, 1]) / 2) ** 2
+    )
+    return (2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))).min(axis=1)
+
+
+class GeoGrid:
+    """
+    Uniform lat/lon grid: key -> cell. near() returns the keys of every
+    cell overlapping the bounding box of a circle, a superset that callers
+    refine with an exact distance.
+    """
+
+    def __init__(self, cell_km: float = 25.0):
+        self.cell_deg = cell_km / KM_PER_DEGREE
+        self._cells = defaultdict(set)
+        self._cell_of = {}
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg))
+
+    def add(self, key, lat, lon):
+        self.remove(key)
+        cell = self._cell(lat, lon)
+        self._cells[cell].add(key)
+        self._cell_of[key] = cell
+
+    def remove(self, key):
+        cell = self._cell_of.pop(key, None)
+        if cell is not None:
+            members = self._cells[cell]
+            members.discard(key)
+            if not members:
+                del self._cells[cell]
+
+    def clear(self):
+        self._cells.clear()
+        self._cell_of.clear()
+
+    def near(self, lat, lon, radius_km):
+        lat_span = radius_km / KM_PER_DEGREE
+        lon_span = lat_span / max(math.cos(math.radians(lat)), 0.01)
+        lat_lo, lon_lo = self._cell(lat - lat_span, lon - lon_span)
+        lat_hi, lon_hi = self._cell(lat + lat_span, lon + lon_span)
+        keys = set()
+        for i in range(lat_lo, lat_hi + 1):
+            for j in range(lon_lo, lon_hi + 1):
+                keys |= self._cells.get((i, j), set())
+        return keys
+
+    def __len__(self):
+        return len(self._cell_of)
+
+
+gazetteer = Gazetteer()
@@ -0,0 +1,186 @@
+"""
+Request-level performance instrumentation.
+
+An ASGI middleware times every request and labels it with its route
+template (/matches/{match_id}/join, not the raw path). SQLAlchemy cursor
+events count the statements and database time of the request that runs
+them, and timed_section() attributes other costly sections (ML scoring)
+to it. The request's stats live in a contextvar, which follows the request
+into the threadpool and into AsyncSession.run_sync.
+
+Everything lands in the metrics registry served on GET /metrics. With
+SLOW_REQUEST_MS set, requests slower than that are logged (a warning)
+with the SQL they ran.
+"""
+
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from dotenv import load_dotenv
+from sqlalchemy import event
+
+from . import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Requests slower than this are logged with their SQL (0: off)
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+# Statements kept per request for the slow-request log
+SLOW_REQUEST_MAX_STATEMENTS = int(os.getenv("SLOW_REQUEST_MAX_STATEMENTS", "50"))
+
+request_seconds = metrics.Histogram(
+    "http_request_duration_seconds", "Request latency by route"
+)
+requests_total = metrics.Counter(
+    "http_requests_total", "Requests by route and status code"
+)
+request_statements = metrics.Histogram(
+    "http_request_db_statements", "SQL statements run per request",
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+request_db_seconds = metrics.Histogram(
+    "http_request_db_seconds", "Time spent in SQL statements per request"
+)
+slow_requests = metrics.Counter(
+    "http_slow_requests_total", "Requests slower than SLOW_REQUEST_MS"
+)
+db_statements_total = metrics.Counter(
+    "db_statements_total", "SQL statements, in and out of requests"
+)
+
+
+class RequestStats:
+    def __init__(self, capture_sql: bool = False):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.sections = {}  # timed_section name -> seconds
+        self.sql = [] if capture_sql else None  # (seconds, statement) for the slow log
+
+
+_current = ContextVar("request_stats", default=None)
+
+
+def current_stats():
+    """Stats of the request being served, None outside requests"""
+    return _current.get()
+
+
+@contextmanager
+def timed_section(name: str, histogram, **labels):
+    """
+    Time a block (or, as a decorator, a function) into `histogram` and add
+    it to the current request's `name` section
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        histogram.observe(elapsed, **labels)
+        stats = _current.get()
+        if stats is not None:
+            stats.sections[name] = stats.sections.get(name, 0.0) + elapsed
+
+
+# ----- SQL -----
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    db_statements_total.inc(engine=conn.engine.pool.logging_name or "default")
+    stats = _current.get()
+    if stats is None:
+        return
+    stats.statements += 1
+    stats.db_seconds += elapsed
+    if stats.sql is not None and len(stats.sql) < SLOW_REQUEST_MAX_STATEMENTS:
+        stats.sql.append((elapsed, statement))
+
+
+def _handle_error(context):
+    # Failed statements never reach after_cursor_execute
+    starts = context.connection.info.get("query_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engine(engine):
+    """Count the statements and time of `engine` (sync or async) per request"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+# ----- middleware -----
+
+def _route_of(scope):
+    route = scope.get("route")
+    # Unmatched paths share one label, so scanners cannot blow up the series
+    return getattr(route, "path", None) or "unmatched"
+
+
+class InstrumentationMiddleware:
+    """Pure ASGI middleware (no BaseHTTPMiddleware overhead, streaming untouched)"""
+
+    def __init__(self, app, slow_request_ms: float = SLOW_REQUEST_MS):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats(capture_sql=bool(self.slow_request_ms))
+        token = _current.set(stats)
+        status_code = [500]  # Unhandled exceptions never start a response
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current.reset(token)
+            self._record(scope, stats, status_code[0], elapsed)
+
+    def _record(self, scope, stats, status_code, elapsed):
+        method, route = scope["method"], _route_of(scope)
+        request_seconds.observe(elapsed, method=method, route=route)
+        requests_total.inc(method=method, route=route, status=status_code)
+        request_statements.observe(stats.statements, route=route)
+        request_db_seconds.observe(stats.db_seconds, route=route)
+
+        if self.slow_request_ms and elapsed * 1000 >= self.slow_request_ms:
+            slow_requests.inc(route=route)
+            sections = "".join(f", {name} {seconds * 1000:.0f} ms" for name, seconds in stats.sections.items())
+            # One record: the fields stay queryable, the statements slowest first
+            logger.warning(
+                "Slow request %s %s (%s) -> %s in %.0f ms: %d SQL statements in %.0f ms%s",
+                method, scope["path"], route, status_code, elapsed * 1000,
+                stats.statements, stats.db_seconds * 1000, sections,
+                extra={
+                    "route": route,
+                    "status": status_code,
+                    "duration_ms": round(elapsed * 1000, 1),
+                    "db_statements": stats.statements,
+                    "db_ms": round(stats.db_seconds * 1000, 1),
+                    "sections_ms": {name: round(seconds * 1000, 1) for name, seconds in stats.sections.items()},
+                    "sql": [
+                        {"ms": round(seconds * 1000, 1), "statement": " ".join(statement.split())[:500]}
+                        for seconds, statement in sorted(stats.sql, key=lambda s: s[0], reverse=True)
+                    ],
+                },
+            )
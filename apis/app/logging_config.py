@@ -0,0 +1,177 @@
+"""
+Structured, non-blocking logging.
+
+Application code logs through the standard `logging` module
+(`logger = logging.getLogger(__name__)`). setup_logging() gives the root
+logger a single QueueHandler: emitting a record only stamps it and puts it
+on a bounded in-memory queue. A QueueListener thread formats the records
+(one JSON object per line by default) and writes them to stdout, so a slow
+or contended stdout never blocks a request. When the queue is full,
+records are dropped and counted instead of blocking.
+
+Every record carries the id of the request that produced it. The id comes
+from the X-Request-ID header or is generated, and is echoed back in the
+response. Background work that a request spawns (queued emails) keeps it.
+
+    LOG_LEVEL=DEBUG LOG_FORMAT=text uvicorn app.main:app
+"""
+
+import json
+import logging
+import os
+import queue
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from dotenv import load_dotenv
+
+from . import metrics
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # "json" or "text"
+# Records waiting for the writer thread; beyond this they are dropped
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+log_records = metrics.Counter("log_records_total", "Log records emitted, by level")
+log_records_dropped = metrics.Counter("log_records_dropped_total", "Log records dropped because the queue was full")
+
+_request_id = ContextVar("request_id", default=None)
+
+# LogRecord attributes that are not `extra` fields
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+def set_request_id(request_id):
+    """Bind `request_id` to the current context (request, job); returns a token for reset_request_id"""
+    return _request_id.set(request_id)
+
+
+def reset_request_id(token):
+    _request_id.reset(token)
+
+
+def new_request_id(prefix: str = ""):
+    return prefix + uuid.uuid4().hex[:16]
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; `extra={...}` fields become top-level keys"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = None
+        return super().format(record)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Stamps the request id on the caller's side, never waits for the writer"""
+
+    def prepare(self, record):
+        record.request_id = _request_id.get()
+        # Resolved here: the writer thread must not touch the caller's objects
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        log_records.inc(level=record.levelname)
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_records_dropped.inc(level=record.levelname)
+
+
+_listener = None
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, stream=None):
+    """Route the root logger through the queue (idempotent); call stop_logging() to flush"""
+    global _listener
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    records = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    root = logging.getLogger()
+    root.handlers = [NonBlockingQueueHandler(records)]
+    root.setLevel(level)
+    # Chatty libraries: HTTP clients log every call (the load test drives the
+    # app through one), aiosqlite every cursor operation
+    for name in ("httpx", "httpcore", "aiosqlite", "asyncio"):
+        logging.getLogger(name).setLevel(max(root.level, logging.WARNING))
+    _listener = QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+
+    metrics.Gauge("log_queue_size", "Log records waiting for the writer thread", callback=records.qsize)
+
+
+def stop_logging():
+    """Write out the queued records (shutdown)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class RequestIdMiddleware:
+    """Binds a request id to the request's context and returns it in X-Request-ID"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        incoming = dict(scope["headers"]).get(REQUEST_ID_HEADER.lower().encode(), b"").decode("latin-1")
+        # Client ids are kept when reasonable, so calls can be traced across services
+        request_id = incoming if 0 < len(incoming) <= 64 and incoming.isprintable() else new_request_id()
+        token = _request_id.set(request_id)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", []).append((REQUEST_ID_HEADER.lower().encode(), request_id.encode()))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _request_id.reset(token)
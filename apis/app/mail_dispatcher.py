@@ -0,0 +1,246 @@
+import json
+import logging
+import os
+import queue
+import smtplib
+import threading
+import time
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+from . import email_utils, metrics
+from .logging_config import current_request_id, set_request_id, reset_request_id
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MAIL_WORKERS = int(os.getenv("MAIL_WORKERS", "2"))
+MAIL_QUEUE_SIZE = int(os.getenv("MAIL_QUEUE_SIZE", "1000"))
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "20"))
+MAIL_MAX_RETRIES = int(os.getenv("MAIL_MAX_RETRIES", "3"))
+MAIL_RETRY_BACKOFF = float(os.getenv("MAIL_RETRY_BACKOFF", "2"))
+# SMTP sessions idle for longer than this are closed (servers drop them anyway)
+MAIL_IDLE_TIMEOUT = float(os.getenv("MAIL_IDLE_TIMEOUT", "60"))
+# Undeliverable messages, one JSON object per line (next to the gazetteer by default)
+MAIL_DEAD_LETTER_PATH = os.getenv(
+    "MAIL_DEAD_LETTER_PATH", os.path.join(os.path.dirname(__file__), "data", "mail_dead_letters.jsonl")
+)
+
+_STOP = object()
+
+mail_send_seconds = metrics.Histogram(
+    "mail_send_seconds", "SMTP delivery of one message (session setup included)"
+)
+
+
+def is_permanent(error) -> bool:
+    """
+    5xx replies (recipient or sender refused, bad credentials, rejected
+    data...) fail the same way on every retry. Connection errors and 4xx
+    replies are worth retrying.
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return isinstance(error, smtplib.SMTPNotSupportedError)
+
+
+class MailDispatcher:
+    """
+    Background email sender.
+
+    Request handlers call enqueue() and return immediately. A small pool of
+    worker threads drains the bounded queue in batches, each worker reusing
+    one persistent SMTP session (STARTTLS + login happen once per session,
+    not once per email). Failed sends are retried with exponential backoff
+    on a fresh session; messages that still fail, that are refused for good
+    (5xx), or that do not fit in the queue, are appended to a JSONL
+    dead-letter file.
+    """
+
+    def __init__(self, workers: int = MAIL_WORKERS, queue_size: int = MAIL_QUEUE_SIZE,
+                 batch_size: int = MAIL_BATCH_SIZE, max_retries: int = MAIL_MAX_RETRIES,
+                 retry_backoff: float = MAIL_RETRY_BACKOFF, idle_timeout: float = MAIL_IDLE_TIMEOUT,
+                 dead_letter_path: str = MAIL_DEAD_LETTER_PATH, connect=None, sender: str = None):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.idle_timeout = idle_timeout
+        self.dead_letter_path = dead_letter_path
+        self.connect = connect or email_utils.open_smtp_connection
+        self.sender = sender if sender is not None else (email_utils.SENDER_EMAIL or "")
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._dead_letter_lock = threading.Lock()
+        # Set when stop() runs out of time: workers dead-letter what is left
+        self._abort = threading.Event()
+
+        self.sent = 0
+        self.retried = 0
+        self.dead_lettered = 0
+        self.connections_opened = 0
+
+    # ----- lifecycle -----
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._abort.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"mail-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: float = 10):
+        """
+        Send what is already queued, then stop the workers. Never waits
+        longer than `timeout`: past it, the messages not sent yet are
+        dead-lettered instead.
+        """
+        with self._lock:
+            threads, self._threads = self._threads, []
+        deadline = time.monotonic() + timeout
+        for _ in threads:
+            try:
+                # A full queue would block a plain put() until the workers drain it
+                self._queue.put(_STOP, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                self._abort.set()
+                break
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        if any(thread.is_alive() for thread in threads):
+            self._abort.set()
+
+    def join(self):
+        """Block until every queued message was sent or dead-lettered"""
+        self._queue.join()
+
+    # ----- producer side -----
+
+    def enqueue(self, msg) -> bool:
+        """
+        Queue a MIME message for delivery. Never blocks: when the queue is
+        full the message goes straight to the dead-letter store and False
+        is returned.
+        """
+        self.start()
+        # The request that queued it, so the worker's logs point back to it
+        job = {"to": msg["To"], "subject": msg["Subject"], "message": msg.as_string(),
+               "request_id": current_request_id()}
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except queue.Full:
+            self._dead_letter(job, "queue full")
+            return False
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "sent": self.sent,
+            "retried": self.retried,
+            "dead_lettered": self.dead_lettered,
+            "connections_opened": self.connections_opened,
+        }
+
+    # ----- worker side -----
+
+    def _run(self):
+        server = None
+        try:
+            while True:
+                aborted = self._abort.is_set()  # Then: drain what is left, and exit
+                try:
+                    first = self._queue.get(block=not aborted, timeout=self.idle_timeout if server else None)
+                except queue.Empty:
+                    if aborted:
+                        return
+                    server = self._close(server)
+                    continue
+
+                batch = [first]
+                while len(batch) < self.batch_size and batch[-1] is not _STOP:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                stopping = False
+                for job in batch:
+                    if job is _STOP:
+                        stopping = True
+                    elif self._abort.is_set():
+                        self._dead_letter(job, "shutdown")
+                    else:
+                        token = set_request_id(job.get("request_id"))
+                        try:
+                            server = self._deliver(server, job)
+                        finally:
+                            reset_request_id(token)
+                    self._queue.task_done()
+                if stopping:
+                    return
+        finally:
+            self._close(server)
+
+    def _deliver(self, server, job):
+        """Send one job, retrying on a fresh session; returns the session to reuse"""
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                if server is None:
+                    server = self.connect()
+                    self._count("connections_opened")
+                server.sendmail(self.sender, job["to"], job["message"])
+                self._count("sent")
+                mail_send_seconds.observe(time.perf_counter() - start, result="sent")
+                return server
+            except (smtplib.SMTPException, OSError) as e:
+                mail_send_seconds.observe(time.perf_counter() - start, result="error")
+                server = self._close(server)
+                if attempt == self.max_retries or is_permanent(e):
+                    self._dead_letter(job, str(e))
+                    return None
+                self._count("retried")
+                logger.warning("Email to %s failed (attempt %d), retrying: %s", job["to"], attempt + 1, e)
+                time.sleep(self.retry_backoff * (2 ** attempt))
+        return server
+
+    @staticmethod
+    def _close(server):
+        if server is not None:
+            try:
+                server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+        return None
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _dead_letter(self, job, error: str):
+        self._count("dead_lettered")
+        logger.error("Email to %s moved to dead letters: %s", job["to"], error)
+        if not self.dead_letter_path:
+            return
+        record = dict(job, error=error, failed_at=datetime.utcnow().isoformat())
+        with self._dead_letter_lock:
+            with open(self.dead_letter_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+
+mail_dispatcher = MailDispatcher()
+
+metrics.Gauge(
+    "mail_dispatcher_messages", "Outbound emails by state (queued now, totals since start)",
+    callback=lambda: {(("state", k),): v for k, v in mail_dispatcher.stats().items()},
+)
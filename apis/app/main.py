@@ -1,17 +1,28 @@
-from fastapi import FastAPI
-from .database import engine, Base
+import logging
+import secrets
+from fastapi import FastAPI, Header, HTTPException, status
+from .logging_config import setup_logging, stop_logging, RequestIdMiddleware, REQUEST_ID_HEADER
+from .database import engine, async_engine, Base
 from .routers import users, auth, matches, feedback, recommendations, teams
+from . import metrics
+from .instrumentation import InstrumentationMiddleware, instrument_engine
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import PlainTextResponse
+from .pagination import NEXT_CURSOR_HEADER
 import os
 
+# JSON lines on stdout, written by a background thread (LOG_LEVEL, LOG_FORMAT)
+setup_logging()
+logger = logging.getLogger(__name__)
+
 # Create tables
-print("Creating tables...")
+logger.info("Creating tables...")
 try:
     Base.metadata.create_all(bind=engine)
-    print("Tables created successfully!")
-except Exception as e:
-    print(f"Error creating tables: {e}")
+    logger.info("Tables created successfully!")
+except Exception:
+    logger.exception("Error creating tables")
 
 app = FastAPI(
     title="Football Match Organizer API",
@@ -19,12 +30,20 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Per-route latency / status / SQL metrics, served on /metrics
+instrument_engine(engine)
+instrument_engine(async_engine)
+app.add_middleware(InstrumentationMiddleware)
+# Outside the instrumentation, so its slow-request logs carry the request id
+app.add_middleware(RequestIdMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173", "http://127.0.0.1:5173"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, REQUEST_ID_HEADER],
 )
 
 # Ensure static directories exist
@@ -41,84 +60,39 @@ app.include_router(teams.router)
 
 @app.get("/")
 def root():
-    print("Root endpoint hit!")
+    logger.debug("Root endpoint hit!")
     return {"message": "Welcome to the Football Match Organizer API"}
 
+# Scrapers send "Authorization: Bearer <METRICS_TOKEN>"; without a token, /metrics is not served
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+if METRICS_TOKEN:
+    @app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+    def read_metrics(authorization: str = Header(default="")):
+        """Prometheus scrape endpoint"""
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() != "bearer" or not secrets.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid metrics token",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # --- Email Notification Scheduler ---
 import asyncio
-from datetime import date
-from .database import SessionLocal
-from . import models
-from .email_utils import send_match_reminder
-
-async def check_matches_and_send_emails():
-    """
-    Background task to check for matches scheduled for TODAY and send emails to participants.
-    """
-    print("📧 Starting email notification service...")
-    while True:
-        try:
-            today_str = date.today().isoformat() # YYYY-MM-DD
-            print(f"🔍 Checking matches for date: {today_str}")
-            
-            db = SessionLocal()
-            try:
-                # Find matches for today
-                matches = db.query(models.Match).filter(models.Match.date == today_str).all()
-                
-                if matches:
-                    print(f"⚽ Found {len(matches)} matches for today.")
-                    for match in matches:
-                        # Collect all participants
-                        participants = []
-                        
-                        # 1. Individual participants
-                        if match.participants:
-                            participants.extend(match.participants)
-                            
-                        # 2. Team A members (if team match)
-                        if match.is_team_match and match.team_a:
-                            for member in match.team_a.members:
-                                if member.user: # Only if they have a user account
-                                    participants.append(member.user)
-                                    
-                        # 3. Team B members (if team match)
-                        if match.is_team_match and match.team_b:
-                            for member in match.team_b.members:
-                                if member.user:
-                                    participants.append(member.user)
-                        
-                        # Deduplicate participants
-                        unique_participants = {p.id: p for p in participants}.values()
-                        
-                        for player in unique_participants:
-                            if player.email:
-                                print(f"   📨 Sending email to {player.email} for match '{match.title}'")
-                                send_match_reminder(
-                                    to_email=player.email,
-                                    player_name=player.full_name or "Player",
-                                    match_title=match.title,
-                                    time=match.start_time,
-                                    city=match.city,
-                                    stadium=match.stadium
-                                )
-                else:
-                    print("✅ No matches found for today.")
-                    
-            finally:
-                db.close()
-                
-            # Wait for 24 hours before checking again (or check every hour)
-            # For demonstration, we check every 24 hours. 
-            # In a real app, you might want to run this at a specific time (e.g., 8 AM).
-            # Here we just sleep for a long time to avoid spamming in dev.
-            await asyncio.sleep(24 * 3600) 
-            
-        except Exception as e:
-            print(f"❌ Error in email service: {e}")
-            await asyncio.sleep(3600) # Retry in 1 hour on error
+from .mail_dispatcher import mail_dispatcher
+from .reminder_scheduler import reminder_scheduler
 
 @app.on_event("startup")
 async def startup_event():
-    # Start the email checker in the background
-    asyncio.create_task(check_matches_and_send_emails())
+    # Start the outbound mail workers and the reminder scheduler in the background
+    mail_dispatcher.start()
+    app.state.reminder_task = asyncio.create_task(reminder_scheduler.run_forever())
+
+@app.on_event("shutdown")
+def shutdown_event():
+    app.state.reminder_task.cancel()
+    # Flush queued emails before the process exits
+    mail_dispatcher.stop()
+    stop_logging()
@@ -1,59 +1,289 @@
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sklearn.neighbors import NearestNeighbors
-from sklearn.preprocessing import LabelEncoder
+from starlette.concurrency import run_in_threadpool
 import numpy as np
-from datetime import date
-from . import models
+import threading
+import time
+import os
+from . import models, metrics
+from .instrumentation import timed_section
+from .geo import gazetteer, min_distance_km, GeoGrid
+from .features import feature_pipeline, FEATURE_ATTRIBUTES, RAW_COLUMNS, RAW
+from .similarity import make_index, knn_mean_distances, history_batches, distances_to_similarities
+from .collaborative import participation_graph, ParticipationGraph
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Full reload interval, so that several worker processes converge even when
+# a match was created through another process.
+FEATURE_STORE_REFRESH_SECONDS = int(os.getenv("FEATURE_STORE_REFRESH_SECONDS", "300"))
+
+# Candidates are first pruned to this radius around the places a user
+# already played (empty or 0 disables the geographic pre-filter)
+RECOMMENDER_RADIUS_KM = float(os.getenv("RECOMMENDER_RADIUS_KM", "50") or 0)
+
+# Nearest-neighbour index used to shortlist candidates before exact scoring:
+# brute (no index, every candidate is scored), balltree, kdtree or lsh
+RECOMMENDER_BACKEND = os.getenv("RECOMMENDER_BACKEND", "brute")
+# Candidates shortlisted per history row when an index is used
+RECOMMENDER_SHORTLIST = int(os.getenv("RECOMMENDER_SHORTLIST", "200"))
+
+# Share of the final score given to collaborative filtering ("players like
+# you also joined", see collaborative.py); 0 keeps pure content-based KNN
+RECOMMENDER_CF_WEIGHT = float(os.getenv("RECOMMENDER_CF_WEIGHT", "0.3") or 0)
+
+ml_scoring_seconds = metrics.Histogram(
+    "ml_scoring_seconds", "Recommender scoring (batch runs include their queries)"
+)
+
+
+def feature_columns():
+    """Match columns the feature pipeline reads, for lean history / candidate queries"""
+    return [getattr(models.Match, name) for name in FEATURE_ATTRIBUTES]
+
+
+class MatchFeatureStore:
+    """
+    Process-wide matrix of upcoming individual matches, one raw row per
+    match as encoded by features.feature_pipeline (vocabulary codes and
+    plain numbers, see features.RAW_COLUMNS). Recommenders turn the rows
+    they need into model vectors with feature_pipeline.transform().
+    The store is filled once from the database and then kept up to date
+    by the matches router (upsert on create/join, remove on delete).
+
+    Located matches (see geo.gazetteer) are also kept in a grid index so
+    candidates can be restricted to a radius before any scoring. With a
+    similarity backend other than brute, model vectors are also kept in a
+    nearest-neighbour index (see similarity.py), built on load and updated
+    on every upsert / remove.
+
+    `as_of` freezes the start of "upcoming" (default: today, re-evaluated
+    on every call), e.g. to replay history up to a date offline.
+    """
+
+    N_RAW = len(RAW_COLUMNS)
+
+    def __init__(self, refresh_seconds: int = FEATURE_STORE_REFRESH_SECONDS, pipeline=None,
+                 backend: str = RECOMMENDER_BACKEND, as_of=None):
+        self.refresh_seconds = refresh_seconds
+        self.as_of = as_of
+        self.pipeline = pipeline or feature_pipeline
+        self.index = None if backend == "brute" else make_index(backend)
+        self._index_sizes = None  # Vocabulary sizes the index vectors were built with
+        self._lock = threading.RLock()
+        self._loaded_at = None
+
+        self._size = 0
+        self._ids = np.empty(0, dtype=np.int64)
+        self._starts = np.empty(0, dtype="datetime64[s]")
+        self._raw = np.empty((0, self.N_RAW), dtype=np.float64)
+        self._row_of = {}  # match_id -> row index
+        self._grid = GeoGrid(cell_km=RECOMMENDER_RADIUS_KM or 25.0)
+
+    # ----- storage -----
+
+    def _grow(self, needed):
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 64)
+        ids = np.empty(new_capacity, dtype=np.int64)
+        starts = np.empty(new_capacity, dtype="datetime64[s]")
+        raw = np.empty((new_capacity, self.N_RAW), dtype=np.float64)
+        ids[:self._size] = self._ids[:self._size]
+        starts[:self._size] = self._starts[:self._size]
+        raw[:self._size] = self._raw[:self._size]
+        self._ids, self._starts, self._raw = ids, starts, raw
+
+    def _set_row(self, match, raw_row):
+        row = self._row_of.get(match.id)
+        if row is None:
+            self._grow(self._size + 1)
+            row = self._size
+            self._size += 1
+            self._row_of[match.id] = row
+        self._ids[row] = match.id
+        self._starts[row] = np.datetime64(match.starts_at, "s") if match.starts_at else np.datetime64("NaT")
+        self._raw[row] = raw_row
+        lat, lon = raw_row[RAW["lat"]], raw_row[RAW["lon"]]
+        if np.isnan(lat):
+            self._grid.remove(match.id)
+        else:
+            self._grid.add(match.id, lat, lon)
+        if self._index_sizes is not None:
+            self.index.add(match.id, self.pipeline.transform(raw_row[None, :], self._index_sizes).toarray()[0])
+
+    def _delete_row(self, match_id):
+        row = self._row_of.pop(match_id, None)
+        if row is None:
+            return
+        self._grid.remove(match_id)
+        if self._index_sizes is not None:
+            self.index.remove(match_id)
+        last = self._size - 1
+        if row != last:
+            # Swap the last row into the hole to keep the matrix dense
+            moved_id = int(self._ids[last])
+            self._ids[row] = self._ids[last]
+            self._starts[row] = self._starts[last]
+            self._raw[row] = self._raw[last]
+            self._row_of[moved_id] = row
+        self._size = last
+
+    def today_start(self):
+        return self.as_of or models.day_start()
+
+    @staticmethod
+    def _is_candidate(match, today_start):
+        return (
+            not match.is_team_match
+            and match.starts_at is not None
+            and match.starts_at >= today_start
+            and match.has_spots
+        )
+
+    def load(self, db: Session):
+        """(Re)build the whole store from the database and refit the pipeline scaling"""
+        self.build(self.fetch(db))
+
+    def fetch(self, db: Session):
+        """Rows of every candidate match (the database half of load)"""
+        return db.query(
+            models.Match.id,
+            models.Match.is_team_match,
+            *feature_columns(),
+        ).filter(
+            models.Match.starts_at >= self.today_start(),
+            models.Match.is_team_match == False,
+            models.Match.has_spots  # Full matches are never recommended
+        ).all()
+
+    def build(self, rows):
+        """Replace the store with `rows` and refit the pipeline (CPU only)"""
+        raw = self.pipeline.encode(rows)
+        self.pipeline.fit(raw)
+        with self._lock:
+            self._size = 0
+            self._row_of = {}
+            self._grid.clear()
+            self._index_sizes = None
+            self._grow(len(rows))
+            for row, raw_row in zip(rows, raw):
+                self._set_row(row, raw_row)
+            if self.index is not None:
+                sizes = self.pipeline.sizes()
+                self.index.build(
+                    self._ids[:self._size], self.pipeline.transform(self._raw[:self._size], sizes).toarray()
+                )
+                self._index_sizes = sizes
+            self._loaded_at = time.monotonic()
+
+    def is_stale(self):
+        with self._lock:
+            return (
+                self._loaded_at is None
+                or time.monotonic() - self._loaded_at > self.refresh_seconds
+            )
+
+    def ensure_loaded(self, db: Session):
+        if self.is_stale():
+            self.load(db)
+
+    def upsert(self, match):
+        """Insert or refresh a match; drops it if it is no longer a candidate"""
+        with self._lock:
+            if self._loaded_at is None:
+                return  # Will be picked up by the first load
+            if self._is_candidate(match, self.today_start()):
+                self._set_row(match, self.pipeline.encode([match])[0])
+            else:
+                self._delete_row(match.id)
+
+    def remove(self, match_id: int):
+        with self._lock:
+            self._delete_row(match_id)
+
+    def candidates(self, exclude_ids=(), near=None, radius_km=None):
+        """
+        Return (ids, raw rows) of upcoming matches, excluding the given ids.
+        With `near` [(lat, lon), ...] and `radius_km`, only matches within
+        the radius of one of the points are kept (matches with an unknown
+        location are always kept). Both arrays are copies and safe to use
+        outside the lock.
+        """
+        today_start = np.datetime64(self.today_start(), "s")
+        with self._lock:
+            ids = self._ids[:self._size]
+            mask = self._starts[:self._size] >= today_start
+            if exclude_ids:
+                mask &= ~np.isin(ids, np.fromiter(exclude_ids, dtype=np.int64))
+            if near and radius_km:
+                mask &= self._within(near, radius_km)
+            return ids[mask].copy(), self._raw[:self._size][mask].copy()
+
+    def _within(self, points, radius_km):
+        """Row mask of matches within radius_km of `points`, via the grid"""
+        nearby = set()
+        for lat, lon in points:
+            nearby |= self._grid.near(lat, lon, radius_km)
+        keep = np.isnan(self._raw[:self._size, RAW["lat"]])
+        if nearby:
+            rows = np.fromiter((self._row_of[i] for i in nearby), dtype=np.int64, count=len(nearby))
+            close = min_distance_km(self._raw[rows, RAW["lat"]], self._raw[rows, RAW["lon"]], points) <= radius_km
+            keep[rows[close]] = True
+        return keep
+
+    def shortlist(self, history_raw, n: int):
+        """Ids of the n nearest stored matches of every history row, or None without index"""
+        with self._lock:
+            if self._index_sizes is None:
+                return None
+            queries = self.pipeline.transform(history_raw, self._index_sizes).toarray()
+            return self.index.query(queries, n)
+
+    def __len__(self):
+        return self._size
+
+
+feature_store = MatchFeatureStore()
+
+
+def history_locations(matches):
+    """Distinct known (lat, lon) of the matches in a user's history"""
+    points = {gazetteer.locate(m.city, m.stadium) for m in matches}
+    points.discard(None)
+    return sorted(points)
+
 
 class MatchRecommender:
-    """KNN-based match recommendation system using sklearn"""
+    """
+    KNN-based match recommendation system over the shared feature store,
+    blended with collaborative filtering over the participation graph
+    """
     
-    def __init__(self, n_neighbors=5):
+    def __init__(self, n_neighbors=5, store: MatchFeatureStore = None, shortlist_size: int = RECOMMENDER_SHORTLIST,
+                 graph: ParticipationGraph = None, cf_weight: float = RECOMMENDER_CF_WEIGHT):
         self.n_neighbors = n_neighbors
-        self.knn_model = None
-    
-    def _encode_features(self, matches, all_cities, all_stadiums, all_types):
+        self.store = store or feature_store
+        self.shortlist_size = shortlist_size
+        self.graph = graph or participation_graph
+        self.cf_weight = cf_weight
+
+    def _blend(self, db, user_ids, candidate_ids, similarities):
         """
-        Encode matches into feature vectors
-        
-        Args:
-            matches: List of match objects
-            all_cities, all_stadiums, all_types: Lists of unique values for encoding
-            
-        Returns:
-            numpy array of feature vectors
+        Mix content similarities (users x candidates) with collaborative
+        scores; excluded candidates (-inf) stay excluded.
+        Returns (scores, collaborative scores).
         """
-        features = []
-        
-        for match in matches:
-            # Encode city
-            try:
-                city_idx = all_cities.index(match.city) if match.city in all_cities else -1
-            except:
-                city_idx = -1
-            
-            # Encode stadium
-            try:
-                stadium_idx = all_stadiums.index(match.stadium) if match.stadium in all_stadiums else -1
-            except:
-                stadium_idx = -1
-            
-            # Encode type
-            try:
-                type_idx = all_types.index(match.type_match) if match.type_match in all_types else -1
-            except:
-                type_idx = -1
-            
-            # Feature vector: [city_encoded, stadium_encoded, nb_players, type_encoded]
-            feature_vector = [
-                city_idx,
-                stadium_idx,
-                match.nb_players if match.nb_players else 10,  # default 10 players
-                type_idx
-            ]
-            features.append(feature_vector)
-        
-        return np.array(features)
+        if not self.cf_weight:
+            return similarities, np.zeros_like(similarities)
+        if db is not None:  # None: the caller loaded the graph
+            self.graph.ensure_loaded(db)
+        collaborative = self.graph.scores(user_ids, candidate_ids.tolist())
+        blended = (1 - self.cf_weight) * similarities + self.cf_weight * collaborative
+        return np.where(np.isfinite(similarities), blended, -np.inf), collaborative
     
     def recommend_matches(self, user_id: int, db: Session, limit: int = 5):
         """
@@ -67,102 +297,260 @@ class MatchRecommender:
         Returns:
             List of recommended matches with similarity scores
         """
-        # Get user
-        user = db.query(models.User).filter(models.User.id == user_id).first()
-        if not user:
-            return []
-        
-        # Get user's participation history
-        user_matches = user.joined_matches
-        
-        # If user has no history, return upcoming matches
-        if not user_matches or len(user_matches) == 0:
-            today = date.today().isoformat()
-            upcoming = db.query(models.Match).filter(
-                models.Match.date >= today,
-                models.Match.is_team_match == False  # ⭐ Only individual/mix matches
-            ).limit(limit).all()
-            
-            result = []
-            for match in upcoming:
-                if match.organizer:
-                    match.organizer_name = match.organizer.full_name
-                result.append({
-                    "match": match,
-                    "similarity_score": 0.5,
-                    "reason": "Popular match (no history)"
-                })
-            return result
-        
-        # Get all upcoming matches (exclude past, team matches, and matches user already joined)
-        today = date.today().isoformat()
-        all_upcoming = db.query(models.Match).filter(
-            models.Match.date >= today,
-            models.Match.is_team_match == False  # ⭐ Only individual/mix matches
-        ).all()
-        
-        # Filter out matches user already joined
-        user_match_ids = {m.id for m in user_matches}
-        candidate_matches = [m for m in all_upcoming if m.id not in user_match_ids]
-        
-        if not candidate_matches:
+        self.store.ensure_loaded(db)
+        if self.cf_weight:
+            self.graph.ensure_loaded(db)
+        user_matches = self._history(db, user_id)
+        if not user_matches:
+            if not self._user_exists(db, user_id):
+                return []
+            return self._popular(self._load_matches(db, self._popular_ids(limit)))
+        ranked = self._rank(user_id, user_matches, limit)
+        return self._with_matches(self._load_matches(db, list(ranked)), ranked, user_matches)
+
+    async def recommend_matches_async(self, user_id: int, db: AsyncSession, limit: int = 5):
+        """
+        recommend_matches on an AsyncSession: the queries run on the session,
+        the CPU-bound parts (store / graph rebuilds, scoring) in the threadpool
+        so they never stall the event loop
+        """
+        if self.store.is_stale():
+            await run_in_threadpool(self.store.build, await db.run_sync(self.store.fetch))
+        if self.cf_weight and self.graph.is_stale():
+            await run_in_threadpool(self.graph.build, *await db.run_sync(self.graph.fetch))
+        user_matches = await db.run_sync(self._history, user_id)
+        if not user_matches:
+            if not await db.run_sync(self._user_exists, user_id):
+                return []
+            return self._popular(await db.run_sync(self._load_matches, self._popular_ids(limit)))
+        ranked = await run_in_threadpool(self._rank, user_id, user_matches, limit)
+        return self._with_matches(await db.run_sync(self._load_matches, list(ranked)), ranked, user_matches)
+
+    @staticmethod
+    def _history(db: Session, user_id: int):
+        """User's participation history (feature columns only)"""
+        return db.query(
+            models.Match.id,
+            *feature_columns(),
+        ).join(
+            models.match_participants,
+            models.match_participants.c.match_id == models.Match.id
+        ).filter(models.match_participants.c.user_id == user_id).all()
+
+    @staticmethod
+    def _user_exists(db: Session, user_id: int):
+        return db.query(models.User.id).filter(models.User.id == user_id).first() is not None
+
+    def _popular_ids(self, limit: int):
+        # User has no history: upcoming matches
+        candidate_ids, _ = self.store.candidates()
+        return candidate_ids[:limit].tolist()
+
+    @staticmethod
+    def _popular(matches):
+        return [
+            {
+                "match": match,
+                "similarity_score": 0.5,
+                "reason": "Popular match (no history)"
+            }
+            for match in matches
+        ]
+
+    @timed_section("ml", ml_scoring_seconds, op="recommend")
+    def _rank(self, user_id: int, user_matches, limit: int):
+        """
+        Score the candidates against the history (no query: the store and
+        graph must be loaded). Returns {match_id: (score, co_joined)}, best first.
+        """
+        # Candidates: upcoming individual matches the user has not joined yet,
+        # near the places they already played when there are enough of them
+        joined_ids = {m.id for m in user_matches}
+        points = history_locations(user_matches)
+        candidate_ids, candidate_raw = self.store.candidates(
+            exclude_ids=joined_ids, near=points, radius_km=RECOMMENDER_RADIUS_KM
+        )
+        if points and RECOMMENDER_RADIUS_KM and len(candidate_ids) < limit:
+            candidate_ids, candidate_raw = self.store.candidates(exclude_ids=joined_ids)
+        if len(candidate_ids) == 0:
+            return {}
+
+        pipeline = self.store.pipeline
+        history_raw = pipeline.encode(user_matches)
+
+        # Large catalogues: only the index shortlist is scored exactly
+        if len(candidate_ids) > self.shortlist_size:
+            shortlist = self.store.shortlist(history_raw, self.shortlist_size)
+            if shortlist is not None:
+                keep = np.isin(candidate_ids, shortlist)
+                if keep.sum() >= limit:
+                    candidate_ids, candidate_raw = candidate_ids[keep], candidate_raw[keep]
+
+        # Candidates and history through the same fitted pipeline (same width)
+        sizes = pipeline.sizes()
+        user_features = pipeline.transform(history_raw, sizes).toarray()
+        candidate_features = pipeline.transform(candidate_raw, sizes)
+
+        # Distances from each candidate to the nearest matches in user's history
+        avg_distances = knn_mean_distances(
+            candidate_features,
+            user_features[None, :, :],
+            np.array([len(user_features)]),
+            self.n_neighbors
+        )
+        similarities, collaborative = self._blend(
+            None, [user_id], candidate_ids, distances_to_similarities(avg_distances)
+        )
+        similarities, collaborative = similarities[0], collaborative[0]
+
+        # Top N by similarity (highest first), stable on ties
+        order = np.argsort(-similarities, kind="stable")[:limit]
+        return {
+            match_id: (score, co_score > 0)
+            for match_id, score, co_score in zip(
+                candidate_ids[order].tolist(), similarities[order].tolist(), collaborative[order].tolist()
+            )
+        }
+
+    def _with_matches(self, matches, ranked, user_matches):
+        """Recommendations for the loaded top matches (only those are read from the database)"""
+        return [
+            {
+                "match": match,
+                "similarity_score": round(float(ranked[match.id][0]), 2),
+                "reason": self._generate_reason(match, user_matches, ranked[match.id][1])
+            }
+            for match in matches
+        ]
+
+    @timed_section("ml", ml_scoring_seconds, op="batch")
+    def recommend_batch(self, db: Session, user_ids=None, limit: int = 5, chunk_size: int = 1000):
+        """
+        Recommend matches to many users in one vectorized pass.
+
+        All users share the candidate matrix of the feature store; their
+        histories are loaded with one query per chunk and scored together.
+
+        Args:
+            db: Database session
+            user_ids: Users to score (default: every user)
+            limit: Number of recommendations per user
+            chunk_size: Users per history query / scoring batch
+
+        Returns:
+            Dict user_id -> list of (match_id, similarity_score)
+        """
+        self.store.ensure_loaded(db)
+        candidate_ids, candidate_raw = self.store.candidates()
+        candidate_coords = candidate_raw[:, [RAW["lat"], RAW["lon"]]]
+        sizes = self.store.pipeline.sizes()
+        candidate_features = self.store.pipeline.transform(candidate_raw, sizes)
+
+        if user_ids is None:
+            user_ids = [row.id for row in db.query(models.User.id).order_by(models.User.id)]
+        user_ids = list(user_ids)
+
+        results = {}
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            results.update(self._recommend_chunk(
+                db, chunk, candidate_ids, candidate_features, candidate_coords, sizes, limit
+            ))
+        return results
+
+    def _recommend_chunk(self, db, user_ids, candidate_ids, candidate_features, candidate_coords, sizes, limit):
+        histories = {}
+        for row in db.query(
+            models.match_participants.c.user_id,
+            models.Match.id,
+            *feature_columns(),
+        ).join(
+            models.Match,
+            models.match_participants.c.match_id == models.Match.id
+        ).filter(models.match_participants.c.user_id.in_(user_ids)):
+            histories.setdefault(row.user_id, []).append(row)
+
+        popular = [(int(i), 0.5) for i in candidate_ids[:limit]]
+        results = {user_id: popular for user_id in user_ids if user_id not in histories}
+
+        scored_users = [user_id for user_id in user_ids if user_id in histories]
+        if not scored_users or len(candidate_ids) == 0:
+            results.update({user_id: [] for user_id in scored_users})
+            return results
+
+        # Every history row of the chunk encoded in one vectorized pass (sparse)
+        lengths = np.array([len(histories[u]) for u in scored_users])
+        flat = self.store.pipeline.vectors(
+            [row for user_id in scored_users for row in histories[user_id]], sizes
+        )
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+
+        # Padded densely only per batch of similar history lengths, within KNN_BATCH_ELEMENTS
+        distances = np.empty((len(scored_users), len(candidate_ids)))
+        for batch in history_batches(lengths, flat.shape[1]):
+            padded = np.zeros((len(batch), lengths[batch].max(), flat.shape[1]))
+            for j, i in enumerate(batch):
+                padded[j, :lengths[i]] = flat[offsets[i]:offsets[i + 1]].toarray()
+            distances[batch] = knn_mean_distances(
+                candidate_features, padded, lengths[batch], self.n_neighbors
+            )
+
+        # Same candidate set as recommend_matches: never a match the user
+        # already joined, and only nearby matches when there are enough
+        column_of = {int(match_id): col for col, match_id in enumerate(candidate_ids)}
+        unknown_location = np.isnan(candidate_coords[:, 0])
+        for i, user_id in enumerate(scored_users):
+            joined = [column_of[m.id] for m in histories[user_id] if m.id in column_of]
+            distances[i, joined] = np.inf
+            points = history_locations(histories[user_id])
+            if points and RECOMMENDER_RADIUS_KM:
+                with np.errstate(invalid="ignore"):
+                    inside = unknown_location | (
+                        min_distance_km(candidate_coords[:, 0], candidate_coords[:, 1], points)
+                        <= RECOMMENDER_RADIUS_KM
+                    )
+                if (inside & np.isfinite(distances[i])).sum() >= limit:
+                    distances[i, ~inside] = np.inf
+
+        similarities, _ = self._blend(db, scored_users, candidate_ids, distances_to_similarities(distances))
+
+        top_k = min(limit, len(candidate_ids))
+        top = np.argpartition(-similarities, top_k - 1, axis=1)[:, :top_k]
+        top_scores = np.take_along_axis(similarities, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        for i, user_id in enumerate(scored_users):
+            results[user_id] = [
+                (int(candidate_ids[col]), round(float(score), 2))
+                for col, score in zip(top[i], top_scores[i])
+                if np.isfinite(score)
+            ]
+        return results
+
+    @staticmethod
+    def _load_matches(db: Session, match_ids):
+        """Load matches by id, keeping the order of match_ids"""
+        if not match_ids:
             return []
-        
-        # Prepare unique values for encoding
-        all_matches = user_matches + candidate_matches
-        all_cities = list(set([m.city for m in all_matches if m.city]))
-        all_stadiums = list(set([m.stadium for m in all_matches if m.stadium]))
-        all_types = list(set([m.type_match for m in all_matches if m.type_match]))
-        
-        # Encode user's participation history
-        user_features = self._encode_features(user_matches, all_cities, all_stadiums, all_types)
-        
-        # Encode candidate matches
-        candidate_features = self._encode_features(candidate_matches, all_cities, all_stadiums, all_types)
-        
-        # Train KNN model on user's history
-        n_neighbors = min(self.n_neighbors, len(user_matches))  # Can't have more neighbors than samples
-        self.knn_model = NearestNeighbors(n_neighbors=n_neighbors, metric='euclidean')
-        self.knn_model.fit(user_features)
-        
-        # Find distances from each candidate to user's history
-        # For each candidate, find distance to nearest matches in user's history
-        distances, indices = self.knn_model.kneighbors(candidate_features)
-        
-        # Calculate average distance for each candidate (lower = more similar)
-        avg_distances = distances.mean(axis=1)
-        
-        # Convert distances to similarity scores (0-1, higher = more similar)
-        max_dist = avg_distances.max() if len(avg_distances) > 0 and avg_distances.max() > 0 else 1
-        similarities = 1 - (avg_distances / max_dist)
-        
-        # Combine matches with their similarity scores
-        match_scores = list(zip(candidate_matches, similarities))
-        
-        # Sort by similarity (highest first)
-        match_scores.sort(key=lambda x: x[1], reverse=True)
-        
-        # Return top N recommendations
-        recommendations = []
-        for match, score in match_scores[:limit]:
-            # Generate explanation
-            reason = self._generate_reason(match, user_matches)
-            
-            # Add organizer name
+        matches = db.query(models.Match).options(
+            *models.match_response_loaders()
+        ).filter(models.Match.id.in_(match_ids)).all()
+        by_id = {m.id: m for m in matches}
+        ordered = [by_id[i] for i in match_ids if i in by_id]
+        for match in ordered:
             if match.organizer:
                 match.organizer_name = match.organizer.full_name
-            
-            recommendations.append({
-                "match": match,
-                "similarity_score": round(float(score), 2),
-                "reason": reason
-            })
-        
-        return recommendations
+        return ordered
     
-    def _generate_reason(self, match, user_matches):
+    def _generate_reason(self, match, user_matches, co_joined=False):
         """Generate a simple explanation for why this match was recommended"""
         reasons = []
+
+        # Joined by players who played with the user
+        if co_joined:
+            reasons.append("players like you joined")
         
         # Check city match
         user_cities = [m.city for m in user_matches if m.city]
@@ -1,5 +1,7 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Table, Float, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, ForeignKey, Table, Float, Boolean, DateTime, Index, DDL, event, text, case, and_, or_, func, literal_column, inspect
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import relationship, joinedload, selectinload
+from datetime import datetime, date, time
 from .database import Base
 
 # Association Table for Many-to-Many
@@ -57,6 +59,9 @@ class Match(Base):
     date = Column(String)
     start_time = Column(String)
     end_time = Column(String)
+    # Kickoff timestamp derived from date + start_time, used by every range query.
+    # NOT NULL: it is the leading keyset column, NULL rows would fall out of paging
+    starts_at = Column(DateTime, nullable=False)
     nb_players = Column(Integer)
     price_per_player = Column(Float)
     organizer_phone = Column(String)
@@ -68,6 +73,8 @@ class Match(Base):
     organizer = relationship("User", back_populates="matches")
     
     participants = relationship("User", secondary=match_participants, back_populates="joined_matches")
+    # Maintained with match_participants (see participation.py), guards capacity atomically
+    participant_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     # Team Match Fields
     is_team_match = Column(Boolean, default=False)
@@ -77,6 +84,90 @@ class Match(Base):
     team_a = relationship("Team", foreign_keys=[team_a_id])
     team_b = relationship("Team", foreign_keys=[team_b_id])
 
+    @hybrid_property
+    def spots_left(self):
+        return max((self.nb_players or 0) - (self.participant_count or 0), 0)
+
+    @spots_left.expression
+    def spots_left(cls):
+        return case(
+            (cls.participant_count < cls.nb_players, cls.nb_players - cls.participant_count),
+            else_=0
+        )
+
+    @hybrid_property
+    def has_spots(self):
+        """Open to joins: a free seat, or the Team B slot for team matches"""
+        if self.is_team_match:
+            return self.team_b_id is None
+        return self.spots_left > 0
+
+    @has_spots.expression
+    def has_spots(cls):
+        # OR of two sargable branches so idx_matches_open_starts_at can be used
+        return or_(
+            and_(cls.is_team_match == True, cls.team_b_id == None),
+            and_(cls.is_team_match.isnot(True), cls.participant_count < cls.nb_players)
+        )
+
+    @hybrid_property
+    def price(self):
+        """price_per_player, 0 (free) when unset: the price filter / sort key of search"""
+        return self.price_per_player or 0
+
+    @price.expression
+    def price(cls):
+        # Inline 0 so the expression matches idx_matches_price_id
+        return func.coalesce(cls.price_per_player, literal_column("0"))
+
+    __table_args__ = (
+        # Keyset pagination of match listings: ORDER BY starts_at, id
+        Index("idx_matches_starts_at_id", "starts_at", "id"),
+        # Upcoming matches, optionally without full team matches
+        Index("idx_matches_starts_at_team", "starts_at", "is_team_match", "team_b_id"),
+        # min_age <= age <= max_age
+        Index("idx_matches_age_range", "min_age", "max_age"),
+        # Upcoming individual matches that still have free seats (has_spots=true)
+        Index(
+            "idx_matches_open_starts_at", "starts_at",
+            postgresql_where=text("participant_count < nb_players"),
+            sqlite_where=text("participant_count < nb_players"),
+        ),
+        # Search: free-text on title / description (ILIKE), PostgreSQL only
+        Index(
+            "idx_matches_title_trgm", "title",
+            postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "idx_matches_description_trgm", "description",
+            postgresql_using="gin", postgresql_ops={"description": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
+
+# Search: price range filter and price sort (expression index on Match.price)
+Index("idx_matches_price_id", Match.price, Match.id)
+# Search: case-insensitive city prefix, lower(city) LIKE 'tun%'
+# (text_pattern_ops lets PostgreSQL use it for LIKE whatever the collation)
+Index(
+    "idx_matches_city_lower", func.lower(Match.city).label("city_lower"),
+    postgresql_ops={"city_lower": "text_pattern_ops"},
+)
+
+# The trigram indexes need the pg_trgm extension
+event.listen(
+    Match.__table__, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
+
+class SentReminder(Base):
+    """One row per reminder already sent, so restarts never resend it"""
+    __tablename__ = "sent_reminders"
+
+    match_id = Column(Integer, ForeignKey("matches.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    kind = Column(String, primary_key=True)  # "daily", "2h_before", ...
+    sent_at = Column(DateTime, default=datetime.utcnow)
+
 class Feedback(Base):
     __tablename__ = "feedbacks"
 
@@ -90,3 +181,55 @@ class Feedback(Base):
     user = relationship("User")
 
 
+def parse_starts_at(date_str, time_str):
+    """Combine the 'YYYY-MM-DD' date and 'HH:MM[:SS]' time strings of a match"""
+    try:
+        day = datetime.strptime(date_str, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+    for fmt in ("%H:%M", "%H:%M:%S"):
+        try:
+            return datetime.combine(day, datetime.strptime(time_str, fmt).time())
+        except (TypeError, ValueError):
+            continue
+    return datetime.combine(day, time.min)
+
+
+def day_start(day: date = None):
+    """Midnight of `day` (default today), lower bound of 'upcoming' filters"""
+    return datetime.combine(day or date.today(), time.min)
+
+
+@event.listens_for(Match, "before_insert")
+def _set_starts_at(mapper, connection, target):
+    starts_at = parse_starts_at(target.date, target.start_time)
+    if starts_at is None:
+        raise ValueError(f"Invalid match date {target.date!r}, expected YYYY-MM-DD")
+    target.starts_at = starts_at
+
+
+@event.listens_for(Match, "before_update")
+def _sync_starts_at(mapper, connection, target):
+    # Only when the kickoff changed: legacy rows backfilled with
+    # UNPARSEABLE_STARTS_AT must stay updatable (joins, team B...)
+    state = inspect(target)
+    if not (state.attrs.date.history.has_changes() or state.attrs.start_time.history.has_changes()):
+        return
+    starts_at = parse_starts_at(target.date, target.start_time)
+    if starts_at is None:
+        raise ValueError(f"Invalid match date {target.date!r}, expected YYYY-MM-DD")
+    target.starts_at = starts_at
+
+
+def match_response_loaders():
+    """
+    Loader options for everything MatchResponse serializes
+    (organizer, participants, team_a/team_b members), so a list of matches
+    is loaded in a fixed number of queries instead of one per relationship.
+    """
+    return [
+        joinedload(Match.organizer),
+        selectinload(Match.participants),
+        selectinload(Match.team_a).selectinload(Team.members),
+        selectinload(Match.team_b).selectinload(Team.members),
+    ]
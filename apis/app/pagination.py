@@ -0,0 +1,54 @@
+import base64
+import json
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+# Response header carrying the opaque cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values) -> str:
+    """Opaque cursor for the sort key of the last row of a page"""
+    raw = json.dumps(
+        [v.isoformat() if hasattr(v, "isoformat") else v for v in values],
+        separators=(",", ":")
+    ).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int, types=None):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError("cursor size")
+        if types:
+            values = [t(v) for t, v in zip(types, values)]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def apply_keyset(query, columns, cursor: str = None, types=None, descending: bool = False):
+    """
+    Order `query` by `columns` (the last one must be unique, e.g. the id) and,
+    when a cursor is given, only keep rows strictly after it. Backed by a
+    composite index on the same columns this is a range scan whatever the depth.
+    `types` optionally converts the JSON cursor values back (e.g. to datetime).
+    With `descending`, every column is sorted in reverse (a backward index scan).
+    """
+    query = query.order_by(*(c.desc() for c in columns) if descending else columns)
+    if cursor:
+        values = decode_cursor(cursor, len(columns), types)
+        key = columns[0] if len(columns) == 1 else tuple_(*columns)
+        bound = values[0] if len(columns) == 1 else tuple_(*values)
+        query = query.filter(key < bound if descending else key > bound)
+    return query
+
+
+def next_cursor(rows, limit: int, key):
+    """Cursor of the next page, or None when this page is the last one"""
+    if limit <= 0 or len(rows) < limit:
+        return None
+    return encode_cursor(key(rows[-1]))
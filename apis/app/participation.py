@@ -0,0 +1,125 @@
+"""
+Seat bookkeeping for matches.
+
+Every change to match_participants goes with the matching change to
+matches.participant_count in the same transaction. Capacity is enforced by
+a single conditional UPDATE on the match row, so concurrent joins can
+never overfill a match and the participants list is never loaded.
+"""
+
+from fastapi import HTTPException
+from sqlalchemy import update, delete, select, literal
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import insert_or_ignore
+
+
+def reserve_seat(db: Session, match_id: int, user_id: int) -> int:
+    """
+    Add `user_id` to an individual match and commit.
+    Returns the new participant count.
+    """
+    inserted = db.execute(
+        insert_or_ignore(db, models.match_participants).values(match_id=match_id, user_id=user_id)
+    )
+    if inserted.rowcount == 0:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Already joined this match")
+
+    # Atomic check-and-increment: a concurrent join waits for this row lock
+    # and re-evaluates the condition against the committed count
+    seat = db.execute(
+        update(models.Match)
+        .where(
+            models.Match.id == match_id,
+            models.Match.participant_count < models.Match.nb_players
+        )
+        .values(participant_count=models.Match.participant_count + 1)
+        .returning(models.Match.participant_count)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if seat is None:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Match is full")
+
+    db.commit()
+    return seat.participant_count
+
+
+def enroll_team(db: Session, match_id: int, team_id: int):
+    """
+    Add every member of `team_id` that has an account to a match with one
+    INSERT ... SELECT (caller commits). Members already in the match are
+    skipped. Returns the ids of the users added.
+    """
+    # The WHERE clause also keeps SQLite from parsing ON CONFLICT as a join constraint
+    members = select(literal(match_id), models.TeamMember.user_id).where(
+        models.TeamMember.team_id == team_id,
+        models.TeamMember.user_id.isnot(None)
+    ).distinct()
+    added = db.execute(
+        insert_or_ignore(db, models.match_participants)
+        .from_select(["match_id", "user_id"], members)
+        .returning(models.match_participants.c.user_id)
+    ).all()
+    _adjust_count(db, match_id, len(added))
+    return [r.user_id for r in added]
+
+
+def release_seat(db: Session, match_id: int, user_id: int):
+    """Remove `user_id` from a match (caller commits)"""
+    removed = db.execute(
+        delete(models.match_participants).where(
+            models.match_participants.c.match_id == match_id,
+            models.match_participants.c.user_id == user_id
+        )
+    )
+    if removed.rowcount == 0:
+        raise HTTPException(status_code=404, detail="Participant not found in this match")
+    _adjust_count(db, match_id, -removed.rowcount)
+
+
+def release_team_seats(db: Session, match_id: int, team_id: int):
+    """Remove the members of `team_id` from a match (caller commits). Returns their user ids."""
+    member_ids = select(models.TeamMember.user_id).where(
+        models.TeamMember.team_id == team_id,
+        models.TeamMember.user_id.isnot(None)
+    )
+    removed = db.execute(
+        delete(models.match_participants)
+        .where(
+            models.match_participants.c.match_id == match_id,
+            models.match_participants.c.user_id.in_(member_ids)
+        )
+        .returning(models.match_participants.c.user_id)
+    ).all()
+    _adjust_count(db, match_id, -len(removed))
+    return [r.user_id for r in removed]
+
+
+def claim_team_b(db: Session, match_id: int, team_id: int):
+    """Atomically take the Team B slot of a team match (caller commits)"""
+    claimed = db.execute(
+        update(models.Match)
+        .where(
+            models.Match.id == match_id,
+            models.Match.is_team_match == True,
+            models.Match.team_b_id == None
+        )
+        .values(team_b_id=team_id)
+        .execution_options(synchronize_session=False)
+    )
+    if claimed.rowcount == 0:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Match is already full (Team B already joined)")
+
+
+def _adjust_count(db: Session, match_id: int, delta: int):
+    if delta:
+        db.execute(
+            update(models.Match)
+            .where(models.Match.id == match_id)
+            .values(participant_count=models.Match.participant_count + delta)
+            .execution_options(synchronize_session=False)
+        )
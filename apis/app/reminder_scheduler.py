@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from sqlalchemy import select, union, or_, and_, exists
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal, insert_or_ignore
+from .email_utils import build_match_reminder
+from .logging_config import new_request_id, set_request_id, reset_request_id
+from .mail_dispatcher import mail_dispatcher
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Hour of the day (0-23) of the "match today" reminder, empty to disable
+REMINDER_DAILY_HOUR = os.getenv("REMINDER_DAILY_HOUR", "8")
+# Comma-separated lead times in hours, e.g. "24,2", empty to disable
+REMINDER_HOURS_BEFORE = os.getenv("REMINDER_HOURS_BEFORE", "2")
+# How often lead-time reminders are checked
+REMINDER_POLL_MINUTES = float(os.getenv("REMINDER_POLL_MINUTES", "10"))
+
+DAILY = "daily"
+# Reminders claimed per INSERT (4 bound parameters each)
+CLAIM_BATCH_SIZE = 200
+
+
+def due_reminders(db: Session, window_start: datetime, window_end: datetime, kind: str):
+    """
+    (match, recipient) pairs for matches starting in [window_start, window_end)
+    that did not get a `kind` reminder yet, resolved in a single query over
+    match_participants and the team_members of both teams.
+    """
+    matches = models.Match.__table__
+    in_window = and_(matches.c.starts_at >= window_start, matches.c.starts_at < window_end)
+
+    individual = select(
+        models.match_participants.c.match_id, models.match_participants.c.user_id
+    ).join(
+        matches, matches.c.id == models.match_participants.c.match_id
+    ).where(in_window)
+
+    team_members = models.TeamMember.__table__
+    from_teams = select(
+        matches.c.id.label("match_id"), team_members.c.user_id
+    ).join(
+        team_members,
+        or_(team_members.c.team_id == matches.c.team_a_id, team_members.c.team_id == matches.c.team_b_id)
+    ).where(
+        in_window,
+        matches.c.is_team_match == True,
+        team_members.c.user_id.isnot(None)
+    )
+
+    recipients = union(individual, from_teams).subquery()  # UNION deduplicates
+    already_sent = exists().where(
+        models.SentReminder.match_id == recipients.c.match_id,
+        models.SentReminder.user_id == recipients.c.user_id,
+        models.SentReminder.kind == kind
+    )
+
+    return db.execute(
+        select(
+            matches.c.id.label("match_id"),
+            matches.c.title,
+            matches.c.start_time,
+            matches.c.city,
+            matches.c.stadium,
+            models.User.id.label("user_id"),
+            models.User.email,
+            models.User.full_name,
+        )
+        .select_from(recipients)
+        .join(matches, matches.c.id == recipients.c.match_id)
+        .join(models.User, models.User.id == recipients.c.user_id)
+        .where(models.User.email.isnot(None), ~already_sent)
+    ).all()
+
+
+def claim_reminders(db: Session, rows, kind: str):
+    """
+    Record reminders as sent before queueing them. Rows already claimed by
+    another worker process are skipped by the primary key, so each pair is
+    sent at most once.
+    """
+    now = datetime.utcnow()
+    claimed = set()
+    # Fixed-size multi-row inserts: bounded statements, under SQLite's bound-parameter limit
+    for start in range(0, len(rows), CLAIM_BATCH_SIZE):
+        claimed.update(
+            (c.match_id, c.user_id) for c in db.execute(
+                insert_or_ignore(db, models.SentReminder.__table__)
+                .values([
+                    {"match_id": r.match_id, "user_id": r.user_id, "kind": kind, "sent_at": now}
+                    for r in rows[start:start + CLAIM_BATCH_SIZE]
+                ])
+                .returning(models.SentReminder.match_id, models.SentReminder.user_id)
+            )
+        )
+    db.commit()
+    return claimed
+
+
+class ReminderScheduler:
+    """
+    Sends match reminders at configurable times: once a day at a fixed hour
+    for the matches of the day, and N hours before kickoff. Database work
+    runs in a worker thread so the event loop is never blocked.
+    """
+
+    def __init__(self, daily_hour=REMINDER_DAILY_HOUR, hours_before=REMINDER_HOURS_BEFORE,
+                 poll_minutes: float = REMINDER_POLL_MINUTES, session_factory=SessionLocal):
+        self.daily_hour = int(daily_hour) if str(daily_hour).strip() else None
+        self.hours_before = [float(h) for h in str(hours_before).split(",") if h.strip()]
+        self.poll = timedelta(minutes=poll_minutes)
+        self.session_factory = session_factory
+
+    def next_run(self, now: datetime) -> datetime:
+        candidates = []
+        if self.hours_before:
+            candidates.append(now + self.poll)
+        if self.daily_hour is not None:
+            daily = now.replace(hour=self.daily_hour, minute=0, second=0, microsecond=0)
+            candidates.append(daily if daily > now else daily + timedelta(days=1))
+        return min(candidates) if candidates else now + timedelta(days=1)
+
+    def windows(self, now: datetime):
+        """(kind, start, end) windows due at `now`"""
+        if self.daily_hour is not None and now.hour >= self.daily_hour:
+            tomorrow = models.day_start(now.date() + timedelta(days=1))
+            yield DAILY, now, tomorrow
+        for hours in self.hours_before:
+            yield f"{hours:g}h_before", now, now + timedelta(hours=hours)
+
+    def run_once(self, now: datetime = None):
+        now = now or datetime.now()
+        db = self.session_factory()
+        try:
+            queued = 0
+            for kind, start, end in self.windows(now):
+                rows = due_reminders(db, start, end, kind)
+                claimed = claim_reminders(db, rows, kind)
+                for r in rows:
+                    if (r.match_id, r.user_id) not in claimed:
+                        continue
+                    mail_dispatcher.enqueue(build_match_reminder(
+                        to_email=r.email,
+                        player_name=r.full_name or "Player",
+                        match_title=r.title,
+                        time=r.start_time,
+                        city=r.city,
+                        stadium=r.stadium
+                    ))
+                    queued += 1
+            if queued:
+                logger.info("Queued %d match reminders", queued)
+            return queued
+        finally:
+            db.close()
+
+    async def run_forever(self):
+        logger.info("Starting email notification service...")
+        while True:
+            # One id per run: its logs and the emails it queues can be traced together
+            token = set_request_id(new_request_id("reminders-"))
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception:
+                logger.exception("Error in email service")
+            finally:
+                reset_request_id(token)
+            now = datetime.now()
+            await asyncio.sleep(max(1.0, (self.next_run(now) - now).total_seconds()))
+
+
+reminder_scheduler = ReminderScheduler()
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
+from typing import Optional
 from .. import models, database, auth
 
 router = APIRouter(
@@ -17,20 +18,10 @@ class FeedbackCreate(BaseModel):
 def create_feedback(
     feedback: FeedbackCreate, 
     db: Session = Depends(database.get_db),
-    token: str = Depends(auth.oauth2_scheme_optional)
+    current_user: Optional[models.User] = Depends(auth.get_current_user_optional)
 ):
-    # Try to get current user if token provided
-    user_id = None
-    if token:
-        try:
-            payload = auth.jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
-            email: str = payload.get("sub")
-            if email:
-                user = db.query(models.User).filter(models.User.email == email).first()
-                if user:
-                    user_id = user.id
-        except:
-            pass  # Invalid token, treat as anonymous
+    # Link to the current user if a valid token was provided, anonymous otherwise
+    user_id = current_user.id if current_user else None
     
     new_feedback = models.Feedback(
         name=feedback.name,
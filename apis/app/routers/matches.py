@@ -1,7 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+import logging
+from datetime import datetime, date, time, timedelta
 from .. import models, schemas, database, auth
+from ..pagination import apply_keyset, next_cursor, NEXT_CURSOR_HEADER
+from ..ml_service import feature_store
+from ..geo import gazetteer
+from ..collaborative import participation_graph
+from ..cache import recommendation_cache
+from ..participation import reserve_seat, release_seat, release_team_seats, claim_team_b, enroll_team
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/matches",
@@ -12,19 +26,11 @@ def add_team_members_to_match(match: models.Match, team_id: int, db: Session):
     """
     Ajoute tous les membres d'une équipe (avec user_id) aux participants du match.
     Cela permet aux membres de voir le match dans "My Games".
+    Une seule requête quelle que soit la taille de l'équipe ; le match doit déjà avoir un id.
+    Retourne les ids des utilisateurs ajoutés.
     """
-    team_members = db.query(models.TeamMember).filter(
-        models.TeamMember.team_id == team_id,
-        models.TeamMember.user_id.isnot(None)  # Seulement les membres avec compte utilisateur
-    ).all()
-    
-    for member in team_members:
-        user = db.query(models.User).filter(models.User.id == member.user_id).first()
-        if user and user not in match.participants:
-            match.participants.append(user)
-
+    return enroll_team(db, match.id, team_id)
 
-from datetime import datetime, date
 
 @router.post("/", response_model=schemas.MatchResponse)
 def create_match(match: schemas.MatchCreate, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
@@ -57,73 +63,128 @@ def create_match(match: schemas.MatchCreate, db: Session = Depends(database.get_
             raise HTTPException(status_code=403, detail="You are not the captain of this team")
         
         new_match.team_a_id = team.id
+        db.add(new_match)
+        db.flush()  # Needs an id for the bulk enrollment
         
         # Auto-ajouter tous les membres de l'équipe aux participants
         # Cela permet à tous les membres de voir le match dans "My Games"
-        add_team_members_to_match(new_match, team.id, db)
+        enrolled_user_ids = add_team_members_to_match(new_match, team.id, db)
     else:
         # Normal Match Logic
         # Add organizer as participant
         new_match.participants.append(current_user)
 
-        # Add teammates
-        for email in teammate_emails:
-            user = db.query(models.User).filter(models.User.email == email).first()
-            if not user:
-                raise HTTPException(status_code=400, detail=f"User with email {email} not found")
-            if user.id == current_user.id:
-                continue # Already added
-            if user in new_match.participants:
-                continue # Already added
-            new_match.participants.append(user)
-
-    db.add(new_match)
+        # Add teammates: all emails resolved in one query, duplicates dropped
+        emails = set(teammate_emails)
+        teammates = db.query(models.User).filter(models.User.email.in_(emails)).all() if emails else []
+        missing = emails - {u.email for u in teammates}
+        if len(missing) == 1:
+            raise HTTPException(status_code=400, detail=f"User with email {missing.pop()} not found")
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Users with emails {', '.join(sorted(missing))} not found")
+        new_match.participants.extend(u for u in teammates if u.id != current_user.id)  # Organizer already added
+
+        new_match.participant_count = len(new_match.participants)
+        db.add(new_match)
+
     db.commit()
     db.refresh(new_match)
+    feature_store.upsert(new_match)
+    if new_match.is_team_match:
+        # Not a recommendation candidate, only the enrolled members' history changed
+        participation_graph.add(enrolled_user_ids, new_match.id)
+        recommendation_cache.invalidate_users(enrolled_user_ids)
+    else:
+        participation_graph.add([p.id for p in new_match.participants], new_match.id)
+        recommendation_cache.invalidate_all()
     # Manually set organizer_name for response since it's not in DB yet
     new_match.organizer_name = current_user.full_name
     return new_match
 
-@router.get("/", response_model=List[schemas.MatchResponse])
-def read_matches(
-    skip: int = 0, 
-    limit: int = 100, 
-    upcoming_only: bool = False,
-    exclude_full_team_matches: bool = False,  # ⭐ New parameter
-    db: Session = Depends(database.get_db),
-    token: str = Depends(auth.oauth2_scheme_optional)
-):
-    current_user = None
-    if token:
-        try:
-            payload = auth.jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
-            email: str = payload.get("sub")
-            if email:
-                current_user = db.query(models.User).filter(models.User.email == email).first()
-        except:
-            pass # Invalid token
-
-    query = db.query(models.Match)
-
-    if upcoming_only:
-        from datetime import date
-        today = date.today().isoformat()
-        query = query.filter(models.Match.date >= today)
+SUMMARY_FIELDS = list(schemas.MatchSummary.__fields__)
+
+# Keyset order of match listings, backed by idx_matches_starts_at_id
+MATCH_PAGE_KEY = ("starts_at", "id")
+MATCH_PAGE_TYPES = (datetime.fromisoformat, int)
+
+# Sort keys of /matches/search: (expression, cursor types), each backed by
+# an index on (expression, id); a leading "-" sorts newest / dearest first
+SEARCH_SORTS = {
+    "starts_at": (models.Match.starts_at, (datetime.fromisoformat, int)),
+    "price": (models.Match.price, (float, int)),
+}
+SEARCH_MAX_LIMIT = 100
+
+def summary_columns(fields: List[str]):
+    """Labelled scalar columns for the lean (summary / fields=) projection"""
+    columns = {
+        "organizer_name": models.User.full_name,
+        "spots_left": models.Match.spots_left,
+        "price": models.Match.price,
+    }
+    return [
+        (columns[f] if f in columns else getattr(models.Match, f)).label(f)
+        for f in fields
+    ]
+
+def selected_fields(fields: Optional[str], summary: bool):
+    """Columns of the lean projection, None for full match objects"""
+    if fields:
+        selected = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in selected if f not in SUMMARY_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        if "id" not in selected:
+            selected.insert(0, "id")
+        return selected
+    return SUMMARY_FIELDS if summary else None
+
+def match_list_query(db: Session, selected, page_key):
+    # Lean mode: scalar columns + participant count, no relationship is loaded
+    if selected:
+        # The sort key is always fetched so the next cursor can be built
+        projected = selected + [f for f in page_key if f not in selected]
+        query = db.query(*summary_columns(projected)).select_from(models.Match)
+        if "organizer_name" in selected:
+            query = query.outerjoin(models.User, models.Match.organizer_id == models.User.id)
+        return query
+    return db.query(models.Match).options(*models.match_response_loaders())
 
+def filter_joinable(query, current_user, exclude_full_team_matches: bool, has_spots: Optional[bool]):
     if current_user and current_user.age is not None:
         # Filter: match.min_age <= user.age <= match.max_age
         query = query.filter(
             models.Match.min_age <= current_user.age,
             models.Match.max_age >= current_user.age
         )
-    
+
     # Ne filtrer les matchs team complets QUE si demandé (pour /games, pas pour My Games)
     if exclude_full_team_matches:
         query = query.filter(
             (models.Match.is_team_match == False) | (models.Match.team_b_id == None)
         )
-    
-    matches = query.offset(skip).limit(limit).all()
+
+    # Full matches are hidden in SQL via the maintained participant_count
+    if has_spots is not None:
+        query = query.filter(models.Match.has_spots if has_spots else ~models.Match.has_spots)
+    return query
+
+def match_page(query, selected, limit: int, response: Response, page_key):
+    """Fetch one page; the next cursor goes in the X-Next-Cursor header"""
+    key = lambda row: [getattr(row, f) for f in page_key]
+
+    if selected:
+        rows = query.limit(limit).all()
+        cursor_value = next_cursor(rows, limit, key)
+        return JSONResponse(
+            content=jsonable_encoder([{f: row._mapping[f] for f in selected} for row in rows]),
+            headers={NEXT_CURSOR_HEADER: cursor_value} if cursor_value else None
+        )
+
+    matches = query.limit(limit).all()
+    cursor_value = next_cursor(matches, limit, key)
+    if cursor_value:
+        response.headers[NEXT_CURSOR_HEADER] = cursor_value
 
     # Map organizer_name
     for match in matches:
@@ -131,57 +192,206 @@ def read_matches(
             match.organizer_name = match.organizer.full_name
     return matches
 
+@router.get("/", response_model=List[schemas.MatchResponse])
+async def read_matches(
+    response: Response,
+    skip: int = 0, 
+    limit: int = 100, 
+    upcoming_only: bool = False,
+    exclude_full_team_matches: bool = False,  # ⭐ New parameter
+    has_spots: Optional[bool] = None,  # true: still joinable, false: full only
+    summary: bool = False,
+    fields: Optional[str] = None,  # e.g. "id,title,date,participant_count"
+    cursor: Optional[str] = None,  # X-Next-Cursor of the previous page
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: Optional[models.User] = Depends(auth.get_current_user_optional_async)
+):
+    selected = selected_fields(fields, summary)
+
+    def page(session: Session):
+        query = match_list_query(session, selected, MATCH_PAGE_KEY)
+
+        if upcoming_only:
+            query = query.filter(models.Match.starts_at >= models.day_start())
+
+        query = filter_joinable(query, current_user, exclude_full_team_matches, has_spots)
+
+        query = apply_keyset(
+            query, [getattr(models.Match, f) for f in MATCH_PAGE_KEY], cursor, MATCH_PAGE_TYPES
+        )
+        if skip and not cursor:
+            query = query.offset(skip)  # Legacy offset paging, prefer cursor
+        return match_page(query, selected, limit, response, MATCH_PAGE_KEY)
+
+    return await db.run_sync(page)
+
+def parse_hhmm(value: str) -> str:
+    try:
+        return datetime.strptime(value, "%H:%M").strftime("%H:%M")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid time format. Use HH:MM")
+
+def like_pattern(text: str, anywhere: bool = True) -> str:
+    """LIKE pattern matching `text` anywhere (or as a prefix), its wildcards taken literally"""
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%" if anywhere else f"{escaped}%"
+
+@router.get("/search", response_model=List[schemas.MatchResponse])
+async def search_matches(
+    response: Response,
+    q: Optional[str] = None,  # Free text in the title / description
+    city: Optional[str] = None,
+    near_city: Optional[str] = None,  # Cities within radius_km of this one
+    radius_km: float = 25,
+    stadium: Optional[str] = None,
+    type_match: Optional[str] = None,
+    is_team_match: Optional[bool] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    time_from: Optional[str] = None,  # Kickoff between time_from and time_to, HH:MM
+    time_to: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_spots: Optional[int] = None,
+    has_spots: Optional[bool] = None,
+    exclude_full_team_matches: bool = False,
+    upcoming_only: bool = True,
+    sort: str = "starts_at",  # starts_at, -starts_at, price, -price
+    limit: int = 20,
+    cursor: Optional[str] = None,  # X-Next-Cursor of the previous page
+    summary: bool = False,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: Optional[models.User] = Depends(auth.get_current_user_optional_async)
+):
+    """
+    Multi-criteria search, every filter in SQL. Paged with a cursor over the
+    sort key and the id, so every page is an index range scan.
+    """
+    descending = sort.startswith("-")
+    sort_key = sort.lstrip("-")
+    if sort_key not in SEARCH_SORTS:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown sort: {sort}. Use one of {', '.join(SEARCH_SORTS)}"
+        )
+    sort_column, sort_types = SEARCH_SORTS[sort_key]
+    page_key = (sort_key, "id")
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+
+    selected = selected_fields(fields, summary)
+    cities = None
+    if near_city:
+        cities = gazetteer.cities_near(near_city, radius_km)
+        if cities is None:
+            raise HTTPException(status_code=400, detail=f"Unknown city: {near_city}")
+    time_from = parse_hhmm(time_from) if time_from else None
+    time_to = parse_hhmm(time_to) if time_to else None
+
+    def page(session: Session):
+        query = match_list_query(session, selected, page_key)
+        Match = models.Match
+
+        if q and q.strip():
+            pattern = like_pattern(q.strip())
+            query = query.filter(
+                Match.title.ilike(pattern, escape="\\") | Match.description.ilike(pattern, escape="\\")
+            )
+        if city and city.strip():
+            # Case-insensitive prefix, as typed in the search box ("tun" finds Tunis)
+            pattern = like_pattern(city.strip().lower(), anywhere=False)
+            query = query.filter(func.lower(Match.city).like(pattern, escape="\\"))
+        if cities is not None:
+            query = query.filter(Match.city.in_(cities))
+        if stadium:
+            query = query.filter(Match.stadium == stadium)
+        if type_match:
+            query = query.filter(Match.type_match == type_match)
+        if is_team_match is not None:
+            query = query.filter(Match.is_team_match == is_team_match)
+
+        if upcoming_only:
+            query = query.filter(Match.starts_at >= models.day_start())
+        if date_from:
+            query = query.filter(Match.starts_at >= datetime.combine(date_from, time.min))
+        if date_to:
+            query = query.filter(Match.starts_at < datetime.combine(date_to + timedelta(days=1), time.min))
+        # start_time is stored as HH:MM (time inputs), so the strings compare in order
+        if time_from:
+            query = query.filter(Match.start_time >= time_from)
+        if time_to:
+            query = query.filter(Match.start_time <= time_to)
+
+        if min_price is not None:
+            query = query.filter(Match.price >= min_price)
+        if max_price is not None:
+            query = query.filter(Match.price <= max_price)
+
+        if min_spots is not None:
+            query = query.filter(Match.spots_left >= min_spots)
+        query = filter_joinable(query, current_user, exclude_full_team_matches, has_spots)
+
+        query = apply_keyset(query, [sort_column, Match.id], cursor, sort_types, descending)
+        return match_page(query, selected, limit, response, page_key)
+
+    return await db.run_sync(page)
+
 @router.post("/{match_id}/join")
-def join_match(
+async def join_match(
     match_id: int, 
     team_id: int = None, # Optional, for team matches
-    db: Session = Depends(database.get_db), 
-    current_user: models.User = Depends(auth.get_current_user)
+    db: AsyncSession = Depends(database.get_async_db), 
+    current_user: models.User = Depends(auth.get_current_user_async)
 ):
-    match = db.query(models.Match).filter(models.Match.id == match_id).first()
-    if not match:
-        raise HTTPException(status_code=404, detail="Match not found")
+    def join(session: Session):
+        match = session.query(models.Match).filter(models.Match.id == match_id).first()
+        if not match:
+            raise HTTPException(status_code=404, detail="Match not found")
     
-    if match.is_team_match:
-        # Team Match Join Logic
-        if not team_id:
-            raise HTTPException(status_code=400, detail="Team ID is required to join a Team Match")
+        if match.is_team_match:
+            # Team Match Join Logic
+            if not team_id:
+                raise HTTPException(status_code=400, detail="Team ID is required to join a Team Match")
         
-        if match.team_b_id:
-            raise HTTPException(status_code=400, detail="Match is already full (Team B already joined)")
+            if match.team_b_id:
+                raise HTTPException(status_code=400, detail="Match is already full (Team B already joined)")
         
-        if match.team_a_id == team_id:
-             raise HTTPException(status_code=400, detail="Your team is already in this match")
+            if match.team_a_id == team_id:
+                 raise HTTPException(status_code=400, detail="Your team is already in this match")
 
-        team = db.query(models.Team).filter(models.Team.id == team_id).first()
-        if not team:
-            raise HTTPException(status_code=404, detail="Team not found")
+            team = session.query(models.Team).filter(models.Team.id == team_id).first()
+            if not team:
+                raise HTTPException(status_code=404, detail="Team not found")
         
-        if team.captain_id != current_user.id:
-            raise HTTPException(status_code=403, detail="Only the team captain can join a match")
+            if team.captain_id != current_user.id:
+                raise HTTPException(status_code=403, detail="Only the team captain can join a match")
         
-        match.team_b_id = team.id
+            # Conditional UPDATE: only one team can ever claim the slot
+            claim_team_b(session, match.id, team.id)
         
-        # Auto-ajouter tous les membres de Team B aux participants
-        add_team_members_to_match(match, team.id, db)
+            # Auto-ajouter tous les membres de Team B aux participants
+            added_user_ids = add_team_members_to_match(match, team.id, session)
         
-        db.commit()
-        return {"message": "Successfully joined match as Team B"}
+            session.commit()
+            feature_store.upsert(match)
+            participation_graph.add(added_user_ids, match.id)
+            recommendation_cache.invalidate_users(added_user_ids)
+            return {"message": "Successfully joined match as Team B"}
 
-    else:
-        # Individual Match Join Logic
-        # Check if already joined
-        if current_user in match.participants:
-            raise HTTPException(status_code=400, detail="Already joined this match")
-        
-        # Check if full (including already_joined external players)
-        total_joined = len(match.participants) # Removed already_joined from DB
-        if total_joined >= match.nb_players:
-            raise HTTPException(status_code=400, detail="Match is full")
+        else:
+            # Individual Match Join Logic
+            # Seat reserved atomically (already joined / full checks included)
+            user_id = current_user.id
+            nb_players = match.nb_players
+            total_joined = reserve_seat(session, match.id, user_id)
 
-        match.participants.append(current_user)
-        db.commit()
-        return {"message": "Successfully joined match"}
+            feature_store.upsert(match)
+            participation_graph.add([user_id], match.id)
+            recommendation_cache.invalidate_user(user_id)
+            if total_joined >= nb_players:
+                recommendation_cache.invalidate_match(match.id)
+            return {"message": "Successfully joined match"}
+
+    return await db.run_sync(join)
 
 @router.delete("/{match_id}/participants/{user_id}")
 def remove_participant(
@@ -198,18 +408,12 @@ def remove_participant(
     if match.organizer_id != current_user.id:
         raise HTTPException(status_code=403, detail="Only the organizer can remove participants")
     
-    # Find participant to remove
-    participant_to_remove = None
-    for p in match.participants:
-        if p.id == user_id:
-            participant_to_remove = p
-            break
-    
-    if not participant_to_remove:
-        raise HTTPException(status_code=404, detail="Participant not found in this match")
-    
-    match.participants.remove(participant_to_remove)
+    # Remove the participant row and free the seat
+    release_seat(db, match.id, user_id)
     db.commit()
+    feature_store.upsert(match)  # Joinable again if it was full
+    participation_graph.remove([user_id], match.id)
+    recommendation_cache.invalidate_user(user_id)
     
     return {"message": "Participant removed successfully"}
 
@@ -233,28 +437,20 @@ def remove_team_b(
     if not match.team_b_id:
         raise HTTPException(status_code=404, detail="No opposing team to remove")
     
-    # Get Team B members to remove them from participants
-    team_b_members = db.query(models.TeamMember).filter(
-        models.TeamMember.team_id == match.team_b_id,
-        models.TeamMember.user_id.isnot(None)
-    ).all()
-    
-    team_b_user_ids = [m.user_id for m in team_b_members]
-    
-    # Remove participants that are in Team B
-    # We iterate a copy of the list to avoid modification issues during iteration
-    for p in list(match.participants):
-        if p.id in team_b_user_ids:
-            match.participants.remove(p)
+    # Remove Team B members from participants and free their seats
+    team_b_user_ids = release_team_seats(db, match.id, match.team_b_id)
             
     # Remove Team B from match
     match.team_b_id = None
     
     db.commit()
+    participation_graph.remove(team_b_user_ids, match.id)
+    recommendation_cache.invalidate_users(team_b_user_ids)
     
     return {"message": "Opposing team removed successfully"}
 
-from ..email_utils import send_match_cancellation
+from ..email_utils import build_match_cancellation
+from ..mail_dispatcher import mail_dispatcher
 
 @router.delete("/{match_id}")
 def delete_match(
@@ -300,24 +496,30 @@ def delete_match(
     # Delete match
     db.delete(match)
     db.commit()
+    feature_store.remove(match_id)
+    participation_graph.remove_match(match_id)
+    recommendation_cache.invalidate_match(match_id)
+    recommendation_cache.invalidate_users(p.id for p in unique_participants)
     
-    # Send emails
-    print(f"📧 Found {len(unique_participants)} unique participants to notify.")
+    # Queue emails, the dispatcher sends them in the background
+    queued = 0
     for player in unique_participants:
         if player.id == current_user.id:
-            print(f"   ℹ️ Skipping email for {player.email} (Organizer/Deleter)")
+            logger.debug("Skipping email for %s (Organizer/Deleter)", player.email)
             continue
             
         if player.email:
-            print(f"   📨 Sending cancellation email to {player.email}...")
-            send_match_cancellation(
+            logger.debug("Queueing cancellation email to %s", player.email)
+            queued += 1
+            mail_dispatcher.enqueue(build_match_cancellation(
                 to_email=player.email,
                 player_name=player.full_name or "Player",
                 match_title=match_title,
                 date=match_date,
                 time=match_time
-            )
+            ))
         else:
-            print(f"   ⚠️ Skipping {player.full_name} (No email address)")
+            logger.warning("Skipping %s (No email address)", player.full_name)
+    logger.info("Match %d deleted, %d of %d participants notified", match_id, queued, len(unique_participants))
             
     return {"message": "Match deleted and participants notified"}
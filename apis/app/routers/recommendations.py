@@ -1,39 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any
 from .. import models, database, auth
 from ..ml_service import MatchRecommender
+from ..cache import recommendation_cache
 
 router = APIRouter(
     prefix="/recommendations",
     tags=["recommendations"]
 )
 
-@router.get("/", response_model=List[Dict[str, Any]])
-def get_recommendations(
-    limit: int = 5,
-    db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(auth.get_current_user)
-):
-    """
-    Get personalized match recommendations for the current user
-    
-    Args:
-        limit: Number of recommendations to return (default: 5)
-        db: Database session
-        current_user: Authenticated user
-        
-    Returns:
-        List of recommended matches with similarity scores and reasons
-    """
-    recommender = MatchRecommender(n_neighbors=limit)
-    recommendations = recommender.recommend_matches(
-        user_id=current_user.id,
-        db=db,
-        limit=limit
-    )
-    
-    # Format response
+def format_recommendations(recommendations):
+    """Response rows (plain dicts, so nothing is lazy-loaded after the session)"""
     result = []
     for rec in recommendations:
         match = rec["match"]
@@ -54,6 +33,8 @@ def get_recommendations(
                 "max_age": match.max_age,
                 "organizer_id": match.organizer_id,
                 "organizer_name": match.organizer_name if hasattr(match, 'organizer_name') else None,
+                "participant_count": match.participant_count,
+                "spots_left": match.spots_left,
                 "participants": [
                     {
                         "id": p.id,
@@ -70,3 +51,49 @@ def get_recommendations(
         })
     
     return result
+
+@router.get("/", response_model=List[Dict[str, Any]])
+async def get_recommendations(
+    limit: int = 5,
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: models.User = Depends(auth.get_current_user_async)
+):
+    """
+    Get personalized match recommendations for the current user
+    
+    Args:
+        limit: Number of recommendations to return (default: 5)
+        db: Database session
+        current_user: Authenticated user
+        
+    Returns:
+        List of recommended matches with similarity scores and reasons
+    """
+    user_id = current_user.id
+    cached = recommendation_cache.get(user_id, limit)
+    if cached is None:
+        # Queries on the async session, only the scoring gets a worker thread
+        recommender = MatchRecommender(n_neighbors=limit)
+        recommendations = await recommender.recommend_matches_async(user_id, db, limit)
+        recommendation_cache.set(user_id, limit, [
+            {
+                "match_id": rec["match"].id,
+                "similarity_score": rec["similarity_score"],
+                "reason": rec["reason"]
+            } for rec in recommendations
+        ])
+        return format_recommendations(recommendations)
+
+    # Rankings come from the cache, match details are always fresh
+    def from_cache(session: Session):
+        matches = MatchRecommender._load_matches(session, [rec["match_id"] for rec in cached])
+        by_id = {match.id: match for match in matches}
+        return format_recommendations([
+            {
+                "match": by_id[rec["match_id"]],
+                "similarity_score": rec["similarity_score"],
+                "reason": rec["reason"]
+            } for rec in cached if rec["match_id"] in by_id
+        ])
+
+    return await db.run_sync(from_cache)
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select, insert
+from sqlalchemy.orm import Session, selectinload
 from typing import List
 from .. import models, schemas, database, auth
 
@@ -16,17 +17,23 @@ def create_team(team: schemas.TeamCreate, db: Session = Depends(database.get_db)
         captain_id=current_user.id
     )
     db.add(new_team)
-    db.commit()
-    db.refresh(new_team)
+    db.flush()  # Assigns new_team.id
+
+    # Résoudre tous les emails des membres en une seule requête
+    emails = {m.email for m in team.members if m.email}
+    users_by_email = {}
+    if emails:
+        users_by_email = {
+            u.email: u for u in db.query(models.User).filter(models.User.email.in_(emails))
+        }
 
     # Ajouter le capitaine comme premier membre de l'équipe
     # Cela permet au capitaine d'être auto-inscrit aux matchs aussi
-    captain_member = models.TeamMember(
-        team_id=new_team.id,
-        user_id=current_user.id,
-        name=current_user.full_name or current_user.email
-    )
-    db.add(captain_member)
+    rows = [{
+        "team_id": new_team.id,
+        "user_id": current_user.id,
+        "name": current_user.full_name or current_user.email
+    }]
 
     # Ajouter les autres membres soumis
     for member_data in team.members:
@@ -34,18 +41,15 @@ def create_team(team: schemas.TeamCreate, db: Session = Depends(database.get_db)
         name = member_data.name
         
         # If email provided, try to find user
-        if member_data.email:
-            user = db.query(models.User).filter(models.User.email == member_data.email).first()
-            if user:
-                user_id = user.id
-                name = user.full_name or user.email # Use their actual name if available
+        user = users_by_email.get(member_data.email)
+        if user:
+            user_id = user.id
+            name = user.full_name or user.email # Use their actual name if available
         
-        new_member = models.TeamMember(
-            team_id=new_team.id,
-            user_id=user_id,
-            name=name
-        )
-        db.add(new_member)
+        rows.append({"team_id": new_team.id, "user_id": user_id, "name": name})
+
+    # Un seul INSERT multi-lignes pour tout l'effectif
+    db.execute(insert(models.TeamMember), rows)
     
     db.commit()
     db.refresh(new_team)
@@ -53,18 +57,18 @@ def create_team(team: schemas.TeamCreate, db: Session = Depends(database.get_db)
 
 @router.get("/me", response_model=List[schemas.TeamResponse])
 def read_my_teams(db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
-    # Teams où l'utilisateur est capitaine
-    teams_as_captain = db.query(models.Team).filter(models.Team.captain_id == current_user.id).all()
-    
-    # Teams où l'utilisateur est membre (via team_members avec user_id)
-    teams_as_member = db.query(models.Team).join(models.TeamMember).filter(
+    # Teams où l'utilisateur est capitaine (en premier) ou membre (via team_members
+    # avec user_id), membres chargés en une seule requête supplémentaire
+    member_team_ids = select(models.TeamMember.team_id).where(
         models.TeamMember.user_id == current_user.id
-    ).all()
-    
-    # Combiner et dédupliquer (au cas où le capitaine est aussi dans les membres)
-    all_teams_dict = {team.id: team for team in teams_as_captain + teams_as_member}
+    )
+    teams = db.query(models.Team).options(
+        selectinload(models.Team.members)
+    ).filter(
+        (models.Team.captain_id == current_user.id) | models.Team.id.in_(member_team_ids)
+    ).order_by(models.Team.captain_id != current_user.id, models.Team.id).all()
     
-    return list(all_teams_dict.values())
+    return teams
 
 @router.delete("/{team_id}")
 def delete_team(
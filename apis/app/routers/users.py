@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form
+from fastapi import APIRouter, Depends, HTTPException, Response, status, File, UploadFile, Form
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
 import shutil
 import os
 from .. import models, schemas, database, auth
+from ..pagination import apply_keyset, next_cursor, NEXT_CURSOR_HEADER
 
 router = APIRouter(
     prefix="/users",
@@ -11,20 +15,21 @@ router = APIRouter(
 )
 
 @router.post("/", response_model=schemas.UserResponse)
-def create_user(
+async def create_user(
     email: str = Form(...),
     password: str = Form(...),
     full_name: str = Form(None),
     phone: str = Form(None),
     age: int = Form(None),
     file: UploadFile = File(None),
-    db: Session = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_async_db)
 ):
-    db_user = db.query(models.User).filter(models.User.email == email).first()
-    if db_user:
+    existing = await db.execute(select(models.User.id).where(models.User.email == email))
+    if existing.first():
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_password = auth.get_password_hash(password)
+    # bcrypt runs in the dedicated password pool, not in the request threadpool
+    hashed_password = await auth.get_password_hash_async(password)
     new_user = models.User(
         email=email,
         hashed_password=hashed_password,
@@ -33,23 +38,40 @@ def create_user(
         age=age
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     if file:
         file_location = f"static/images/profiles/{new_user.id}.jpg"
-        with open(file_location, "wb+") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Disk write in a worker thread, the event loop keeps serving
+        await run_in_threadpool(_save_upload, file, file_location)
         # Update image_url
         new_user.image_url = f"http://127.0.0.1:8001/{file_location}"
-        db.commit()
-        db.refresh(new_user)
+        await db.commit()
+        await db.refresh(new_user)
 
     return new_user
 
+def _save_upload(file: UploadFile, file_location: str):
+    with open(file_location, "wb+") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+
 @router.get("/", response_model=List[schemas.UserResponse])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db)):
-    users = db.query(models.User).offset(skip).limit(limit).all()
+def read_users(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,  # X-Next-Cursor of the previous page
+    db: Session = Depends(database.get_db)
+):
+    query = apply_keyset(db.query(models.User), [models.User.id], cursor)
+    if skip and not cursor:
+        query = query.offset(skip)  # Legacy offset paging, prefer cursor
+    users = query.limit(limit).all()
+
+    cursor_value = next_cursor(users, limit, lambda user: [user.id])
+    if cursor_value:
+        response.headers[NEXT_CURSOR_HEADER] = cursor_value
     return users
 
 @router.get("/me", response_model=schemas.UserResponse)
@@ -94,5 +116,6 @@ def update_user_me(
 
     db.commit()
     db.refresh(current_user)
+    auth.invalidate_user(current_user)
 
     return current_user
@@ -71,9 +71,24 @@ class MatchResponse(MatchBase):
     organizer_id: int
     organizer_name: Optional[str] = None
     participants: List[UserResponse] = []
+    participant_count: int = 0
+    spots_left: int = 0
     
     team_a: Optional[TeamResponse] = None
     team_b: Optional[TeamResponse] = None
 
     class Config:
         orm_mode = True
+
+class MatchSummary(MatchBase):
+    """Scalar columns only, for list views that never render participants"""
+    id: int
+    organizer_id: int
+    organizer_name: Optional[str] = None
+    description: Optional[str] = None
+    stadium: Optional[str] = None
+    end_time: Optional[str] = None
+    team_a_id: Optional[int] = None
+    team_b_id: Optional[int] = None
+    participant_count: int = 0
+    spots_left: int = 0
@@ -0,0 +1,380 @@
+"""
+Match similarity: the exact KNN scoring kernel and nearest-neighbour
+indexes over candidate match vectors.
+
+The recommender scores candidates exactly (mean distance to the k nearest
+history rows). On large catalogues an index first shortlists, for each
+history row, the `n` closest candidates; only that union is then scored.
+All indexes share one interface and are updated incrementally as the
+feature store changes:
+
+    build(ids, X)  ->  add(id, x) / remove(id)  ->  query(Q, n) -> ids
+"""
+
+import os
+
+import numpy as np
+from scipy import sparse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Upper bound on the (users x candidates x history) distance tensor built by
+# one step of the batched KNN, and on the (users x history x features) padded
+# histories handed to it, to keep memory flat on a small VM.
+KNN_BATCH_ELEMENTS = int(os.getenv("KNN_BATCH_ELEMENTS", "8000000"))
+
+
+def history_batches(lengths, n_features, budget=None):
+    """
+    Split users into batches whose padded (b, h, f) history array stays
+    within `budget` elements. Users are grouped by history length, so
+    little of each batch is padding; a single user is never split.
+
+    Returns:
+        List of index arrays into `lengths`
+    """
+    budget = budget or KNN_BATCH_ELEMENTS
+    order = np.argsort(lengths, kind="stable")
+    batches, start = [], 0
+    for end in range(len(order)):
+        # Sorted by length: adding user `end` pads the batch to its length
+        if end > start and (end - start + 1) * lengths[order[end]] * n_features > budget:
+            batches.append(order[start:end])
+            start = end
+    if start < len(order):
+        batches.append(order[start:])
+    return batches
+
+
+def knn_mean_distances(candidates, histories, lengths, n_neighbors):
+    """
+    Mean Euclidean distance from every candidate to its k nearest history rows,
+    for many users at once.
+
+    Args:
+        candidates: (c, f) candidate feature matrix shared by all users,
+            dense or scipy.sparse
+        histories: (u, h, f) dense history features, padded along h
+        lengths: (u,) number of real history rows per user
+        n_neighbors: k, capped per user by its history length
+
+    Returns:
+        (u, c) matrix of mean distances
+    """
+    n_users, max_history, n_features = histories.shape
+    n_candidates = candidates.shape[0]
+    result = np.empty((n_users, n_candidates), dtype=np.float64)
+    if n_users == 0 or n_candidates == 0:
+        return result
+
+    k = np.minimum(lengths, n_neighbors).astype(np.int64)
+    if sparse.issparse(candidates):
+        cand_sq = np.asarray(candidates.multiply(candidates).sum(axis=1)).ravel()
+    else:
+        cand_sq = (candidates ** 2).sum(axis=1)
+    padding = np.arange(max_history)[None, :] >= lengths[:, None]  # (u, h)
+
+    step = max(1, KNN_BATCH_ELEMENTS // max(1, n_candidates * max_history))
+    for start in range(0, n_users, step):
+        stop = min(start + step, n_users)
+        hist = histories[start:stop]
+        # c.h for every pair as one (sparse) matrix product: (c, b*h) -> (b, c, h)
+        dots = np.asarray(candidates @ hist.reshape(-1, n_features).T)
+        dots = dots.reshape(n_candidates, stop - start, max_history).transpose(1, 0, 2)
+        # |c - h|^2 = |c|^2 + |h|^2 - 2 c.h
+        sq = (
+            cand_sq[None, :, None]
+            + (hist ** 2).sum(axis=2)[:, None, :]
+            - 2 * dots
+        )
+        dist = np.sqrt(np.maximum(sq, 0))
+        dist[np.broadcast_to(padding[start:stop, None, :], dist.shape)] = np.inf
+        dist.sort(axis=2)
+        cumulative = np.cumsum(dist, axis=2)
+        kk = k[start:stop]
+        picked = np.take_along_axis(cumulative, (kk - 1)[:, None, None], axis=2)[:, :, 0]
+        result[start:stop] = picked / kk[:, None]
+    return result
+
+
+def distances_to_similarities(avg_distances):
+    """Convert distances to similarity scores (0-1, higher = more similar), per row"""
+    if avg_distances.shape[1] == 0:
+        return avg_distances
+    finite = np.where(np.isfinite(avg_distances), avg_distances, 0)
+    max_dist = finite.max(axis=1)
+    # Tolerance: the |c|^2 + |h|^2 - 2c.h expansion leaves ~1e-8 noise on identical rows
+    max_dist = np.where(max_dist > 1e-6, max_dist, 1)
+    similarities = 1 - (avg_distances / max_dist[:, None])
+    return np.where(np.isfinite(similarities), similarities, -np.inf)
+
+
+def _sq_distances(Q, X):
+    """(m, n) squared Euclidean distances between the rows of Q and X"""
+    sq = (Q ** 2).sum(axis=1)[:, None] + (X ** 2).sum(axis=1)[None, :] - 2 * Q @ X.T
+    return np.maximum(sq, 0)
+
+
+def _as_matrix(X, n_rows):
+    X = np.asarray(X, dtype=np.float64)
+    return X.reshape(n_rows, X.shape[-1] if X.ndim == 2 else 0)
+
+
+def _top_n(sq, n):
+    """Column indexes of the n smallest entries of every row (unordered)"""
+    if sq.shape[1] <= n:
+        return np.broadcast_to(np.arange(sq.shape[1]), sq.shape)
+    return np.argpartition(sq, n - 1, axis=1)[:, :n]
+
+
+class SimilarityIndex:
+    name = ""
+
+    def build(self, ids, X):
+        raise NotImplementedError
+
+    def add(self, match_id: int, x):
+        raise NotImplementedError
+
+    def remove(self, match_id: int):
+        raise NotImplementedError
+
+    def query(self, Q, n: int):
+        """Ids of the union of the n nearest neighbours of every row of Q"""
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+class BruteForceIndex(SimilarityIndex):
+    """Exact: dense matrix with swap-remove, scanned in full on every query"""
+    name = "brute"
+
+    def __init__(self):
+        self.build(np.empty(0, dtype=np.int64), np.empty((0, 0)))
+
+    def build(self, ids, X):
+        self._ids = np.array(ids, dtype=np.int64)
+        self._X = _as_matrix(X, len(self._ids)).copy()
+        self._size = len(self._ids)
+        self._row_of = {int(i): r for r, i in enumerate(self._ids)}
+
+    def add(self, match_id, x):
+        x = np.asarray(x, dtype=np.float64)
+        row = self._row_of.get(match_id)
+        if row is None:
+            if self._size == len(self._ids):
+                capacity = max(64, 2 * self._size)
+                ids = np.empty(capacity, dtype=np.int64)
+                X = np.empty((capacity, len(x)))
+                if self._size:
+                    ids[:self._size], X[:self._size] = self._ids[:self._size], self._X[:self._size]
+                self._ids, self._X = ids, X
+            row = self._size
+            self._size += 1
+            self._row_of[match_id] = row
+        self._ids[row] = match_id
+        self._X[row] = x
+
+    def remove(self, match_id):
+        row = self._row_of.pop(match_id, None)
+        if row is None:
+            return
+        last = self._size - 1
+        if row != last:
+            self._ids[row], self._X[row] = self._ids[last], self._X[last]
+            self._row_of[int(self._ids[row])] = row
+        self._size = last
+
+    def vectors(self):
+        return self._ids[:self._size], self._X[:self._size]
+
+    def query(self, Q, n):
+        if self._size == 0:
+            return np.empty(0, dtype=np.int64)
+        ids, X = self.vectors()
+        return np.unique(ids[_top_n(_sq_distances(np.atleast_2d(Q), X), n)])
+
+    def __len__(self):
+        return self._size
+
+
+class TreeIndex(SimilarityIndex):
+    """
+    sklearn BallTree / KDTree built once. Trees are static, so additions go
+    to a small brute-force delta and removals to a tombstone set; the tree
+    is rebuilt once they exceed `rebuild_ratio` of its size.
+    """
+
+    def __init__(self, kind: str = "ball", leaf_size: int = 40, rebuild_ratio: float = 0.1):
+        from sklearn.neighbors import BallTree, KDTree
+        self.name = "balltree" if kind == "ball" else "kdtree"
+        self._tree_class = BallTree if kind == "ball" else KDTree
+        self.leaf_size = leaf_size
+        self.rebuild_ratio = rebuild_ratio
+        self.build(np.empty(0, dtype=np.int64), np.empty((0, 0)))
+
+    def build(self, ids, X):
+        self._base_ids = np.array(ids, dtype=np.int64)
+        self._base_X = _as_matrix(X, len(self._base_ids))
+        self._tree = self._tree_class(self._base_X, leaf_size=self.leaf_size) if len(self._base_ids) else None
+        self._base_set = set(self._base_ids.tolist())
+        self._dead = set()
+        self._delta = BruteForceIndex()
+
+    def _maybe_rebuild(self):
+        pending = len(self._delta) + len(self._dead)
+        if pending > max(64, self.rebuild_ratio * len(self._base_ids)):
+            live = np.array([i not in self._dead for i in self._base_ids.tolist()], dtype=bool)
+            delta_ids, delta_X = self._delta.vectors()
+            if len(delta_ids):
+                self.build(
+                    np.concatenate([self._base_ids[live], delta_ids]),
+                    np.vstack([self._base_X[live], delta_X])
+                )
+            else:
+                self.build(self._base_ids[live], self._base_X[live])
+
+    def add(self, match_id, x):
+        # An update of a tree row is a tombstone plus a delta entry
+        if match_id in self._base_set:
+            self._dead.add(match_id)
+        self._delta.add(match_id, x)
+        self._maybe_rebuild()
+
+    def remove(self, match_id):
+        if match_id in self._base_set:
+            self._dead.add(match_id)
+        self._delta.remove(match_id)
+        self._maybe_rebuild()
+
+    def query(self, Q, n):
+        Q = np.atleast_2d(Q)
+        found = [self._delta.query(Q, n)]
+        if self._tree is not None:
+            k = min(n + len(self._dead), len(self._base_ids))
+            _, rows = self._tree.query(Q, k=k)
+            ids = self._base_ids[np.unique(rows)]
+            if self._dead:
+                ids = ids[~np.isin(ids, np.fromiter(self._dead, dtype=np.int64))]
+            found.append(ids)
+        return np.unique(np.concatenate(found))
+
+    def __len__(self):
+        return len(self._base_ids) - len(self._dead) + len(self._delta)
+
+
+class LSHIndex(SimilarityIndex):
+    """
+    Random-projection LSH for Euclidean distance (p-stable projections):
+    `n_tables` hash tables, each keyed by `n_projections` quantized random
+    projections of width `bucket_width`. Candidates colliding with a query
+    in any table are reranked exactly. Vectors live in stable slots, so
+    add/remove only touch the buckets of one vector.
+    """
+    name = "lsh"
+
+    def __init__(self, n_tables: int = 16, n_projections: int = 5, bucket_width: float = 4.0, seed: int = 0):
+        self.n_tables = n_tables
+        self.n_projections = n_projections
+        self.bucket_width = bucket_width
+        self.seed = seed
+        self.build(np.empty(0, dtype=np.int64), np.empty((0, 0)))
+
+    def _hash(self, X):
+        """(m, n_tables) bucket keys, as bytes, of the rows of X"""
+        codes = np.floor((X @ self._A + self._b) / self.bucket_width).astype(np.int32)
+        codes = codes.reshape(len(X), self.n_tables, self.n_projections)
+        return [[row[t].tobytes() for t in range(self.n_tables)] for row in codes]
+
+    def build(self, ids, X):
+        X = _as_matrix(X, len(ids))
+        rng = np.random.default_rng(self.seed)
+        self._A = rng.normal(size=(X.shape[1], self.n_tables * self.n_projections))
+        self._b = rng.uniform(0, self.bucket_width, self.n_tables * self.n_projections)
+        self._tables = [{} for _ in range(self.n_tables)]  # key -> set of slots
+        self._arrays = {}  # (table, key) -> cached slot array of the bucket
+        self._X = X.copy()
+        self._slot_ids = np.array(ids, dtype=np.int64)  # Same capacity as _X, -1 when free
+        self._used = len(self._slot_ids)  # Slots handed out so far
+        self._slot_of = {int(i): slot for slot, i in enumerate(self._slot_ids)}
+        self._keys = {}
+        self._free = []
+        for slot, keys in enumerate(self._hash(X)):
+            self._link(slot, keys)
+
+    def _link(self, slot, keys):
+        for t, (table, key) in enumerate(zip(self._tables, keys)):
+            table.setdefault(key, set()).add(slot)
+            self._arrays.pop((t, key), None)
+        self._keys[slot] = keys
+
+    def _bucket(self, t, key):
+        array = self._arrays.get((t, key))
+        if array is None:
+            slots = self._tables[t].get(key, ())
+            array = self._arrays[(t, key)] = np.fromiter(slots, dtype=np.int64, count=len(slots))
+        return array
+
+    def add(self, match_id, x):
+        x = np.asarray(x, dtype=np.float64)
+        self.remove(match_id)
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = self._used
+            if slot == len(self._X):
+                # Geometric growth: n adds copy O(n) rows in total
+                capacity = max(64, 2 * slot)
+                X = np.empty((capacity, len(x)))
+                X[:slot] = self._X[:slot]
+                slot_ids = np.full(capacity, -1, dtype=np.int64)
+                slot_ids[:slot] = self._slot_ids[:slot]
+                self._X, self._slot_ids = X, slot_ids
+            self._used += 1
+        self._X[slot] = x
+        self._slot_ids[slot] = match_id
+        self._slot_of[match_id] = slot
+        self._link(slot, self._hash(x[None, :])[0])
+
+    def remove(self, match_id):
+        slot = self._slot_of.pop(match_id, None)
+        if slot is None:
+            return
+        for t, (table, key) in enumerate(zip(self._tables, self._keys.pop(slot))):
+            bucket = table[key]
+            bucket.discard(slot)
+            if not bucket:
+                del table[key]
+            self._arrays.pop((t, key), None)
+        self._slot_ids[slot] = -1
+        self._free.append(slot)
+
+    def query(self, Q, n):
+        Q = np.unique(np.atleast_2d(Q), axis=0)  # Repeated history rows hash alike
+        found = []
+        for q, keys in zip(Q, self._hash(Q)):
+            slots = np.unique(np.concatenate(
+                [self._bucket(t, key) for t, key in enumerate(keys)]
+            ))
+            if len(slots):
+                sq = _sq_distances(q[None, :], self._X[slots])
+                found.append(self._slot_ids[slots[_top_n(sq, n)[0]]])
+        return np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self._slot_of)
+
+
+def make_index(name: str) -> SimilarityIndex:
+    """Index by name: brute (default), balltree, kdtree or lsh"""
+    name = (name or "brute").lower()
+    if name == "brute":
+        return BruteForceIndex()
+    if name in ("balltree", "kdtree"):
+        return TreeIndex(kind="ball" if name == "balltree" else "kd")
+    if name == "lsh":
+        return LSHIndex()
+    raise ValueError(f"Unknown similarity backend: {name}")
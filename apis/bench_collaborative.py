@@ -0,0 +1,72 @@
+"""
+Times the collaborative-filtering scores on a synthetic participation graph
+(no database queries):
+
+    python bench_collaborative.py
+    python bench_collaborative.py --users 100000 --matches 200000 --joins 20 --candidates 5000
+
+Reports the graph build time, the cost of folding incremental joins /
+leaves into the matrix, single-user latency and the time to score every
+user against every candidate (the recommend_batch path).
+"""
+
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from app.collaborative import ParticipationGraph
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--matches", type=int, default=200000)
+    parser.add_argument("--joins", type=int, default=20, help="matches joined per user")
+    parser.add_argument("--candidates", type=int, default=5000, help="upcoming matches scored")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    users = np.repeat(np.arange(args.users), args.joins)
+    # Popular matches get more players, as in the real data
+    matches = (rng.pareto(1.5, len(users)) * args.matches / 20).astype(np.int64) % args.matches
+
+    graph = ParticipationGraph()
+    start = time.perf_counter()
+    graph.build(users, matches)
+    graph._loaded_at = float("inf")  # Never reloaded from the database here
+    print(f"build: {time.perf_counter() - start:.2f}s for {len(graph)} participations")
+
+    candidates = list(range(args.matches - args.candidates, args.matches))
+
+    updates = []
+    for _ in range(5):
+        graph.add(rng.integers(0, args.users, 10).tolist(), int(rng.integers(0, args.matches)))
+        start = time.perf_counter()
+        graph.scores([0], candidates[:1])
+        updates.append(time.perf_counter() - start)
+    print(f"fold 10 joins: {statistics.median(updates) * 1000:.0f} ms")
+
+    latencies = []
+    for user_id in rng.integers(0, args.users, 50).tolist():
+        start = time.perf_counter()
+        graph.scores([user_id], candidates)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(f"single user: p50 {statistics.median(latencies) * 1000:.1f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    scored = 0
+    for first in range(0, args.users, args.chunk_size):
+        chunk = list(range(first, min(first + args.chunk_size, args.users)))
+        scored += np.count_nonzero(graph.scores(chunk, candidates).max(axis=1))
+    print(f"all {args.users} users x {len(candidates)} candidates: {time.perf_counter() - start:.2f}s "
+          f"({scored} users with a collaborative signal)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Latency of POST /matches/ as the pasted roster grows, against the database
+behind DATABASE_URL:
+
+    python bench_create_match.py
+    python bench_create_match.py --sizes 1,10,50 --repeat 20
+
+Prints the median/p95 latency and the number of SQL statements per request
+for each roster size; both should stay flat. Throwaway users and matches
+are deleted afterwards.
+"""
+
+import argparse
+import statistics
+import time
+import uuid
+from datetime import date, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app import models, auth
+from app.database import engine, SessionLocal
+from app.main import app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1,5,10,25,50")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    tag = uuid.uuid4().hex[:8]
+    db = SessionLocal()
+    users = [
+        models.User(email=f"bench-{tag}-{i}@example.com", hashed_password="x", full_name=f"Bench {i}")
+        for i in range(max(sizes) + 1)
+    ]
+    db.add_all(users)
+    db.commit()
+    organizer, teammates = users[0], [u.email for u in users[1:]]
+    user_ids = [u.id for u in users]
+    headers = {"Authorization": "Bearer " + auth.create_access_token(
+        data=auth.token_claims(organizer), expires_delta=timedelta(minutes=30)
+    )}
+    db.close()
+
+    statements = [0]
+    def count_statement(*_):
+        statements[0] += 1
+    event.listen(engine, "before_cursor_execute", count_statement)
+
+    client = TestClient(app)
+    match_date = (date.today() + timedelta(days=7)).isoformat()
+    try:
+        print(f"{'teammates':>9} {'median ms':>10} {'p95 ms':>8} {'queries':>8}")
+        for size in sizes:
+            timings, queries = [], []
+            for _ in range(args.repeat):
+                payload = {
+                    "title": f"bench {tag}", "date": match_date, "start_time": "20:00",
+                    "city": "Tunis", "nb_players": size + 1, "price_per_player": 5,
+                    "type_match": "5v5", "teammate_emails": teammates[:size],
+                }
+                statements[0] = 0
+                start = time.perf_counter()
+                response = client.post("/matches/", json=payload, headers=headers)
+                timings.append((time.perf_counter() - start) * 1000)
+                queries.append(statements[0])
+                assert response.status_code == 200, response.text
+            timings.sort()
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            print(f"{size:>9} {statistics.median(timings):>10.1f} {p95:>8.1f} {max(queries):>8}")
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+        db = SessionLocal()
+        match_ids = [m.id for m in db.query(models.Match.id).filter(models.Match.title == f"bench {tag}")]
+        db.execute(models.match_participants.delete().where(models.match_participants.c.match_id.in_(match_ids)))
+        db.query(models.Match).filter(models.Match.id.in_(match_ids)).delete(synchronize_session=False)
+        db.query(models.User).filter(models.User.id.in_(user_ids)).delete(synchronize_session=False)
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
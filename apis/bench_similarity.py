@@ -0,0 +1,115 @@
+"""
+Compares the similarity backends of the recommender on a synthetic match
+catalogue (no database needed):
+
+    python bench_similarity.py
+    python bench_similarity.py --sizes 10000,50000,100000 --users 50 --shortlist 200
+
+For each backend: index build time, incremental update cost, per-user
+latency (shortlist + exact rerank) and recall@k of the top-k against the
+exact brute-force ranking.
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.features import MatchFeaturePipeline
+from app.similarity import make_index, knn_mean_distances, distances_to_similarities
+
+GAZETTEER = "app/data/gazetteer.json"
+BACKENDS = ("brute", "balltree", "kdtree", "lsh")
+
+
+def synthetic_matches(n, rng):
+    with open(GAZETTEER) as f:
+        stadiums = json.load(f)["stadiums"]
+    cities = list(stadiums)
+    start = datetime.now().replace(minute=0, second=0, microsecond=0)
+    matches = []
+    for _ in range(n):
+        city = rng.choice(cities)
+        min_age = rng.choice([0, 16, 18, 25, 35])
+        matches.append(SimpleNamespace(
+            city=city,
+            stadium=rng.choice(list(stadiums[city]) + [None]),
+            type_match=rng.choice(["5v5", "7v7", "9v9", "11v11"]),
+            price_per_player=rng.choice([None, 3, 5, 7.5, 10, 15]),
+            nb_players=rng.choice([10, 14, 18, 22]),
+            min_age=min_age,
+            max_age=min_age + rng.choice([10, 20, 65]),
+            starts_at=start + timedelta(days=rng.randint(0, 60), hours=rng.randint(8, 22)),
+        ))
+    return matches
+
+
+def exact_top(candidates, history, k, limit):
+    distances = knn_mean_distances(candidates, history[None, :, :], np.array([len(history)]), k)
+    similarities = distances_to_similarities(distances)[0]
+    return np.argsort(-similarities, kind="stable")[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10000,50000")
+    parser.add_argument("--users", type=int, default=30)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--neighbors", type=int, default=5)
+    parser.add_argument("--shortlist", type=int, default=200)
+    parser.add_argument("--updates", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    pipeline = MatchFeaturePipeline(path="")
+    print(f"{'matches':>8} {'backend':>9} {'build s':>8} {'update ms':>10} "
+          f"{'p50 ms':>7} {'p95 ms':>7} {'scored':>7} {'recall@k':>9}")
+
+    for size in [int(s) for s in args.sizes.split(",")]:
+        raw = pipeline.encode(synthetic_matches(size, rng))
+        pipeline.fit(raw)
+        X = pipeline.transform(raw).toarray()
+        ids = np.arange(size, dtype=np.int64)
+        histories = [
+            X[rng.sample(range(size), rng.choice([1, 3, 10, 40]))] for _ in range(args.users)
+        ]
+        truth = [set(exact_top(X, h, args.neighbors, args.limit).tolist()) for h in histories]
+
+        for backend in BACKENDS:
+            index = make_index(backend)
+            start = time.perf_counter()
+            index.build(ids, X)
+            build = time.perf_counter() - start
+
+            # Incremental updates: re-insert random rows (a match edited / joined)
+            start = time.perf_counter()
+            for row in rng.sample(range(size), args.updates):
+                index.add(int(ids[row]), X[row])
+            update = (time.perf_counter() - start) * 1000 / args.updates
+
+            timings, scored, recalls = [], [], []
+            for history, expected in zip(histories, truth):
+                start = time.perf_counter()
+                if backend == "brute":
+                    shortlist = ids  # Exact path of the recommender: every candidate is scored
+                else:
+                    shortlist = index.query(history, args.shortlist)
+                top = shortlist[exact_top(X[shortlist], history, args.neighbors, args.limit)]
+                timings.append((time.perf_counter() - start) * 1000)
+                scored.append(len(shortlist))
+                recalls.append(len(expected & set(top.tolist())) / len(expected))
+
+            timings.sort()
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            print(f"{size:>8} {backend:>9} {build:>8.2f} {update:>10.3f} {statistics.median(timings):>7.1f} "
+                  f"{p95:>7.1f} {int(statistics.mean(scored)):>7} {statistics.mean(recalls):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,9 @@
 -- Base de données: football
 -- Plateforme: Mazelet Blasa - Football Match Organizer
 
+-- Index trigrammes de la recherche de matchs (ILIKE)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- ============================================
 -- Table: users
 -- Description: Stocke les informations des utilisateurs
@@ -65,11 +68,13 @@ CREATE TABLE IF NOT EXISTS matches (
     date VARCHAR(50),
     start_time VARCHAR(50),
     end_time VARCHAR(50),
+    starts_at TIMESTAMP NOT NULL,
     nb_players INTEGER,
     price_per_player DECIMAL(10, 2),
     organizer_phone VARCHAR(50),
     min_age INTEGER DEFAULT 0,
     max_age INTEGER DEFAULT 100,
+    participant_count INTEGER NOT NULL DEFAULT 0,
     organizer_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
     is_team_match BOOLEAN DEFAULT FALSE,
     team_a_id INTEGER REFERENCES teams(id) ON DELETE SET NULL,
@@ -82,6 +87,21 @@ CREATE TABLE IF NOT EXISTS matches (
 CREATE INDEX IF NOT EXISTS idx_matches_id ON matches(id);
 CREATE INDEX IF NOT EXISTS idx_matches_title ON matches(title);
 CREATE INDEX IF NOT EXISTS idx_matches_organizer_id ON matches(organizer_id);
+-- Pagination par curseur (ORDER BY starts_at, id)
+CREATE INDEX IF NOT EXISTS idx_matches_starts_at_id ON matches(starts_at, id);
+-- Matchs à venir (hors matchs d'équipe complets)
+CREATE INDEX IF NOT EXISTS idx_matches_starts_at_team ON matches(starts_at, is_team_match, team_b_id);
+-- Filtre d'âge (min_age <= age <= max_age)
+CREATE INDEX IF NOT EXISTS idx_matches_age_range ON matches(min_age, max_age);
+-- Matchs à venir avec des places libres (has_spots=true)
+CREATE INDEX IF NOT EXISTS idx_matches_open_starts_at ON matches(starts_at) WHERE participant_count < nb_players;
+-- Recherche: préfixe de ville insensible à la casse (lower(city) LIKE 'tun%')
+CREATE INDEX IF NOT EXISTS idx_matches_city_lower ON matches(lower(city) text_pattern_ops);
+-- Recherche: filtre et tri par prix (même expression que Match.price)
+CREATE INDEX IF NOT EXISTS idx_matches_price_id ON matches(coalesce(price_per_player, 0), id);
+-- Recherche plein texte (ILIKE) sur le titre et la description
+CREATE INDEX IF NOT EXISTS idx_matches_title_trgm ON matches USING gin (title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_matches_description_trgm ON matches USING gin (description gin_trgm_ops);
 
 -- ============================================
 -- Table: match_participants
@@ -98,6 +118,18 @@ CREATE TABLE IF NOT EXISTS match_participants (
 CREATE INDEX IF NOT EXISTS idx_match_participants_user_id ON match_participants(user_id);
 CREATE INDEX IF NOT EXISTS idx_match_participants_match_id ON match_participants(match_id);
 
+-- ============================================
+-- Table: sent_reminders
+-- Description: Rappels de match déjà envoyés (évite les doublons au redémarrage)
+-- ============================================
+CREATE TABLE IF NOT EXISTS sent_reminders (
+    match_id INTEGER NOT NULL REFERENCES matches(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    kind VARCHAR(50) NOT NULL,
+    sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (match_id, user_id, kind)
+);
+
 -- ============================================
 -- Table: feedbacks
 -- Description: Stocke les feedbacks des utilisateurs
@@ -0,0 +1,269 @@
+"""
+Offline evaluation of the match recommenders: replays match_participants
+with a time split (train on the joins of matches before T, predict the
+joins of matches from T on) and reports precision@k, recall@k, catalogue
+coverage, per-request latency and peak memory.
+
+    python eval_recommenders.py                                   # synthetic catalogues of 1k/10k/100k matches
+    python eval_recommenders.py --sizes 1000,10000 --users 100 --k 5 --json eval.json
+    python eval_recommenders.py --database-url postgresql://... --split 2025-06-01
+
+Recommenders compared: MatchRecommender with content KNN only
+(cf_weight=0), MatchRecommender as configured (content + collaborative
+blend), and the knn.py variant (NearestNeighbors over every match).
+
+match_participants has no join timestamp, so a match's kickoff stands for
+the time of its joins, except for a random --prejoined share of every
+upcoming roster that is treated as joined before T (matches fill up before
+kickoff; without it the collaborative signal on upcoming matches would be
+empty by construction). Held-out joins are deleted inside a transaction
+that is always rolled back; still, replay a copy of the database.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+os.environ["FEATURE_PIPELINE_PATH"] = ""  # Never overwrite the app's fitted pipeline
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # Synthetic runs use their own engine
+
+from collections import Counter
+
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.collaborative import ParticipationGraph
+from app.database import make_engine
+from app.ml_service import MatchFeatureStore, MatchRecommender, RECOMMENDER_CF_WEIGHT
+from generate_data import populate
+
+KNN_PATH = Path(__file__).resolve().parent.parent / "knn.py"
+
+
+def load_knn_variant():
+    """knn.py lives next to the apis/ folder but imports app modules relatively"""
+    spec = importlib.util.spec_from_file_location("app.knn", KNN_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["app.knn"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# ----- data -----
+
+def hold_out(db, split, prejoined, rng):
+    """
+    Remove the joins of matches starting at or after `split`, except a
+    `prejoined` share of them (not committed). Returns the removed joins as
+    {user_id: {match_id, ...}}, individual matches only.
+    """
+    participants = models.match_participants
+    future = select(models.Match.id).where(models.Match.starts_at >= split)
+    joins = db.execute(
+        select(participants.c.user_id, participants.c.match_id, models.Match.is_team_match)
+        .join(models.Match, models.Match.id == participants.c.match_id)
+        .where(models.Match.starts_at >= split)
+        .order_by(participants.c.match_id, participants.c.user_id)
+    ).all()
+
+    truth, kept = {}, []
+    for row in joins:
+        if row.is_team_match or rng.random() < prejoined:
+            kept.append({"user_id": row.user_id, "match_id": row.match_id})
+        else:
+            truth.setdefault(row.user_id, set()).add(row.match_id)
+
+    db.execute(delete(participants).where(participants.c.match_id.in_(future)))
+    db.execute(
+        update(models.Match).where(models.Match.starts_at >= split)
+        .values(participant_count=0)
+        .execution_options(synchronize_session=False)
+    )
+    if kept:
+        db.execute(insert(participants), kept)
+        db.connection().execute(
+            update(models.Match.__table__)
+            .where(models.Match.__table__.c.id == bindparam("match_id"))
+            .values(participant_count=bindparam("count")),
+            [{"match_id": m, "count": n} for m, n in Counter(row["match_id"] for row in kept).items()]
+        )
+    return truth
+
+
+def default_split(db, quantile=0.8):
+    """Kickoff before which `quantile` of the joins happened"""
+    starts = sorted(
+        row.starts_at for row in db.execute(
+            select(models.Match.starts_at)
+            .join(models.match_participants, models.match_participants.c.match_id == models.Match.id)
+            .where(models.Match.starts_at.isnot(None))
+        )
+    )
+    if not starts:
+        raise SystemExit("No joined match with a kickoff time to replay")
+    return starts[min(len(starts) - 1, int(len(starts) * quantile))]
+
+
+# ----- recommenders -----
+
+def recommender_factories(args, split, knn_variant):
+    """name -> setup(db) returning (recommend(user_id) -> match ids, catalogue size)"""
+    def match_recommender(cf_weight):
+        def setup(db):
+            store = MatchFeatureStore(as_of=split)
+            store.load(db)
+            graph = ParticipationGraph()
+            if cf_weight:
+                graph.load(db)
+            recommender = MatchRecommender(args.neighbors, store=store, graph=graph, cf_weight=cf_weight)
+            return (
+                lambda user_id: [r["match"].id for r in recommender.recommend_matches(user_id, db, args.k)],
+                len(store),
+            )
+        return setup
+
+    def knn_py(db):
+        store = MatchFeatureStore(as_of=split)
+        store.load(db)  # Fits the shared pipeline, as the app does before knn.py runs
+        return lambda user_id: knn_variant.recommend_matches(db, user_id, args.k), len(store)
+
+    factories = {"content": match_recommender(0)}
+    if RECOMMENDER_CF_WEIGHT:
+        factories[f"blend cf={RECOMMENDER_CF_WEIGHT:g}"] = match_recommender(RECOMMENDER_CF_WEIGHT)
+    factories["knn.py"] = knn_py
+    return factories
+
+
+def evaluate(db, name, setup, truth, users, args):
+    start = time.perf_counter()
+    recommend, catalogue = setup(db)
+    build = time.perf_counter() - start
+
+    latencies, precisions, recalls, recommended = [], [], [], set()
+    deadline = time.perf_counter() + args.time_budget
+    for user_id in users:
+        start = time.perf_counter()
+        top = recommend(user_id)[:args.k]
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits = len(truth[user_id] & set(top))
+        precisions.append(hits / args.k)
+        recalls.append(hits / len(truth[user_id]))
+        recommended.update(top)
+        if time.perf_counter() > deadline:
+            break
+
+    # Separate pass: tracemalloc slows allocations down and would skew latencies
+    tracemalloc.start()
+    recommend, _ = setup(db)
+    for user_id in users[:args.memory_users]:
+        recommend(user_id)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    latencies.sort()
+
+    def percentile(q):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * q))]
+
+    return {
+        "recommender": name,
+        "users": len(latencies),
+        "catalogue": catalogue,
+        "build_s": round(build, 3),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(percentile(0.95), 2),
+        "p99_ms": round(percentile(0.99), 2),
+        "peak_mb": round(peak / 2 ** 20, 1),
+        "precision_at_k": round(statistics.mean(precisions), 4),
+        "recall_at_k": round(statistics.mean(recalls), 4),
+        "coverage": round(len(recommended) / catalogue, 4) if catalogue else 0.0,
+    }
+
+
+def run(db, dataset, split, args, knn_variant, rng):
+    truth = hold_out(db, split, args.prejoined, rng)
+    users = sorted(truth)
+    rng.shuffle(users)
+    users = users[:args.users]
+    if not users:
+        print(f"{dataset}: no join after {split}, nothing to predict")
+        return []
+
+    results = []
+    for name, setup in recommender_factories(args, split, knn_variant).items():
+        result = {"dataset": dataset, "split": split.isoformat(), "k": args.k,
+                  **evaluate(db, name, setup, truth, users, args)}
+        results.append(result)
+        print(f"{dataset:>10} {name:>14} {result['users']:>6} {result['catalogue']:>8} {result['build_s']:>8.2f} "
+              f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['peak_mb']:>8.1f} "
+              f"{result['precision_at_k']:>7.3f} {result['recall_at_k']:>7.3f} {result['coverage']:>6.3f}")
+    db.rollback()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database-url", help="replay this database instead of synthetic catalogues")
+    parser.add_argument("--split", type=datetime.fromisoformat, help="T (default: 80%% of the joins before it)")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="synthetic catalogue sizes")
+    parser.add_argument("--users", type=int, default=200, help="users sampled per dataset")
+    parser.add_argument("--prejoined", type=float, default=0.3,
+                        help="share of every upcoming roster already joined at T")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--neighbors", type=int, default=5)
+    parser.add_argument("--time-budget", type=float, default=60, help="seconds of requests per recommender")
+    parser.add_argument("--memory-users", type=int, default=5, help="requests traced for peak memory")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    knn_variant = load_knn_variant()
+    rng = random.Random(args.seed)
+    print(f"{'dataset':>10} {'recommender':>14} {'users':>6} {'catalog':>8} {'build s':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'peak MB':>8} {'prec@k':>7} {'rec@k':>7} {'cover':>6}")
+
+    results = []
+    if args.database_url:
+        db = sessionmaker(bind=make_engine(args.database_url))()
+        try:
+            split = args.split or default_split(db)
+            results += run(db, "replay", split, args, knn_variant, rng)
+        finally:
+            db.rollback()
+            db.close()
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            for size in [int(s) for s in args.sizes.split(",")]:
+                engine = make_engine(f"sqlite:///{tmp}/eval-{size}.db")
+                models.Base.metadata.create_all(bind=engine)
+                db = sessionmaker(bind=engine)()
+                try:
+                    # Users with a home city, favourite format / hour and friend groups
+                    populate(db, max(100, size // 10), size, rng=np.random.default_rng(args.seed))
+                    results += run(db, f"synth-{size}", args.split or models.day_start(), args, knn_variant, rng)
+                finally:
+                    db.close()
+                    engine.dispose()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,7 @@
-from sqlalchemy import create_engine, text
-from app.database import SQLALCHEMY_DATABASE_URL
+from sqlalchemy import text
+from app.database import engine
 
 def fix_schema():
-    engine = create_engine(SQLALCHEMY_DATABASE_URL)
     with engine.connect() as conn:
         print("🔧 Checking and fixing schema...")
         
@@ -0,0 +1,235 @@
+"""
+Fills a database with reproducible synthetic data: users, teams and their
+members, individual and team matches spread around today, and the
+participations that link them.
+
+    python generate_data.py                                   # uses DATABASE_URL
+    python generate_data.py --database-url sqlite:///load.db --users 5000 --matches 20000 --teams 300
+    python generate_data.py --reset                           # drop the previously generated rows first
+
+Users are load-<i>@example.com with the password given by --password
+(what load_test.py logs in with). They get a home city, a favourite format
+and kickoff hour, and play in friend groups (the first --teams groups are
+registered teams), so the recommenders have real signal to work with.
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import timedelta
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+DEFAULT_DATABASE_URL = os.getenv("DATABASE_URL")
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # app.database needs one, this script uses its own engine
+
+from sqlalchemy import delete, insert, select, or_
+from sqlalchemy.orm import sessionmaker
+
+from app import models, auth
+from app.database import make_engine
+
+GAZETTEER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app", "data", "gazetteer.json")
+TYPES = ["5v5", "7v7", "9v9", "11v11"]
+PASSWORD = "password123"
+EMAIL_PREFIX = "load"
+
+
+def user_email(i, prefix=EMAIL_PREFIX):
+    return f"{prefix}-{i}@example.com"
+
+
+def populate(db, n_users, n_matches, n_teams=0, rng=None, team_size=8, team_match_share=0.15,
+             days_back=60, days_ahead=30, password_hash="x", prefix=EMAIL_PREFIX):
+    """
+    Insert the synthetic rows through `db` and commit.
+    Returns the number of rows inserted per table.
+    """
+    rng = rng if rng is not None else np.random.default_rng(0)
+    with open(GAZETTEER) as f:
+        stadiums = json.load(f)["stadiums"]
+    cities = list(stadiums)
+
+    # Friend groups share a city; the first n_teams groups are teams
+    n_groups = (n_users + team_size - 1) // team_size
+    n_teams = min(n_teams, n_groups)
+    group_city = rng.integers(0, len(cities), n_groups)
+    user_city = group_city[np.arange(n_users) // team_size]
+    user_type = rng.integers(0, len(TYPES), n_users)
+    user_hour = rng.integers(8, 23, n_users)
+    by_city = [np.flatnonzero(user_city == c) for c in range(len(cities))]
+
+    user_ids = db.execute(
+        insert(models.User).returning(models.User.id, sort_by_parameter_order=True),
+        [
+            {
+                "email": user_email(i, prefix), "hashed_password": password_hash,
+                "full_name": f"Player {i}", "phone": f"+216 {20000000 + i}",
+                "age": int(rng.integers(16, 45)),
+            }
+            for i in range(n_users)
+        ]
+    ).scalars().all()
+
+    team_ids = db.execute(
+        insert(models.Team).returning(models.Team.id, sort_by_parameter_order=True),
+        [{"name": f"Team {t}", "captain_id": user_ids[t * team_size]} for t in range(n_teams)]
+    ).scalars().all() if n_teams else []
+    team_members = []  # (user index or None) per team
+    for t in range(n_teams):
+        members = list(range(t * team_size, min((t + 1) * team_size, n_users)))
+        team_members.append(members + [None] * int(rng.random() < 0.3))  # Friends without an account
+    if team_members:
+        db.execute(insert(models.TeamMember), [
+            {
+                "team_id": team_ids[t],
+                "user_id": user_ids[u] if u is not None else None,
+                "name": f"Player {u}" if u is not None else f"Guest of team {t}",
+            }
+            for t, members in enumerate(team_members) for u in members
+        ])
+    teams_by_city = [[t for t in range(n_teams) if group_city[t] == c] for c in range(len(cities))]
+
+    today = models.day_start()
+    matches, rosters = [], []
+    for i in range(n_matches):
+        day = int(rng.integers(-days_back, days_ahead))
+        hour = int(rng.integers(8, 23))
+        starts_at = today + timedelta(days=day, hours=hour)
+        type_match = int(rng.integers(0, len(TYPES)))
+        team_a = team_b = None
+
+        if n_teams and rng.random() < team_match_share:
+            team_a = int(rng.integers(0, n_teams))
+            city = int(group_city[team_a])
+            rivals = [t for t in teams_by_city[city] if t != team_a]
+            # Past matches were played, upcoming ones may still wait for Team B
+            if rivals and rng.random() < (0.9 if day < 0 else 0.5):
+                team_b = int(rng.choice(rivals))
+            players = [u for t in (team_a, team_b) if t is not None for u in team_members[t] if u is not None]
+            nb_players = 2 * team_size
+            organizer = team_a * team_size
+        else:
+            city = int(rng.integers(0, len(cities)))
+            nb_players = int(rng.choice([10, 14, 18, 22]))
+            local = by_city[city]
+            chosen = set()
+            if len(local) and rng.random() < 0.6:
+                # A friend group plays together
+                group = local[local // team_size == rng.choice(local) // team_size]
+                chosen.update(group[rng.random(len(group)) < 0.7].tolist())
+            if len(local):
+                weights = 1 + 3 * (user_type[local] == type_match) + 2 * (np.abs(user_hour[local] - hour) <= 1)
+                wanted = min(len(local), max(0, int(nb_players * rng.uniform(0.3, 1.0)) - len(chosen)))
+                chosen.update(rng.choice(local, wanted, replace=False, p=weights / weights.sum()).tolist())
+            players = sorted(chosen)[:nb_players]
+            organizer = players[0] if players else int(rng.integers(0, n_users))
+
+        matches.append({
+            "title": f"{TYPES[type_match]} at {cities[city]} #{i}",
+            "description": "Generated match",
+            "type_match": TYPES[type_match],
+            "city": cities[city],
+            "stadium": str(rng.choice(list(stadiums[cities[city]]))),
+            "date": starts_at.strftime("%Y-%m-%d"),
+            "start_time": starts_at.strftime("%H:%M"),
+            "end_time": (starts_at + timedelta(hours=1)).strftime("%H:%M"),
+            "starts_at": starts_at,
+            "nb_players": nb_players,
+            "price_per_player": float(rng.choice([3, 5, 7.5, 10])),
+            "organizer_phone": "+216 20000000",
+            "min_age": 0,
+            "max_age": 100,
+            "participant_count": len(players),
+            "organizer_id": user_ids[organizer],
+            "is_team_match": team_a is not None,
+            "team_a_id": team_ids[team_a] if team_a is not None else None,
+            "team_b_id": team_ids[team_b] if team_b is not None else None,
+        })
+        rosters.append(players)
+
+    match_ids = db.execute(
+        insert(models.Match).returning(models.Match.id, sort_by_parameter_order=True), matches
+    ).scalars().all() if matches else []
+    participations = [
+        {"user_id": user_ids[u], "match_id": match_id}
+        for match_id, players in zip(match_ids, rosters) for u in players
+    ]
+    if participations:
+        db.execute(insert(models.match_participants), participations)
+    db.commit()
+    return {
+        "users": len(user_ids),
+        "teams": len(team_ids),
+        "team_members": sum(len(m) for m in team_members),
+        "matches": len(match_ids),
+        "participations": len(participations),
+    }
+
+
+def reset(db, prefix=EMAIL_PREFIX):
+    """Delete the rows of a previous run (its users and everything attached to them)"""
+    users = select(models.User.id).where(models.User.email.like(f"{prefix}-%@example.com"))
+    matches = select(models.Match.id).where(models.Match.organizer_id.in_(users))
+    teams = select(models.Team.id).where(models.Team.captain_id.in_(users))
+    db.execute(delete(models.match_participants).where(or_(
+        models.match_participants.c.user_id.in_(users),
+        models.match_participants.c.match_id.in_(matches),
+    )))
+    db.execute(delete(models.SentReminder).where(or_(
+        models.SentReminder.user_id.in_(users), models.SentReminder.match_id.in_(matches)
+    )))
+    db.execute(delete(models.Feedback).where(models.Feedback.user_id.in_(users)))
+    db.execute(delete(models.Match).where(models.Match.id.in_(matches)))
+    db.execute(delete(models.TeamMember).where(or_(
+        models.TeamMember.team_id.in_(teams), models.TeamMember.user_id.in_(users)
+    )))
+    db.execute(delete(models.Team).where(models.Team.id.in_(teams)))
+    db.execute(delete(models.User).where(models.User.id.in_(users)))
+    db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--matches", type=int, default=5000)
+    parser.add_argument("--teams", type=int, default=50)
+    parser.add_argument("--team-size", type=int, default=8)
+    parser.add_argument("--team-match-share", type=float, default=0.15)
+    parser.add_argument("--days-back", type=int, default=60)
+    parser.add_argument("--days-ahead", type=int, default=30)
+    parser.add_argument("--password", default=PASSWORD)
+    parser.add_argument("--prefix", default=EMAIL_PREFIX, help="emails are <prefix>-<i>@example.com")
+    parser.add_argument("--reset", action="store_true", help="delete the rows of a previous run first")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("--database-url is required when DATABASE_URL is not set")
+
+    engine = make_engine(args.database_url)
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        if args.reset:
+            reset(db, args.prefix)
+        start = time.perf_counter()
+        counts = populate(
+            db, args.users, args.matches, args.teams, np.random.default_rng(args.seed),
+            team_size=args.team_size, team_match_share=args.team_match_share,
+            days_back=args.days_back, days_ahead=args.days_ahead,
+            password_hash=auth.get_password_hash(args.password),  # One bcrypt hash shared by every user
+            prefix=args.prefix,
+        )
+    finally:
+        db.close()
+
+    summary = ", ".join(f"{n} {table}" for table, n in counts.items())
+    print(f"✅ Generated {summary} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
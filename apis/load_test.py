@@ -0,0 +1,295 @@
+"""
+Load test of the API: virtual users log in, then drive a realistic mix of
+match listings, joins, recommendations and logins, in-process through an
+ASGI client (default) or against a running server (--base-url).
+
+    python generate_data.py --database-url sqlite:///load.db
+    python load_test.py --database-url sqlite:///load.db --concurrency 20 --duration 30
+    python load_test.py --base-url http://localhost:8000 --output results.json --compare baseline.json
+
+Reports the throughput and p50/p95/p99 latency of every route and can
+store them as JSON, with the commit and the settings of the run, so runs
+are comparable across commits. The log records the app emitted during the
+run (scraped from /metrics, with METRICS_TOKEN against a running server)
+are reported too, so the cost of a log level can be measured:
+
+    LOG_LEVEL=WARNING python load_test.py ... --output quiet.json
+    LOG_LEVEL=DEBUG python load_test.py ... --compare quiet.json
+
+Joins change the data: only point it at
+generated data (see generate_data.py for the users it logs in as).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import secrets
+import statistics
+import subprocess
+import time
+from datetime import datetime
+
+import httpx
+
+# Accounts created by generate_data.py (kept in sync with its defaults)
+PASSWORD = "password123"
+EMAIL_PREFIX = "load"
+
+# Relative weight of every scenario in the request mix
+DEFAULT_MIX = "list_matches=45,recommendations=30,join_match=15,login=10"
+
+
+def user_email(i, prefix=EMAIL_PREFIX):
+    return f"{prefix}-{i}@example.com"
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}  # route -> [(status, ms)]
+
+    def add(self, route, status, ms):
+        self.samples.setdefault(route, []).append((status, ms))
+
+    def summary(self, elapsed):
+        routes = {}
+        for route, samples in sorted(self.samples.items()):
+            latencies = sorted(ms for _, ms in samples)
+            statuses = {}
+            for status, _ in samples:
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+            def percentile(q):
+                return latencies[min(len(latencies) - 1, int(len(latencies) * q))]
+
+            routes[route] = {
+                "requests": len(samples),
+                "throughput_rps": round(len(samples) / elapsed, 2),
+                "mean_ms": round(statistics.mean(latencies), 2),
+                "p50_ms": round(percentile(0.50), 2),
+                "p95_ms": round(percentile(0.95), 2),
+                "p99_ms": round(percentile(0.99), 2),
+                "statuses": statuses,
+                "errors": sum(n for status, n in statuses.items() if status == "error" or status.startswith("5")),
+            }
+        return routes
+
+
+class VirtualUser:
+    def __init__(self, client, email, password, match_ids, recorder):
+        self.client = client
+        self.email = email
+        self.password = password
+        self.match_ids = match_ids
+        self.recorder = recorder
+        self.headers = {}
+
+    async def timed(self, route, method, url, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError:
+            response, status = None, "error"
+        self.recorder.add(route, status, (time.perf_counter() - start) * 1000)
+        return response
+
+    async def login(self):
+        response = await self.timed(
+            "POST /auth/login", "POST", "/auth/login",
+            data={"username": self.email, "password": self.password}
+        )
+        if response is not None and response.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        return response
+
+    async def list_matches(self):
+        await self.timed(
+            "GET /matches/", "GET", "/matches/",
+            params={"upcoming_only": "true", "has_spots": "true", "limit": 20}, headers=self.headers
+        )
+
+    async def recommendations(self):
+        await self.timed("GET /recommendations/", "GET", "/recommendations/",
+                         params={"limit": 5}, headers=self.headers)
+
+    async def join_match(self):
+        # 400 (already joined / full) is part of the normal mix
+        match_id = random.choice(self.match_ids)
+        await self.timed("POST /matches/{id}/join", "POST", f"/matches/{match_id}/join", headers=self.headers)
+
+
+async def open_match_ids(client, headers, limit=1000):
+    response = await client.get(
+        "/matches/",
+        params={"fields": "id,is_team_match", "upcoming_only": "true", "has_spots": "true", "limit": limit},
+        headers=headers
+    )
+    response.raise_for_status()
+    return [m["id"] for m in response.json() if not m["is_team_match"]]
+
+
+async def run(client, args):
+    mix = {name: float(weight) for name, weight in (item.split("=") for item in args.mix.split(","))}
+    unknown = set(mix) - {"list_matches", "recommendations", "join_match", "login"}
+    if unknown:
+        raise SystemExit(f"Unknown scenarios in --mix: {', '.join(sorted(unknown))}")
+
+    setup = Recorder()  # Initial logins are not part of the measured mix
+    users = [
+        VirtualUser(client, user_email(i, args.prefix), args.password, [], setup)
+        for i in range(args.concurrency)
+    ]
+    # Logged in a few at a time: the bcrypt pool answers 503 to large bursts
+    slots = asyncio.Semaphore(4)
+
+    async def login(user):
+        async with slots:
+            response = await user.login()
+        if response is None or response.status_code != 200:
+            raise SystemExit(f"Login failed for {user.email}, generate the data with generate_data.py first")
+
+    await asyncio.gather(*(login(user) for user in users))
+    match_ids = await open_match_ids(client, users[0].headers)
+    if not match_ids and mix.get("join_match"):
+        raise SystemExit("No upcoming individual match with free seats to join")
+
+    recorder = Recorder()
+    scenarios, weights = list(mix), list(mix.values())
+    deadline = time.perf_counter() + args.duration
+    budget = [args.requests or float("inf")]
+
+    async def worker(user):
+        user.recorder, user.match_ids = recorder, match_ids
+        while time.perf_counter() < deadline and budget[0] > 0:
+            budget[0] -= 1
+            await getattr(user, random.choices(scenarios, weights)[0])()
+
+    logged = await log_records(client)
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(user) for user in users))
+    elapsed = time.perf_counter() - start
+    routes = recorder.summary(elapsed)
+    return routes, elapsed, log_summary(logged, await log_records(client), routes)
+
+
+async def log_records(client):
+    """Log records emitted by the app so far, by level (empty when it does not export them)"""
+    try:
+        token = os.getenv("METRICS_TOKEN", "")
+        response = await client.get("/metrics", headers={"Authorization": f"Bearer {token}"})
+    except httpx.HTTPError:
+        return {}
+    if response.status_code != 200:
+        return {}
+    return {
+        level: float(value)
+        for level, value in re.findall(r'^log_records_total\{level="(\w+)"\} (\S+)$', response.text, re.M)
+    }
+
+
+def log_summary(before, after, routes):
+    requests = sum(r["requests"] for r in routes.values()) or 1
+    by_level = {level: int(after[level] - before.get(level, 0)) for level in sorted(after)}
+    by_level = {level: n for level, n in by_level.items() if n}
+    total = sum(by_level.values())
+    return {"records": total, "per_request": round(total / requests, 3), "by_level": by_level}
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(routes, elapsed, logs, baseline=None, baseline_logs=None):
+    total = sum(r["requests"] for r in routes.values())
+    print(f"{total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s)")
+    print(f"{'route':<26} {'requests':>8} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}  statuses")
+    for route, r in routes.items():
+        print(f"{route:<26} {r['requests']:>8} {r['throughput_rps']:>8.1f} {r['p50_ms']:>8.1f} "
+              f"{r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['errors']:>6}  {r['statuses']}")
+        previous = (baseline or {}).get(route)
+        if previous:
+            print(f"{'  vs baseline':<26} {'':>8} {r['throughput_rps'] - previous['throughput_rps']:>+8.1f} "
+                  f"{r['p50_ms'] - previous['p50_ms']:>+8.1f} {r['p95_ms'] - previous['p95_ms']:>+8.1f} "
+                  f"{r['p99_ms'] - previous['p99_ms']:>+8.1f}")
+    print(f"log records: {logs['records']} ({logs['per_request']} per request) {logs['by_level']}")
+    if baseline_logs:
+        print(f"  vs baseline: {logs['records'] - baseline_logs['records']:+d} "
+              f"({logs['per_request'] - baseline_logs['per_request']:+.3f} per request)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--base-url", help="running server to test (default: the app in-process)")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"), help="in-process runs only")
+    parser.add_argument("--concurrency", type=int, default=20, help="virtual users (one account each)")
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--requests", type=int, default=0, help="stop after this many requests (0: no limit)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario=weight,...")
+    parser.add_argument("--prefix", default=EMAIL_PREFIX, help="account emails, as in generate_data.py")
+    parser.add_argument("--password", default=PASSWORD)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="results JSON of a previous run to diff against")
+    args = parser.parse_args()
+    if not args.base_url and not args.database_url:
+        parser.error("--database-url is required when DATABASE_URL is not set")
+    random.seed(args.seed)
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60)
+    else:
+        # The app's engines read them at import
+        os.environ["DATABASE_URL"] = args.database_url
+        os.environ.setdefault("DB_POOL_SIZE", str(args.concurrency))
+        # Serves /metrics in-process, for the log record counts
+        os.environ.setdefault("METRICS_TOKEN", secrets.token_hex(16))
+        from app.main import app
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://loadtest", limits=limits, timeout=60
+        )
+
+    async def go():
+        async with client:
+            return await run(client, args)
+
+    routes, elapsed, logs = asyncio.run(go())
+    if not args.base_url:
+        from app.logging_config import stop_logging
+        stop_logging()  # The app's last records before the report
+
+    baseline = baseline_logs = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        baseline, baseline_logs = previous["routes"], previous.get("logs")
+    print_report(routes, elapsed, logs, baseline, baseline_logs)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "commit": current_commit(),
+                "started_at": datetime.now().isoformat(timespec="seconds"),
+                "target": args.base_url or "in-process",
+                "settings": {
+                    "concurrency": args.concurrency, "duration": args.duration,
+                    "requests": args.requests, "mix": args.mix, "seed": args.seed,
+                    "log_level": os.getenv("LOG_LEVEL", "INFO") if not args.base_url else None,
+                },
+                "elapsed_s": round(elapsed, 2),
+                "routes": routes,
+                "logs": logs,
+            }, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
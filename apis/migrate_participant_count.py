@@ -0,0 +1,44 @@
+from sqlalchemy import text
+from app.database import engine
+from app import models
+
+def migrate_participant_count():
+    """
+    Adds the denormalized matches.participant_count column and backfills it
+    from match_participants.
+    """
+    with engine.connect() as conn:
+        print("🔧 Adding 'participant_count' column...")
+        try:
+            conn.execute(text("ALTER TABLE matches ADD COLUMN participant_count INTEGER NOT NULL DEFAULT 0"))
+            conn.commit()
+            print("✅ Added 'participant_count' column.")
+        except Exception as e:
+            conn.rollback()
+            if "already exists" in str(e) or "duplicate column" in str(e):
+                print("ℹ️ 'participant_count' already exists.")
+            else:
+                print(f"❌ Error adding 'participant_count': {e}")
+                raise
+
+        # Safe to re-run: always recomputed from the source of truth
+        result = conn.execute(text("""
+            UPDATE matches SET participant_count = (
+                SELECT COUNT(*) FROM match_participants
+                WHERE match_participants.match_id = matches.id
+            )
+        """))
+        conn.commit()
+        print(f"✅ Backfilled 'participant_count' for {result.rowcount} matches.")
+
+        # Partial index behind has_spots=true
+        for index in models.Match.__table__.indexes:
+            if index.name == "idx_matches_open_starts_at":
+                index.create(bind=conn, checkfirst=True)
+                print(f"✅ Index '{index.name}' ready.")
+        conn.commit()
+
+    print("🏁 participant_count migration completed.")
+
+if __name__ == "__main__":
+    migrate_participant_count()
@@ -0,0 +1,51 @@
+from sqlalchemy import text
+from app.database import engine
+from app import models
+
+# Indexes behind /matches/search
+SEARCH_INDEXES = [
+    "idx_matches_city_lower",
+    "idx_matches_price_id",
+    "idx_matches_title_trgm",
+    "idx_matches_description_trgm",
+]
+
+def migrate_search_indexes():
+    """
+    Creates the indexes of the match search (safe to re-run). The trigram
+    indexes of the free-text filter need pg_trgm and are PostgreSQL only.
+    """
+    with engine.connect() as conn:
+        postgresql = conn.dialect.name == "postgresql"
+        if postgresql:
+            print("🔧 Enabling the 'pg_trgm' extension...")
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            conn.commit()
+
+        # Exact-city index of the first version, replaced by idx_matches_city_lower
+        conn.execute(text("DROP INDEX IF EXISTS idx_matches_city_starts_at"))
+        conn.commit()
+
+        for index in models.Match.__table__.indexes:
+            if index.name not in SEARCH_INDEXES:
+                continue
+            if index.name.endswith("_trgm") and not postgresql:
+                print(f"ℹ️ Index '{index.name}' skipped (PostgreSQL only).")
+                continue
+            try:
+                index.create(bind=conn)
+                conn.commit()
+                print(f"✅ Index '{index.name}' created.")
+            except Exception as e:
+                # checkfirst cannot see expression indexes on every backend
+                conn.rollback()
+                if "already exists" in str(e):
+                    print(f"ℹ️ Index '{index.name}' already exists.")
+                else:
+                    print(f"❌ Error creating '{index.name}': {e}")
+                    raise
+
+    print("🏁 Search indexes migration completed.")
+
+if __name__ == "__main__":
+    migrate_search_indexes()
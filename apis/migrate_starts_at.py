@@ -0,0 +1,96 @@
+from datetime import datetime
+
+from sqlalchemy import text, bindparam
+from app.database import engine, SessionLocal
+from app import models
+
+BATCH_SIZE = 1000
+# Kickoff given to legacy rows whose date cannot be parsed: they sort as long
+# past matches (hidden from upcoming listings) instead of staying NULL
+UNPARSEABLE_STARTS_AT = datetime(1970, 1, 1)
+# The indexes this migration owns; later ones (participant_count, search) have their own scripts
+INDEXES = ("idx_matches_starts_at_id", "idx_matches_starts_at_team", "idx_matches_age_range")
+
+def parse_or_fallback(row, unparseable):
+    starts_at = models.parse_starts_at(row.date, row.start_time)
+    if starts_at is None:
+        unparseable.append(row.id)
+        return UNPARSEABLE_STARTS_AT
+    return starts_at
+
+def migrate_starts_at():
+    """
+    Adds the derived matches.starts_at timestamp, backfills it from the
+    date/start_time strings and creates the scheduling indexes.
+    """
+    with engine.connect() as conn:
+        print("🔧 Adding 'starts_at' column...")
+        try:
+            conn.execute(text("ALTER TABLE matches ADD COLUMN starts_at TIMESTAMP"))
+            conn.commit()
+            print("✅ Added 'starts_at' column.")
+        except Exception as e:
+            conn.rollback()
+            if "already exists" in str(e) or "duplicate column" in str(e):
+                print("ℹ️ 'starts_at' already exists.")
+            else:
+                print(f"❌ Error adding 'starts_at': {e}")
+                raise
+
+    # Backfill in batches, parsing in Python
+    db = SessionLocal()
+    try:
+        last_id = 0
+        total = 0
+        unparseable = []
+        while True:
+            rows = db.query(
+                models.Match.id, models.Match.date, models.Match.start_time
+            ).filter(
+                models.Match.id > last_id,
+                models.Match.starts_at == None
+            ).order_by(models.Match.id).limit(BATCH_SIZE).all()
+            if not rows:
+                break
+            matches = models.Match.__table__
+            db.execute(
+                matches.update()
+                .where(matches.c.id == bindparam("match_id"))
+                .values(starts_at=bindparam("new_starts_at")),
+                [
+                    {"match_id": r.id, "new_starts_at": parse_or_fallback(r, unparseable)}
+                    for r in rows
+                ]
+            )
+            db.commit()
+            last_id = rows[-1].id
+            total += len(rows)
+        print(f"✅ Backfilled 'starts_at' for {total} matches.")
+        if unparseable:
+            print(f"⚠️ {len(unparseable)} matches have an unparseable date, set to {UNPARSEABLE_STARTS_AT}: "
+                  f"ids {unparseable[:50]}{'...' if len(unparseable) > 50 else ''}")
+    finally:
+        db.close()
+
+    # starts_at leads the keyset of every listing: NULL rows would drop out of paging
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            conn.execute(text("ALTER TABLE matches ALTER COLUMN starts_at SET NOT NULL"))
+            conn.commit()
+            print("✅ 'starts_at' is NOT NULL.")
+    else:
+        print("ℹ️ SQLite cannot add NOT NULL to an existing column, every row has a value now.")
+
+    with engine.connect() as conn:
+        conn.execute(text("DROP INDEX IF EXISTS idx_matches_date_start_time_id"))
+        by_name = {index.name: index for index in models.Match.__table__.indexes}
+        for name in INDEXES:
+            index = by_name[name]
+            index.create(bind=conn, checkfirst=True)
+            print(f"✅ Index '{index.name}' ready.")
+        conn.commit()
+
+    print("🏁 starts_at migration completed.")
+
+if __name__ == "__main__":
+    migrate_starts_at()
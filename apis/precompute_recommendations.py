@@ -0,0 +1,43 @@
+"""
+Precompute "matches for you" recommendations for every user in one batch
+(used for the nightly digest), and write them to a JSON file.
+
+    python precompute_recommendations.py --limit 5 --output recommendations.json
+"""
+
+import argparse
+import json
+import time
+
+from app.database import SessionLocal
+from app.ml_service import MatchRecommender
+
+def precompute(limit: int, output: str, n_neighbors: int):
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        recommender = MatchRecommender(n_neighbors=n_neighbors)
+        results = recommender.recommend_batch(db, limit=limit)
+        elapsed = time.perf_counter() - start
+    finally:
+        db.close()
+
+    payload = {
+        str(user_id): [
+            {"match_id": match_id, "similarity_score": score}
+            for match_id, score in recs
+        ]
+        for user_id, recs in results.items()
+    }
+    with open(output, "w") as f:
+        json.dump(payload, f)
+
+    print(f"✅ Recommendations computed for {len(results)} users in {elapsed:.2f}s -> {output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch match recommendations")
+    parser.add_argument("--limit", type=int, default=5, help="Recommendations per user")
+    parser.add_argument("--neighbors", type=int, default=5, help="K used by the KNN scoring")
+    parser.add_argument("--output", default="recommendations.json", help="Output JSON file")
+    args = parser.parse_args()
+    precompute(args.limit, args.output, args.neighbors)
@@ -0,0 +1,96 @@
+"""
+Stress test for match capacity: many users join the same match at once and
+the match must never end up with more participants than nb_players.
+
+    python test_concurrent_join.py                      # uses DATABASE_URL
+    python test_concurrent_join.py --users 60 --nb-players 10
+
+Creates a throwaway organizer, players and match, and deletes them afterwards.
+"""
+
+import argparse
+import os
+import threading
+import uuid
+from collections import Counter
+
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.database import make_engine
+from app.participation import reserve_seat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--nb-players", type=int, default=10)
+    args = parser.parse_args()
+
+    engine = make_engine(args.database_url, pool_size=args.users, max_overflow=0)
+    Session = sessionmaker(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+
+    tag = uuid.uuid4().hex[:8]
+    db = Session()
+    users = [models.User(email=f"stress-{tag}-{i}@example.com", hashed_password="x") for i in range(args.users)]
+    db.add_all(users)
+    db.flush()
+    match = models.Match(
+        title=f"stress {tag}", date="2099-01-01", start_time="18:00", end_time="19:00",
+        city="Tunis", nb_players=args.nb_players, organizer_id=users[0].id
+    )
+    db.add(match)
+    db.commit()
+    match_id, user_ids = match.id, [u.id for u in users]
+    db.close()
+
+    barrier = threading.Barrier(len(user_ids))
+    outcomes = Counter()
+    lock = threading.Lock()
+
+    def join(user_id):
+        session = Session()
+        barrier.wait()
+        try:
+            reserve_seat(session, match_id, user_id)
+            result = "joined"
+        except HTTPException as e:
+            result = e.detail
+        finally:
+            session.close()
+        with lock:
+            outcomes[result] += 1
+
+    threads = [threading.Thread(target=join, args=(uid,)) for uid in user_ids]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    db = Session()
+    try:
+        rows = db.query(func.count()).select_from(models.match_participants).filter(
+            models.match_participants.c.match_id == match_id
+        ).scalar()
+        count = db.query(models.Match.participant_count).filter(models.Match.id == match_id).scalar()
+        print(f"Outcomes: {dict(outcomes)}")
+        print(f"participant_count={count}, match_participants rows={rows}, nb_players={args.nb_players}")
+
+        assert outcomes["joined"] == min(args.nb_players, len(user_ids)), "wrong number of successful joins"
+        assert count == rows, "participant_count drifted from match_participants"
+        assert rows <= args.nb_players, "match overfilled"
+        print("✅ Capacity held under concurrent joins")
+    finally:
+        db.execute(models.match_participants.delete().where(models.match_participants.c.match_id == match_id))
+        db.query(models.Match).filter(models.Match.id == match_id).delete()
+        db.query(models.User).filter(models.User.id.in_(user_ids)).delete(synchronize_session=False)
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
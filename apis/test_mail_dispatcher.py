@@ -0,0 +1,62 @@
+"""
+Checks the background mail dispatcher against a local SMTP stand-in server
+(aiosmtpd), without credentials nor network:
+
+    pip install aiosmtpd
+    python test_mail_dispatcher.py
+"""
+
+import time
+
+from aiosmtpd.controller import Controller
+
+from app.email_utils import build_match_cancellation, open_smtp_connection
+from app.mail_dispatcher import MailDispatcher
+
+NB_EMAILS = 21  # a full 11v11 match minus the organizer
+
+class CollectingHandler:
+    def __init__(self):
+        self.received = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received.append(envelope.rcpt_tos[0])
+        return "250 OK"
+
+def main():
+    handler = CollectingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=8025)
+    controller.start()
+    try:
+        dispatcher = MailDispatcher(
+            workers=2,
+            connect=lambda: open_smtp_connection("127.0.0.1", 8025, use_tls=False, username="", password=""),
+            sender="noreply@example.com",
+            dead_letter_path="",
+        )
+
+        start = time.perf_counter()
+        for i in range(NB_EMAILS):
+            dispatcher.enqueue(build_match_cancellation(
+                to_email=f"player{i}@example.com",
+                player_name=f"Player {i}",
+                match_title="Test Match",
+                date="2025-01-01",
+                time="20:00"
+            ))
+        enqueued = time.perf_counter() - start
+
+        dispatcher.join()
+        dispatcher.stop()
+        stats = dispatcher.stats()
+    finally:
+        controller.stop()
+
+    print(f"📨 Enqueued {NB_EMAILS} emails in {enqueued * 1000:.1f} ms")
+    print(f"📊 {stats}")
+    assert sorted(handler.received) == sorted(f"player{i}@example.com" for i in range(NB_EMAILS))
+    assert stats["connections_opened"] <= 2, "SMTP sessions should be reused"
+    print("✅ All emails delivered over persistent sessions")
+
+if __name__ == "__main__":
+    main()
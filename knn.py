@@ -1,49 +1,31 @@
 import numpy as np
+from types import SimpleNamespace
 from sklearn.neighbors import NearestNeighbors
 from sqlalchemy.orm import Session
-from .models import Match, User
-
-# -----------------------------
-# Helpers for encoding strings
-# -----------------------------
-
-def encode_type(type_match: str):
-    mapping = {"5v5": 0, "7v7": 1, "9v9": 2, "11v11": 3}
-    return mapping.get(type_match, -1)
-
-def encode_city(city: str):
-    unique_cities = {
-        "Tunis": 0, "Sfax": 1, "Sousse": 2, "Monastir": 3,
-        "Gabes": 4, "Bizerte": 5, "Nabeul": 6, "Kairouan": 7
-    }
-    return unique_cities.get(city, -1)
+from .models import Match, User, match_participants
+from .features import feature_pipeline, FEATURE_ATTRIBUTES
 
 # ------------------------------------------------------
-# Convert SQLAlchemy Match object → Vector of features
+# Matches and users → vectors, through the shared fitted
+# feature pipeline (same vectors as ml_service)
 # ------------------------------------------------------
 
 def match_to_vector(match: Match):
-    return np.array([
-        match.min_age,
-        match.max_age,
-        encode_type(match.type_match),
-        encode_city(match.city),
-        match.price_per_player,
-        match.nb_players
-    ], dtype=float)
+    return feature_pipeline.vectors([match]).toarray()[0]
 
-# ------------------------------------------------------
-# Convert user → preference vector
-# (simplest version = only age, city, type)
-# ------------------------------------------------------
+def _centroid(raw, sizes=None):
+    return np.asarray(feature_pipeline.transform(raw, sizes).mean(axis=0)).ravel()
 
-def user_to_vector(user: User, preferred_type: str = None):
-    return np.array([
-        user.age or 0,
-        encode_type(preferred_type or "5v5"),
-        encode_city("Tunis"),  # TODO: if you add user.city later
-        0  # placeholder for budget
-    ], dtype=float)
+def user_to_vector(user: User, history=(), sizes=None):
+    """
+    Centroid of the user's past matches. Without history, a profile that
+    only carries the user's age (every other feature at its mean).
+    """
+    if history:
+        return _centroid(feature_pipeline.encode(list(history)), sizes)
+    profile = SimpleNamespace(**{name: None for name in FEATURE_ATTRIBUTES})
+    profile.min_age = profile.max_age = user.age
+    return feature_pipeline.vectors([profile], sizes).toarray()[0]
 
 
 # ------------------------------------------------------
@@ -61,15 +43,25 @@ def recommend_matches(db: Session, user_id: int, top_k: int = 5):
     if not matches:
         return []
 
-    # Build feature matrix
-    X = np.vstack([match_to_vector(m) for m in matches])
+    # Matches the user joined
+    history = db.query(Match).join(
+        match_participants, match_participants.c.match_id == Match.id
+    ).filter(match_participants.c.user_id == user_id).all()
+
+    # Encode everything first: the size snapshot must cover every code it grew
+    raw = feature_pipeline.encode(matches)
+    history_raw = feature_pipeline.encode(history)
+    sizes = feature_pipeline.sizes()
+
+    # Build feature matrix (sparse, one vectorized pass)
+    X = feature_pipeline.transform(raw, sizes)
 
     # Create KNN model
     knn = NearestNeighbors(n_neighbors=min(top_k, len(matches)), metric="euclidean")
     knn.fit(X)
 
-    # Build user feature vector
-    user_vec = np.array([user.age, 0, 0, 0, 0, 0])   # simplest version
+    # Build user feature vector from the matches they joined
+    user_vec = _centroid(history_raw, sizes) if history else user_to_vector(user, sizes=sizes)
 
     # Query KNN
     distances, indices = knn.kneighbors([user_vec])